@@ -0,0 +1,207 @@
+"""Persistent on-disk cache of decoded PCM, shared by the episode and drama CD extractors.
+
+Every extraction run used to decode the same MKV audio tracks, CD FLACs and `vocals.flac` stems from
+scratch. This cache stores each decoded source once as a raw int16 file plus a JSON header
+(sample rate, channels, frame count, source fingerprint), and hands it back as a read-only
+`numpy.memmap` so segment slicing never copies the whole buffer.
+
+- Entries are keyed by the source's content hash and the decode parameters, so the same audio under
+  another path shares one entry.
+- Source fingerprints (path, size, mtime, sha256) are memoised, so unchanged files are not re-hashed.
+- The cache has a size cap; least-recently-used entries (by header mtime, bumped on every hit) are evicted.
+
+`demux_audio_track` prepares video sources: it stream-copies the first audio track of an MKV into an
+audio-only `.mka` under `audio-cache/demuxed/` once, so later readers never set up a video demuxer/decoder.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+
+from audio_segments import DEFAULT_FPS, FFMPEG_BINARY
+from build_manifest import HASH_CHUNK_SIZE, file_sha256
+
+CACHE_DIR = "audio-cache"
+DEFAULT_MAX_BYTES = 32 * 1024 ** 3
+FINGERPRINTS_FILE = "fingerprints.json"
+
+_fingerprint_lock = threading.Lock()
+
+
+def _write_json_atomic(path: str, data) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def source_fingerprint(path: str, cache_dir: str = CACHE_DIR) -> dict:
+    """Return {path, size, mtime_ns, sha256} for `path`; the hash is only recomputed when size or mtime change."""
+    abspath = os.path.abspath(path)
+    st = os.stat(abspath)
+    memo_path = os.path.join(cache_dir, FINGERPRINTS_FILE)
+    with _fingerprint_lock:
+        try:
+            with open(memo_path, encoding="utf-8") as f:
+                memo = json.load(f)
+        except (FileNotFoundError, ValueError):
+            memo = {}
+        entry = memo.get(abspath)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry
+        entry = {"path": abspath, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(abspath)}
+        memo[abspath] = entry
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_json_atomic(memo_path, memo)
+        return entry
+
+
+def demux_audio_track(source: str, cache_dir: str = CACHE_DIR) -> str:
+    """Stream-copy (no re-encode) the first audio track of `source` into an audio-only Matroska file; return its path.
+
+    The result is reused while the source's size and mtime are unchanged.
+    """
+    abspath = os.path.abspath(source)
+    st = os.stat(abspath)
+    out_dir = os.path.join(cache_dir, "demuxed")
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(abspath))[0]
+    name = f"{stem}.{hashlib.sha256(abspath.encode()).hexdigest()[:8]}"
+    out_path = os.path.join(out_dir, f"{name}.mka")
+    info_path = os.path.join(out_dir, f"{name}.json")
+    info = {"source": abspath, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    try:
+        with open(info_path, encoding="utf-8") as f:
+            if json.load(f) == info and os.path.isfile(out_path):
+                return out_path
+    except (FileNotFoundError, ValueError):
+        pass
+    tmp = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    cmd = [FFMPEG_BINARY, "-y", "-v", "error", "-nostdin", "-i", abspath,
+           "-map", "0:a:0", "-vn", "-sn", "-dn", "-c:a", "copy", "-f", "matroska", tmp]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise IOError(f"ffmpeg failed to demux audio from {source}: {proc.stderr.decode(errors='replace').strip()}")
+    os.replace(tmp, out_path)
+    _write_json_atomic(info_path, info)
+    return out_path
+
+
+class DecodedAudioCache:
+    """Decoded int16 PCM of whole sources, stored as `pcm/<key>.pcm` + `pcm/<key>.json`."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.pcm_dir = os.path.join(cache_dir, "pcm")
+        self.max_bytes = max_bytes
+        os.makedirs(self.pcm_dir, exist_ok=True)
+
+    def _entry_paths(self, key: str) -> tuple[str, str]:
+        return os.path.join(self.pcm_dir, f"{key}.pcm"), os.path.join(self.pcm_dir, f"{key}.json")
+
+    def key_for(self, source: str, fps: int = DEFAULT_FPS, nchannels: int = 2) -> str:
+        sha = source_fingerprint(source, self.cache_dir)["sha256"]
+        return f"{sha[:32]}-{fps}-{nchannels}"
+
+    def _open(self, key: str) -> Optional[np.memmap]:
+        pcm_path, header_path = self._entry_paths(key)
+        try:
+            with open(header_path, encoding="utf-8") as f:
+                header = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not os.path.isfile(pcm_path) or os.path.getsize(pcm_path) != header["frames"] * header["nchannels"] * 2:
+            return None
+        os.utime(header_path)  # LRU bookkeeping
+        if header["frames"] == 0:
+            return np.zeros((0, header["nchannels"]), dtype=np.int16)
+        return np.memmap(pcm_path, dtype=np.int16, mode="r", shape=(header["frames"], header["nchannels"]))
+
+    def get(self, source: str, fps: int = DEFAULT_FPS, nchannels: int = 2) -> np.memmap:
+        """Return the decoded audio of `source` as a read-only (frames, nchannels) int16 memmap, decoding on a miss."""
+        key = self.key_for(source, fps, nchannels)
+        samples = self._open(key)
+        if samples is not None:
+            return samples
+        self._store(key, source, fps, nchannels)
+        self.evict(keep=(key,))
+        samples = self._open(key)
+        if samples is None:
+            raise IOError(f"decoded audio cache entry for {source} vanished right after being written")
+        return samples
+
+    def prefill(self, sources: Iterable[str], fps: int = DEFAULT_FPS, nchannels: int = 2) -> list[str]:
+        """Make sure every source is cached, then apply the size cap once, keeping all of them; return their keys.
+
+        Unlike calling `get` per source, filling the cache for one source never evicts another source of
+        the same run (e.g. one that worker processes are about to map).
+        """
+        keys = []
+        for source in sources:
+            key = self.key_for(source, fps, nchannels)
+            if self._open(key) is None:
+                self._store(key, source, fps, nchannels)
+            keys.append(key)
+        self.evict(keep=keys)
+        return keys
+
+    def _store(self, key: str, source: str, fps: int, nchannels: int) -> None:
+        pcm_path, header_path = self._entry_paths(key)
+        tmp = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        cmd = [FFMPEG_BINARY, "-v", "error", "-nostdin", "-i", source,
+               "-map", "0:a:0", "-vn", "-sn", "-f", "s16le", "-acodec", "pcm_s16le",
+               "-ar", str(fps), "-ac", str(nchannels), "-"]
+        # stream ffmpeg's output straight to disk so a whole episode never sits in memory
+        with open(tmp, "wb") as out:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            shutil.copyfileobj(proc.stdout, out, HASH_CHUNK_SIZE)
+            stderr = proc.stderr.read()
+            proc.wait()
+        if proc.returncode != 0:
+            os.remove(tmp)
+            raise IOError(f"ffmpeg failed to decode {source}: {stderr.decode(errors='replace').strip()}")
+        frames = os.path.getsize(tmp) // (2 * nchannels)
+        os.replace(tmp, pcm_path)
+        _write_json_atomic(header_path, {
+            "fps": fps,
+            "nchannels": nchannels,
+            "frames": frames,
+            "dtype": "int16",
+            "source": source_fingerprint(source, self.cache_dir),
+        })
+
+    def evict(self, keep: Iterable[str] = ()) -> None:
+        """Delete least-recently-used entries until the cache fits in `max_bytes`."""
+        keep = set(keep)
+        entries = []
+        total = 0
+        for name in os.listdir(self.pcm_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            pcm_path, header_path = self._entry_paths(key)
+            size = os.path.getsize(pcm_path) if os.path.isfile(pcm_path) else 0
+            total += size
+            entries.append((os.path.getmtime(header_path), key, size))
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            for path in self._entry_paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            print(f"audio cache: evicted {key} ({size / 1024 ** 2:.0f} MiB)")
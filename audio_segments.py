@@ -0,0 +1,137 @@
+"""Decode a source's audio once and cut many segments from the in-memory PCM buffer.
+
+MoviePy's `clip.subclip(...).write_audiofile(...)` starts a new ffmpeg reader for every
+segment, which seeks into the source and decodes it again. The helpers here instead:
+- decode the (first) audio track of a source once into an int16 NumPy array of shape (frames, channels)
+- cut segments from that array by sample index
+- pipe each segment's raw PCM into an ffmpeg encoder
+
+`cut_segments` is an alternative backend that skips the Python-side buffer entirely: it builds one
+ffmpeg command per source (or per chunk of segments) whose filter graph `asplit`s the decoded audio and
+`atrim`s every output segment, so a single process decodes once and writes many files.
+
+Uses the same ffmpeg binary as MoviePy.
+"""
+
+from __future__ import annotations
+
+import subprocess
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+from moviepy.config import get_setting
+
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
+DEFAULT_FPS = 44100
+# segments written by one ffmpeg process in `cut_segments`; keeps filter graphs and command lines small
+MAX_SEGMENTS_PER_COMMAND = 64
+
+
+def decode_audio(source: str, fps: int = DEFAULT_FPS, nchannels: int = 2,
+                 start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+    """Decode the first audio track of `source` into an int16 array of shape (frames, nchannels).
+
+    `start`/`end` (seconds) optionally restrict decoding to a time window; sample index 0
+    of the result then corresponds to `start`.
+    """
+    cmd = [FFMPEG_BINARY, "-v", "error", "-nostdin"]
+    if start:
+        cmd += ["-ss", f"{start:.6f}"]
+    cmd += ["-i", source]
+    if end is not None:
+        cmd += ["-t", f"{end - (start or 0.0):.6f}"]
+    cmd += ["-map", "0:a:0", "-vn", "-sn", "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ar", str(fps), "-ac", str(nchannels), "-"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise IOError(f"ffmpeg failed to decode {source}: {proc.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(proc.stdout, dtype=np.int16).reshape(-1, nchannels)
+
+
+def time_to_sample(t: float, fps: int = DEFAULT_FPS) -> int:
+    return int(round(t * fps))
+
+
+def slice_samples(samples: np.ndarray, start: float, end: float, fps: int = DEFAULT_FPS,
+                  offset: float = 0.0) -> np.ndarray:
+    """Return the rows of `samples` between `start` and `end` seconds (no copy).
+
+    `offset` is the source time (seconds) of `samples[0]`, for buffers decoded from a window.
+    """
+    a = max(0, time_to_sample(start - offset, fps))
+    b = min(len(samples), time_to_sample(end - offset, fps))
+    if b <= a:
+        raise ValueError(f"Empty segment {start:.3f}->{end:.3f} (buffer holds {len(samples) / fps:.3f}s from {offset:.3f}s)")
+    return samples[a:b]
+
+
+def write_segment(samples: np.ndarray, dest: str, fps: int = DEFAULT_FPS, codec: str = "libvorbis",
+                  ffmpeg_params: Sequence[str] = ()) -> None:
+    """Encode int16 PCM `samples` (frames, channels) to `dest` with ffmpeg."""
+    cmd = [FFMPEG_BINARY, "-y", "-v", "error", "-nostdin",
+           "-f", "s16le", "-ar", str(fps), "-ac", str(samples.shape[1]), "-i", "-",
+           "-c:a", codec, *ffmpeg_params, dest]
+    proc = subprocess.run(cmd, input=np.ascontiguousarray(samples).tobytes(),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise IOError(f"ffmpeg failed to write {dest}: {proc.stderr.decode(errors='replace').strip()}")
+
+
+def encode_segment(samples: np.ndarray, fps: int = DEFAULT_FPS, codec: str = "libvorbis", fmt: str = "ogg",
+                   ffmpeg_params: Sequence[str] = ()) -> bytes:
+    """Encode int16 PCM `samples` (frames, channels) with ffmpeg and return the encoded `fmt` file's bytes."""
+    cmd = [FFMPEG_BINARY, "-v", "error", "-nostdin",
+           "-f", "s16le", "-ar", str(fps), "-ac", str(samples.shape[1]), "-i", "-",
+           "-c:a", codec, *ffmpeg_params, "-f", fmt, "-"]
+    proc = subprocess.run(cmd, input=np.ascontiguousarray(samples).tobytes(),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise IOError(f"ffmpeg failed to encode a segment: {proc.stderr.decode(errors='replace').strip()}")
+    return proc.stdout
+
+
+def iter_segment_chunks(segments: Sequence[tuple[float, float, str]],
+                        max_per_chunk: int = MAX_SEGMENTS_PER_COMMAND) -> Iterator[list[tuple[float, float, str]]]:
+    """Yield time-sorted chunks of at most `max_per_chunk` (start, end, dest) segments."""
+    ordered = sorted(segments)
+    for i in range(0, len(ordered), max_per_chunk):
+        yield ordered[i:i + max_per_chunk]
+
+
+def build_batch_cut_command(source: str, segments: Sequence[tuple[float, float, str]], fps: int = DEFAULT_FPS,
+                            nchannels: int = 2, codec: str = "libvorbis", ffmpeg_params: Sequence[str] = ()) -> list[str]:
+    """Build one ffmpeg command writing every (start, end, dest) segment of `source`.
+
+    The input is seeked to the start of the earliest segment and read up to the end of the latest one;
+    `asplit` fans the resampled audio out to one `atrim` branch per output file.
+    """
+    window_start = min(s for s, _, _ in segments)
+    window_end = max(e for _, e, _ in segments)
+    cmd = [FFMPEG_BINARY, "-y", "-v", "error", "-nostdin",
+           "-ss", f"{window_start:.6f}", "-t", f"{window_end - window_start:.6f}", "-i", source]
+    labels = [f"[s{i}]" for i in range(len(segments))]
+    graph = [f"[0:a:0]aresample={fps},asplit={len(segments)}{''.join(labels)}"]
+    for i, (start, end, _) in enumerate(segments):
+        graph.append(f"[s{i}]atrim=start={start - window_start:.6f}:end={end - window_start:.6f},asetpts=PTS-STARTPTS[o{i}]")
+    cmd += ["-filter_complex", ";".join(graph)]
+    for i, (_, _, dest) in enumerate(segments):
+        cmd += ["-map", f"[o{i}]", "-ar", str(fps), "-ac", str(nchannels), "-c:a", codec, *ffmpeg_params, dest]
+    return cmd
+
+
+def cut_segments(source: str, segments: Sequence[tuple[float, float, str]], fps: int = DEFAULT_FPS,
+                 nchannels: int = 2, codec: str = "libvorbis", ffmpeg_params: Sequence[str] = (),
+                 max_per_command: int = MAX_SEGMENTS_PER_COMMAND) -> list[tuple[str, Optional[str]]]:
+    """Write all segments of `source` with one ffmpeg process per chunk of `max_per_command` segments.
+
+    Returns (dest, error message or None) per segment; a failing command fails every segment of its chunk.
+    """
+    results: list[tuple[str, Optional[str]]] = []
+    for chunk in iter_segment_chunks(segments, max_per_command):
+        cmd = build_batch_cut_command(source, chunk, fps=fps, nchannels=nchannels, codec=codec, ffmpeg_params=ffmpeg_params)
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        error = None
+        if proc.returncode != 0:
+            error = f"ffmpeg batch cut failed for {source}: {proc.stderr.decode(errors='replace').strip()}"
+        results.extend((dest, error) for _, _, dest in chunk)
+    return results
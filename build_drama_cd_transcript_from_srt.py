@@ -5,8 +5,14 @@
 - If Chinese speaker name is empty (line starts with `：`) the character column is written as empty string.
 - If Chinese speaker name is present but not found in `characters.csv`, a message is printed and the character column is left empty.
 - If the Chinese subtitle line does NOT contain the expected `角色名：` (or `：`), an Exception is raised and the offending file+line is reported.
+- With `--stable-ids`, segment IDs are diffed against the existing output CSV instead of being renumbered by
+  block position: a block keeps its old ID when it matches an old row by timing and text (then by timing only,
+  then by text only); new blocks get fresh IDs after the CD's highest ID.
+- With `--rename-plan PATH`, a CSV (old_filename,new_filename) is written for rows whose audio is unchanged
+  (same CD and timing) but whose filename changed, so `drama_cd_divide_by_character.py --rename-plan PATH`
+  can rename those files instead of re-encoding them.
 
-Usage: python build_drama_cd_transcript_from_srt.py
+Usage: python build_drama_cd_transcript_from_srt.py [--stable-ids] [--rename-plan rename-plan.csv]
 """
 
 from __future__ import annotations
@@ -16,12 +22,14 @@ import os
 import re
 from typing import Dict, List, Tuple
 
+from tools.srt_core import load_srt
+
 SRT_DIR_DEFAULT = "drama-cd-transcript"
 CHAR_CSV_DEFAULT = "characters.csv"
 OUT_CSV_DEFAULT = "drama-cd-transcript.csv"
 SRT_BASENAME_RE = re.compile(r"^KAXA-75(?P<cd_idx>\d{2})CD_bilingual\.srt$")
 CHINESE_SPEAKER_RE = re.compile(r"^(?P<name>[^：:]*)[：:](?P<rest>.*)$")  # accept fullwidth or ascii colon
-SRT_TIMESTAMP_RE = re.compile(r"(?P<hh>\d+):(?P<mm>\d{2}):(?P<ss>\d{2}),(?P<ms>\d{3})\s*-->\s*(?P<hh2>\d+):(?P<mm2>\d{2}):(?P<ss2>\d{2}),(?P<ms2>\d{3})")
+SEGMENT_FILENAME_RE = re.compile(r"^\[cd(?P<cd_idx>\d{2})-(?P<seg_id>\d{4})\]\[(?P<start>[^-\]]+)-(?P<end>[^\]]+)\]\.ogg$")
 
 
 def read_characters(char_csv_path: str) -> Dict[str, str]:
@@ -37,67 +45,14 @@ def read_characters(char_csv_path: str) -> Dict[str, str]:
     return mapping
 
 
-def srt_time_to_mm_ss_dd(srt_ts: str) -> str:
-    """Convert SRT timestamp (HH:MM:SS,mmm) to MM.SS.DD (minutes, seconds, centiseconds).
+def ms_to_mm_ss_dd(ms: int) -> str:
+    """Convert milliseconds to MM.SS.DD (minutes, seconds, centiseconds).
 
     - minutes is total minutes (hours * 60 + minutes) and zero-padded to 2 digits.
     - centiseconds are computed by integer-division ms//10 (no rounding) and zero-padded.
     """
-    m = re.match(r"(?P<hh>\d+):(?P<mm>\d{2}):(?P<ss>\d{2}),(?P<ms>\d{3})", srt_ts.strip())
-    if not m:
-        raise ValueError(f"Invalid SRT timestamp: {srt_ts!r}")
-    hh = int(m.group("hh"))
-    mm = int(m.group("mm"))
-    ss = int(m.group("ss"))
-    ms = int(m.group("ms"))
-    total_min = hh * 60 + mm
-    centisec = ms // 10
-    return f"{total_min:02d}.{ss:02d}.{centisec:02d}"
-
-
-def parse_srt_blocks(lines: List[str]) -> List[Tuple[int, str, List[str], int]]:
-    """Parse SRT file lines into blocks.
-
-    Returns list of tuples: (block_index, time_line, content_lines, chinese_line_number_in_file)
-    chinese_line_number_in_file is 1-based file line number for the Chinese subtitle line (for error messages).
-    """
-    blocks = []
-    i = 0
-    n = len(lines)
-    while i < n:
-        # skip leading blank lines
-        while i < n and lines[i].strip() == "":
-            i += 1
-        if i >= n:
-            break
-        # expect index line
-        idx_line = lines[i].strip()
-        # If idx is not numeric, still try to proceed (some SRTs omit numeric index)
-        try:
-            block_index = int(idx_line)
-            i += 1
-        except Exception:
-            # treat current line as index-less; do not consume it as content if it's a time line
-            # if it's a time line, set block_index = -1 and continue
-            block_index = -1
-        if i >= n:
-            break
-        time_line = lines[i].strip()
-        i += 1
-        # collect content lines until blank line or EOF
-        content_start_idx = i
-        content_lines: List[str] = []
-        while i < n and lines[i].strip() != "":
-            content_lines.append(lines[i].rstrip("\n"))
-            i += 1
-        if not content_lines:
-            # malformed block
-            raise Exception(f"Malformed SRT block starting near line {max(1, i-2)}: no content lines found")
-        # Chinese subtitle is expected to be the second content line -> compute its file line number
-        chinese_line_number = content_start_idx + 2  # 1-based: content_start_idx is 0-based index of first content line
-        blocks.append((block_index, time_line, content_lines, chinese_line_number))
-        # i currently at blank line or EOF; loop will skip blanks
-    return blocks
+    total_min, ms = divmod(ms, 60000)
+    return f"{total_min:02d}.{ms // 1000:02d}.{ms % 1000 // 10:02d}"
 
 
 def process_srt_file(srt_path: str, char_map: Dict[str, str]) -> List[Tuple[str, str, str]]:
@@ -108,14 +63,15 @@ def process_srt_file(srt_path: str, char_map: Dict[str, str]) -> List[Tuple[str,
         raise ValueError(f"SRT filename doesn't match expected pattern: {basename}")
     cd_idx = m.group("cd_idx")
 
-    with open(srt_path, encoding="utf-8-sig") as f:
-        all_lines = f.read().splitlines()
-
-    blocks = parse_srt_blocks(all_lines)
+    srt = load_srt(srt_path)
     rows: List[Tuple[str, str, str]] = []
     count = 0
-    for block_index, time_line, content_lines, chinese_line_no in blocks:
+    for b in range(len(srt)):
+        content_lines = srt.lines(b)
         # content_lines: [Japanese (0), Chinese (1), English (2), ...]
+        chinese_line_no = srt.line_no(b, 1)
+        if not content_lines:
+            raise Exception(f"Malformed SRT block starting near line {srt.first_line[b] + 1}: no content lines found")
         if len(content_lines) < 2:
             raise Exception(f"{srt_path}:{chinese_line_no}: expected Chinese subtitle on the 2nd content line, but block has {len(content_lines)} content lines")
         japanese = content_lines[0].strip()
@@ -138,13 +94,10 @@ def process_srt_file(srt_path: str, char_map: Dict[str, str]) -> List[Tuple[str,
             character = "SuowongYoung"
 
         # parse time range
-        ts_match = SRT_TIMESTAMP_RE.match(time_line)
-        if not ts_match:
-            raise Exception(f"{srt_path}: invalid SRT time-range line near {chinese_line_no - 1}: {time_line!r}")
-        start_srt = f"{ts_match.group('hh')}:{ts_match.group('mm')}:{ts_match.group('ss')},{ts_match.group('ms')}"
-        end_srt = f"{ts_match.group('hh2')}:{ts_match.group('mm2')}:{ts_match.group('ss2')},{ts_match.group('ms2')}"
-        start_fmt = srt_time_to_mm_ss_dd(start_srt)
-        end_fmt = srt_time_to_mm_ss_dd(end_srt)
+        if srt.start_ms[b] < 0 or srt.end_ms[b] < 0:
+            raise Exception(f"{srt_path}: invalid SRT time-range line near {chinese_line_no - 1}: {srt.time_text(b)!r}")
+        start_fmt = ms_to_mm_ss_dd(srt.start_ms[b])
+        end_fmt = ms_to_mm_ss_dd(srt.end_ms[b])
 
         filename = f"[cd{cd_idx}-{str(count).zfill(4)}][{start_fmt}-{end_fmt}].ogg"
         rows.append((filename, character, japanese))
@@ -152,12 +105,108 @@ def process_srt_file(srt_path: str, char_map: Dict[str, str]) -> List[Tuple[str,
     return rows
 
 
+def segment_filename(cd_idx: str, seg_id: int, start_fmt: str, end_fmt: str) -> str:
+    return f"[cd{cd_idx}-{str(seg_id).zfill(4)}][{start_fmt}-{end_fmt}].ogg"
+
+
+def split_segment_filename(filename: str) -> Tuple[str, int, str, str]:
+    """Return (cd_idx, seg_id, start_fmt, end_fmt) of a `[cd##-####][mm.ss.dd-mm.ss.dd].ogg` filename."""
+    m = SEGMENT_FILENAME_RE.match(filename)
+    if not m:
+        raise ValueError(f"Unrecognized segment filename: {filename!r}")
+    return m.group("cd_idx"), int(m.group("seg_id")), m.group("start"), m.group("end")
+
+
+def read_transcript_csv(csv_path: str) -> List[Tuple[str, str, str]]:
+    """Read an existing drama-cd-transcript.csv as (filename, character, content) rows."""
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [(row[0], row[1] if len(row) > 1 else "", row[2] if len(row) > 2 else "") for row in reader if row]
+
+
+def write_transcript_csv(csv_path: str, rows: List[Tuple[str, str, str]]) -> None:
+    """Write (filename, character, content) rows with the header, replacing `csv_path` atomically."""
+    tmp = f"{csv_path}.tmp"
+    with open(tmp, 'w', encoding='utf-8-sig', newline='') as out_f:
+        writer = csv.writer(out_f)
+        writer.writerow(["filename", "character", "content"])
+        for fn, ch, cont in rows:
+            writer.writerow([fn, ch, cont])
+    os.replace(tmp, csv_path)
+
+
+def _fmt_to_cs(t: str) -> int:
+    minutes, seconds, centis = (int(x) for x in t.split("."))
+    return (minutes * 60 + seconds) * 100 + centis
+
+
+def assign_stable_ids(rows: List[Tuple[str, str, str]], old_rows: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+    """Re-key freshly numbered `rows` of one CD so unchanged blocks keep the IDs they have in `old_rows`.
+
+    Matching is greedy and one-to-one, in three passes: timing and text, timing only, text only (nearest start
+    time wins). Unmatched rows get new IDs above every ID the CD has used.
+    """
+    old = [split_segment_filename(fn) + (content,) for fn, _, content in old_rows]
+    new = [split_segment_filename(fn) + (ch, content) for fn, ch, content in rows]
+    assigned: List[int | None] = [None] * len(new)
+    used: set = set()
+
+    def match(key_old, key_new) -> None:
+        candidates: Dict[tuple, List[Tuple[str, int]]] = {}
+        for _, seg_id, start, end, content in old:
+            if seg_id not in used:
+                candidates.setdefault(key_old(start, end, content), []).append((start, seg_id))
+        for i, (_, _, start, end, _, content) in enumerate(new):
+            if assigned[i] is not None:
+                continue
+            pool = [c for c in candidates.get(key_new(start, end, content), []) if c[1] not in used]
+            if not pool:
+                continue
+            _, seg_id = min(pool, key=lambda c: abs(_fmt_to_cs(c[0]) - _fmt_to_cs(start)))
+            assigned[i] = seg_id
+            used.add(seg_id)
+
+    match(lambda s, e, c: (s, e, c), lambda s, e, c: (s, e, c))
+    match(lambda s, e, c: (s, e), lambda s, e, c: (s, e))
+    match(lambda s, e, c: c, lambda s, e, c: c)
+
+    next_id = max([seg_id for _, seg_id, _, _, _ in old] + [-1]) + 1
+    result: List[Tuple[str, str, str]] = []
+    for i, (cd_idx, _, start, end, character, content) in enumerate(new):
+        if assigned[i] is None:
+            assigned[i] = next_id
+            next_id += 1
+        result.append((segment_filename(cd_idx, assigned[i], start, end), character, content))
+    return result
+
+
+def build_rename_plan(old_rows: List[Tuple[str, str, str]], new_rows: List[Tuple[str, str, str]]) -> List[Tuple[str, str]]:
+    """Return (old_filename, new_filename) pairs for segments whose CD and timing are unchanged but whose ID changed."""
+    new_by_timing: Dict[Tuple[str, str, str], List[str]] = {}
+    new_names = {fn for fn, _, _ in new_rows}
+    for fn, _, _ in new_rows:
+        cd_idx, _, start, end = split_segment_filename(fn)
+        new_by_timing.setdefault((cd_idx, start, end), []).append(fn)
+    plan: List[Tuple[str, str]] = []
+    for fn, _, _ in old_rows:
+        if fn in new_names:
+            continue
+        cd_idx, _, start, end = split_segment_filename(fn)
+        targets = new_by_timing.get((cd_idx, start, end))
+        if targets:
+            plan.append((fn, targets.pop(0)))
+    return plan
+
+
 def main(argv: List[str] | None = None) -> int:
     p = argparse.ArgumentParser(description="Build drama-cd-transcript.csv from bilingual SRT files")
     p.add_argument("--srt-dir", default=SRT_DIR_DEFAULT, help="Directory containing bilingual .srt files")
     p.add_argument("--chars", default=CHAR_CSV_DEFAULT, help="characters.csv path")
     p.add_argument("--out", default=OUT_CSV_DEFAULT, help="Output CSV path (will be overwritten)")
     p.add_argument("--dry-run", action="store_true", help="Do not write CSV; just print counts and warnings")
+    p.add_argument("--stable-ids", action="store_true", help="Keep segment IDs of unchanged blocks from the existing output CSV instead of renumbering")
+    p.add_argument("--rename-plan", default=None, help="Write old_filename,new_filename pairs for segments that only changed ID to this CSV")
     args = p.parse_args(argv)
 
     if not os.path.isdir(args.srt_dir):
@@ -173,23 +222,40 @@ def main(argv: List[str] | None = None) -> int:
     if not srt_files:
         raise SystemExit(f"No bilingual SRT files found in {args.srt_dir} matching KAXA-75**CD_bilingual.srt")
 
+    old_rows: List[Tuple[str, str, str]] = []
+    if (args.stable_ids or args.rename_plan) and os.path.exists(args.out):
+        old_rows = [r for r in read_transcript_csv(args.out) if SEGMENT_FILENAME_RE.match(r[0])]
+    old_by_cd: Dict[str, List[Tuple[str, str, str]]] = {}
+    for r in old_rows:
+        old_by_cd.setdefault(split_segment_filename(r[0])[0], []).append(r)
+
     all_rows: List[Tuple[str, str, str]] = []
     for srt in srt_files:
         print(f"Processing {srt}")
         rows = process_srt_file(srt, char_map)
+        if args.stable_ids:
+            cd_idx = SRT_BASENAME_RE.match(os.path.basename(srt)).group("cd_idx")
+            rows = assign_stable_ids(rows, old_by_cd.get(cd_idx, []))
         all_rows.extend(rows)
 
     print(f"Total subtitle rows parsed: {len(all_rows)}")
+    if old_rows:
+        old_names = {fn for fn, _, _ in old_rows}
+        kept = sum(1 for fn, _, _ in all_rows if fn in old_names)
+        print(f"Filenames unchanged vs existing {args.out}: {kept}/{len(all_rows)}")
     if args.dry_run:
         print("Dry-run: not writing CSV.")
         return 0
 
-    # write CSV (overwrite)
-    with open(args.out, 'w', encoding='utf-8-sig', newline='') as out_f:
-        writer = csv.writer(out_f)
-        writer.writerow(["filename", "character", "content"])
-        for fn, ch, cont in all_rows:
-            writer.writerow([fn, ch, cont])
+    if args.rename_plan:
+        plan = build_rename_plan(old_rows, all_rows)
+        with open(args.rename_plan, 'w', encoding='utf-8', newline='') as plan_f:
+            writer = csv.writer(plan_f)
+            writer.writerow(["old_filename", "new_filename"])
+            writer.writerows(plan)
+        print(f"Wrote {len(plan)} renames to {args.rename_plan}")
+
+    write_transcript_csv(args.out, all_rows)
 
     print(f"Wrote {len(all_rows)} rows to {args.out}")
     return 0
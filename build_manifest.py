@@ -0,0 +1,201 @@
+"""Content-hash build manifest for incremental dataset rebuilds.
+
+The manifest (`<output dir>/.manifest.json`) records, for every output segment (keyed by filename):
+- where it currently lives, relative to the output directory (flat or in a character folder)
+- its inputs: source fingerprint, start/end times and encoder settings
+- the output's sha256, size and mtime
+
+On a rebuild a segment is re-encoded only when its inputs changed or its file is missing/modified;
+segments that are no longer planned (e.g. a removed subtitle row) are deleted as orphans. Files in the
+output directory that the manifest does not know about are never touched.
+
+When a manifest is created for an output directory that already holds segments, those files are adopted
+with the current inputs instead of being re-encoded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import Iterable, Optional
+
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+# write the manifest to disk every N recorded segments, so a crash loses little bookkeeping
+SAVE_EVERY = 200
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self._unsaved = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.segments: dict[str, dict] = data.get("segments", {})
+            self.adopting = False
+        except FileNotFoundError:
+            self.segments = {}
+            self.adopting = True
+        self._index: Optional[dict[str, str]] = None
+
+    def _locate(self, filename: str) -> Optional[str]:
+        """Return the path (relative to the output dir) where `filename` currently lives, if anywhere."""
+        entry = self.segments.get(filename)
+        if entry and os.path.isfile(os.path.join(self.output_dir, entry["path"])):
+            return entry["path"]
+        if self._index is None:
+            # one scan of the output dir and its character folders, instead of a stat per folder per segment
+            self._index = {}
+            if os.path.isdir(self.output_dir):
+                for top in os.scandir(self.output_dir):
+                    if top.is_file():
+                        self._index.setdefault(top.name, top.name)
+                    elif top.is_dir():
+                        for sub in os.scandir(top.path):
+                            if sub.is_file():
+                                self._index.setdefault(sub.name, os.path.join(top.name, sub.name))
+        rel = self._index.get(filename)
+        if rel and os.path.isfile(os.path.join(self.output_dir, rel)):
+            return rel
+        return None
+
+    def _matches_recorded_output(self, entry: dict, rel: str) -> bool:
+        full = os.path.join(self.output_dir, rel)
+        st = os.stat(full)
+        if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        if st.st_size != entry["size"] or file_sha256(full) != entry["sha256"]:
+            return False
+        entry["mtime_ns"] = st.st_mtime_ns  # touched but identical
+        return True
+
+    def plan(self, filename: str, inputs: dict, dest: str, relocate: bool = False) -> bool:
+        """Return True when `filename` must be (re-)encoded to `dest`.
+
+        An up-to-date copy elsewhere in the output tree is kept where it is, or moved to `dest` when
+        `relocate` is set (e.g. its character label changed). Stale copies are deleted.
+        """
+        with self.lock:
+            rel = self._locate(filename)
+            if rel is None:
+                return True
+            entry = self.segments.get(filename)
+            if entry is None and self.adopting:
+                self._record_locked(filename, inputs, rel)
+                entry = self.segments[filename]
+            if entry is None:
+                # not ours: leave it alone and encode to `dest` (which only replaces a file at `dest` itself)
+                return True
+            up_to_date = entry["inputs"] == inputs and self._matches_recorded_output(entry, rel)
+            current = os.path.join(self.output_dir, rel)
+            if not up_to_date:
+                os.remove(current)
+                self.segments.pop(filename, None)
+                return True
+            entry["path"] = rel
+            dest_rel = os.path.relpath(dest, self.output_dir)
+            if relocate and os.path.normpath(dest_rel) != os.path.normpath(rel):
+                os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+                os.replace(current, dest)
+                entry["path"] = dest_rel
+                entry["mtime_ns"] = os.stat(dest).st_mtime_ns
+                print(f"Moved {rel} -> {dest_rel}")
+            return False
+
+    def _record_locked(self, filename: str, inputs: dict, rel: str) -> None:
+        full = os.path.join(self.output_dir, rel)
+        st = os.stat(full)
+        self.segments[filename] = {
+            "path": rel,
+            "inputs": inputs,
+            "sha256": file_sha256(full),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self._save_locked()
+
+    def rename_many(self, pairs: Iterable[tuple[str, str]]) -> int:
+        """Rename segment files (and their manifest entries) old_filename -> new_filename in place.
+
+        Files are first moved to temporary names so chains and swaps of filenames cannot clobber each other.
+        Returns the number of files renamed; pairs whose old file does not exist are ignored.
+        """
+        staged = []
+        with self.lock:
+            for old, new in pairs:
+                rel = self._locate(old)
+                if rel is None or old == new:
+                    continue
+                folder = os.path.dirname(rel)
+                tmp_rel = os.path.join(folder, f".renaming-{new}")
+                os.replace(os.path.join(self.output_dir, rel), os.path.join(self.output_dir, tmp_rel))
+                staged.append((old, new, tmp_rel, os.path.join(folder, new), self.segments.pop(old, None)))
+            for old, new, tmp_rel, new_rel, entry in staged:
+                os.replace(os.path.join(self.output_dir, tmp_rel), os.path.join(self.output_dir, new_rel))
+                if entry is not None:
+                    entry["path"] = new_rel
+                    self.segments[new] = entry
+                    self._unsaved += 1
+                if self._index is not None:
+                    self._index.pop(old, None)
+                    self._index[new] = new_rel
+                print(f"Renamed {old} -> {new}")
+        return len(staged)
+
+    def relocate(self, filename: str, dest: str) -> None:
+        """Note that `filename` was moved to `dest` by someone else (e.g. divide_by_character.py)."""
+        with self.lock:
+            entry = self.segments.get(filename)
+            if entry is not None:
+                entry["path"] = os.path.relpath(dest, self.output_dir)
+                entry["mtime_ns"] = os.stat(dest).st_mtime_ns
+                self._unsaved += 1
+            if self._index is not None:
+                self._index[filename] = os.path.relpath(dest, self.output_dir)
+
+    def record(self, filename: str, inputs: dict, dest: str) -> None:
+        """Record a freshly encoded segment written to `dest`."""
+        with self.lock:
+            self._record_locked(filename, inputs, os.path.relpath(dest, self.output_dir))
+
+    def remove_orphans(self, planned: Iterable[str]) -> list[str]:
+        """Delete outputs recorded in the manifest whose filename is no longer planned; return their paths."""
+        planned = set(planned)
+        removed = []
+        with self.lock:
+            for filename in sorted(set(self.segments) - planned):
+                rel = self.segments.pop(filename)["path"]
+                full = os.path.join(self.output_dir, rel)
+                if os.path.isfile(full):
+                    os.remove(full)
+                    removed.append(rel)
+            self._unsaved += len(removed)
+        return removed
+
+    def _save_locked(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "segments": self.segments}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+    def save(self) -> None:
+        with self.lock:
+            self._save_locked()
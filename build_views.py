@@ -0,0 +1,185 @@
+"""Materialise grouping trees of the segments as hardlinks or symlinks, from a declarative spec.
+
+The segment files stay where the extractors (and dividers) put them: that is the one canonical store, and
+a view only links to it, so no audio is ever copied. `views.json` declares the views:
+
+  {"views": {"by-source": {"group": "{source}/{character}", "link": "hardlink",
+                           "where": {"dataset": ["episode"], "qc_status": ["", "ok"]}}}}
+
+- `group` is a path template over the segment's fields: dataset (`episode` / `drama_cd`), source
+  (`ep01`.. / `cd01`..), character, qc_status, split (a stable `train`/`val` split, see dataset_shards.py)
+  and filename; segments whose template renders an empty path component are left out of the view
+- `where` keeps only the segments whose field is one of the listed values ('' matches an empty field)
+- `link` is `hardlink` (default; falls back to a symlink across file systems) or `symlink`
+
+The segments and their locations come from the segment index (`segment_index.py`). Every view records
+which link points at which segment (file and audio hash) in `<views dir>/.views-state.json`, so a rebuild
+only touches links whose segment was added, removed, moved, re-encoded or regrouped; views removed from
+the spec are deleted.
+
+  python build_views.py [--spec views.json] [--out views] [--rescan] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import json
+import os
+import string
+from typing import Optional
+
+from dataset_shards import DEFAULT_VAL_FRACTION, split_of
+from segment_index import DATASETS, SegmentIndex
+
+SPEC_FILE = "views.json"
+VIEWS_DIR = "views"
+STATE_NAME = ".views-state.json"
+LINK_TYPES = ("hardlink", "symlink")
+FIELDS = ("dataset", "source", "character", "qc_status", "split", "filename")
+
+
+def load_spec(path: str) -> dict[str, dict]:
+    """Read and check the view spec; returns view name -> view definition."""
+    with open(path, encoding="utf-8") as f:
+        views = json.load(f)["views"]
+    for name, view in views.items():
+        if not name or os.sep in name or name.startswith("."):
+            raise ValueError(f"invalid view name {name!r}")
+        fields = {field for _, field, _, _ in string.Formatter().parse(view["group"]) if field is not None}
+        unknown = (fields | set(view.get("where", {}))) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"view {name!r} uses unknown field(s) {', '.join(sorted(unknown))}; known: {', '.join(FIELDS)}")
+        if view.get("link", "hardlink") not in LINK_TYPES:
+            raise ValueError(f"view {name!r}: link must be one of {LINK_TYPES}")
+    return views
+
+
+def segment_fields(segment: dict) -> dict[str, str]:
+    return {
+        "dataset": segment["dataset"],
+        "source": segment["source"] or "",
+        "character": segment["character"],
+        "qc_status": segment["qc_status"] or "",
+        "split": split_of(segment["filename"], DEFAULT_VAL_FRACTION),
+        "filename": segment["filename"],
+    }
+
+
+def plan_view(view: dict, segments: list[dict]) -> dict[str, list[str]]:
+    """link path (relative to the view) -> [target path, audio sha256] of every segment in the view."""
+    where = view.get("where", {})
+    links: dict[str, list[str]] = {}
+    for segment in segments:
+        fields = segment_fields(segment)
+        if any(fields[field] not in values for field, values in where.items()):
+            continue
+        group = view["group"].format(**fields)
+        if any(part in ("", ".", "..") for part in group.split("/")):
+            continue
+        target = os.path.join(DATASETS[segment["dataset"]][1], segment["output_path"])
+        links[os.path.join(group, segment["filename"])] = [target, segment["audio_sha256"]]
+    return links
+
+
+def make_link(target: str, link: str, kind: str) -> str:
+    """Create `link` pointing at `target`; returns the kind of link made."""
+    os.makedirs(os.path.dirname(link), exist_ok=True)
+    if kind == "hardlink":
+        try:
+            os.link(target, link)
+            return "hardlink"
+        except OSError as ex:
+            if ex.errno not in (errno.EXDEV, errno.EPERM):
+                raise
+    os.symlink(os.path.relpath(target, os.path.dirname(link)), link)
+    return "symlink"
+
+
+def remove_link(view_dir: str, rel: str) -> None:
+    path = os.path.join(view_dir, rel)
+    if os.path.lexists(path):
+        os.remove(path)
+    # prune the group folders the link leaves empty
+    folder = os.path.dirname(path)
+    while folder != view_dir and os.path.isdir(folder) and not os.listdir(folder):
+        os.rmdir(folder)
+        folder = os.path.dirname(folder)
+
+
+def build_views(views: dict[str, dict], segments: list[dict], out_dir: str, dry_run: bool = False) -> dict[str, dict]:
+    """Bring every view in `out_dir` up to date; returns the new state."""
+    state_path = os.path.join(out_dir, STATE_NAME)
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        state = {}
+    new_state: dict[str, dict] = {}
+    for name in sorted(set(state) | set(views)):
+        view_dir = os.path.join(out_dir, name)
+        old_links = state.get(name, {}).get("links", {})
+        if name in views:
+            kind = views[name].get("link", "hardlink")
+            links = plan_view(views[name], segments)
+            if state.get(name, {}).get("link") != kind:
+                old_links = {rel: None for rel in old_links}  # link type changed: relink everything
+        else:
+            kind, links = None, {}
+        stale = [rel for rel, entry in old_links.items() if links.get(rel) != entry]
+        added = [rel for rel, entry in links.items() if old_links.get(rel) != entry]
+        print(f"{name}: {len(links)} link(s); {len(added)} to create, {len(stale)} to remove")
+        if dry_run:
+            continue
+        for rel in stale:
+            remove_link(view_dir, rel)
+        failed = set()
+        for rel in added:
+            target = links[rel][0]
+            if not os.path.isfile(target):
+                print(f"WARNING: {target} is missing; run segment_index.py import to refresh the index")
+                failed.add(rel)
+                continue
+            if os.path.lexists(os.path.join(view_dir, rel)):
+                os.remove(os.path.join(view_dir, rel))  # left by an interrupted run
+            make_link(target, os.path.join(view_dir, rel), kind)
+        if name in views:
+            new_state[name] = {"link": kind, "links": {rel: entry for rel, entry in links.items() if rel not in failed}}
+        elif os.path.isdir(view_dir) and not os.listdir(view_dir):
+            os.rmdir(view_dir)
+    if not dry_run:
+        os.makedirs(out_dir, exist_ok=True)
+        tmp = f"{state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(new_state, f, ensure_ascii=False)
+        os.replace(tmp, state_path)
+    return new_state
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build hardlink/symlink views of the segments from a declarative spec.")
+    parser.add_argument("--spec", default=SPEC_FILE, help=f"View spec (default: {SPEC_FILE})")
+    parser.add_argument("--out", default=VIEWS_DIR, help=f"Directory the views are built in (default: {VIEWS_DIR})")
+    parser.add_argument("--rescan", action="store_true", help="Re-read where every segment is from the build manifests first")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args(argv)
+
+    try:
+        views = load_spec(args.spec)
+    except (OSError, ValueError, KeyError) as ex:
+        print(f"ERROR reading {args.spec}: {ex}")
+        return 2
+    index = SegmentIndex()
+    try:
+        if args.rescan:
+            for dataset in DATASETS:
+                index.record_outputs(dataset)
+        segments = index.extracted()
+    finally:
+        index.close()
+    build_views(views, segments, args.out, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+"""Compare the float and int8-quantised Demucs engines on a test clip before switching `--engine`.
+
+Separates the same clip with the float model (`--engine api`) and the dynamically quantised one
+(`--engine api-int8`) on the CPU, and reports for each engine:
+- speed: wall time and real-time factor (clip seconds per second of separation)
+- quality of the vocals stem: SDR (dB) and correlation against the reference stem
+
+The reference is the float model's output, or the same time range of an existing `vocals.flac` given with
+`--reference` (e.g. from `separated/htdemucs/<name>/`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from run_demucs_batch import _separate_wav, load_model
+
+
+def sdr(reference, estimate) -> float:
+    """Signal-to-distortion ratio in dB of `estimate` against `reference` (same shape)."""
+    import torch
+
+    noise = (reference - estimate).pow(2).sum()
+    return float(10 * torch.log10(reference.pow(2).sum() / noise.clamp(min=1e-12)))
+
+
+def correlation(reference, estimate) -> float:
+    import torch
+
+    return float(torch.corrcoef(torch.stack((reference.flatten(), estimate.flatten())))[0, 1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare Demucs float vs int8 inference speed and vocals quality on a test clip.")
+    parser.add_argument("input", help="Audio or video file to take the test clip from")
+    parser.add_argument("--start", type=float, default=60.0, help="Clip start in seconds (default: 60)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Clip length in seconds (default: 30)")
+    parser.add_argument("--model", default="htdemucs", help="Demucs model name (default: htdemucs)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads (default: torch's default)")
+    parser.add_argument("--reference", default=None, help="Existing vocals stem of the same input to score against")
+    args = parser.parse_args()
+
+    import torch
+    from demucs.audio import AudioFile
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    results = {}
+    clip = None
+    for engine, quantize in (("api", False), ("api-int8", True)):
+        model = load_model(args.model, quantize=quantize)
+        if clip is None:
+            clip = AudioFile(Path(args.input)).read(seek_time=args.start, duration=args.duration, streams=0,
+                                              samplerate=model.samplerate, channels=model.audio_channels)
+        began = time.perf_counter()
+        vocals = _separate_wav(clip, model)[model.sources.index("vocals")]
+        results[engine] = (vocals, time.perf_counter() - began)
+
+    if args.reference:
+        reference = AudioFile(Path(args.reference)).read(seek_time=args.start, duration=args.duration, streams=0,
+                                                   samplerate=model.samplerate, channels=model.audio_channels)
+        reference_name = args.reference
+    else:
+        reference = results["api"][0]
+        reference_name = "float model output"
+    print(f"Clip: {args.input} [{args.start:g}s +{args.duration:g}s], reference: {reference_name}")
+    print(f"{'engine':<10} {'seconds':>8} {'x realtime':>10} {'SDR dB':>8} {'corr':>7}")
+    for engine, (vocals, elapsed) in results.items():
+        n = min(vocals.shape[-1], reference.shape[-1])
+        est, ref = vocals[..., :n], reference[..., :n]
+        print(f"{engine:<10} {elapsed:8.1f} {args.duration / elapsed:10.2f} {sdr(ref, est):8.2f} {correlation(ref, est):7.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
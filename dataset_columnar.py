@@ -0,0 +1,153 @@
+"""Export the labelled segments with their audio to columnar Parquet or Arrow IPC files.
+
+One row per segment of meta.csv and drama-cd-transcript.csv that has been extracted:
+filename, source (`ep01`.. / `cd01`..), start, end, duration (seconds), character, content, audio (the encoded .ogg bytes).
+- rows are streamed: segments are read and written one row group (`--row-group-mb` of audio) at a time
+- Parquet compresses the metadata columns with zstd and stores the already compressed audio as is
+- readers get column projection and memory mapping (`load`): selecting rows by character without the `audio`
+  column never reads the audio payload
+- the output is written to a `.tmp` file and renamed into place when complete
+
+Needs pyarrow (`pip install pyarrow`).
+
+  python dataset_columnar.py --out sukasuka.parquet
+  python dataset_columnar.py --out sukasuka.arrow --format arrow
+
+  >>> from dataset_columnar import load
+  >>> load("sukasuka.parquet", columns=["filename", "content"], characters=["Chtholly"])
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from typing import Iterator, Optional, Sequence
+
+from dataset_shards import DATASETS, iter_loose_segments, read_labels
+from segment_index import parse_segment_filename
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ("parquet", "arrow")
+DEFAULT_ROW_GROUP_BYTES = 64 * 1024 ** 2
+COLUMNS = ("filename", "source", "start", "end", "duration", "character", "content", "audio")
+
+
+def schema():
+    return pa.schema([
+        ("filename", pa.string()),
+        ("source", pa.string()),
+        ("start", pa.float64()),
+        ("end", pa.float64()),
+        ("duration", pa.float64()),
+        ("character", pa.string()),
+        ("content", pa.string()),
+        ("audio", pa.binary()),
+    ])
+
+
+def iter_rows(datasets=DATASETS) -> Iterator[dict]:
+    """Every labelled segment with its audio, in CSV order; rows whose segment was not extracted are skipped."""
+    for csv_path, output_dir in datasets:
+        if not (os.path.isfile(csv_path) and os.path.isdir(output_dir)):
+            print(f"Skipping {output_dir}: {csv_path} or the directory is missing")
+            continue
+        paths = dict(iter_loose_segments(output_dir))
+        missing = 0
+        for filename, (character, content) in read_labels(csv_path).items():
+            path = paths.get(filename)
+            if path is None:
+                missing += 1
+                continue
+            source, start, end = parse_segment_filename(filename)
+            with open(path, "rb") as f:
+                audio = f.read()
+            yield {"filename": filename, "source": source, "start": start, "end": end,
+                   "duration": None if start is None else round(end - start, 2),
+                   "character": character, "content": content, "audio": audio}
+        if missing:
+            print(f"{output_dir}: {missing} row(s) of {csv_path} have no extracted segment")
+
+
+def iter_batches(rows: Iterator[dict], row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES) -> Iterator["pa.RecordBatch"]:
+    """Group rows into record batches holding about `row_group_bytes` of audio each."""
+    batch: list[dict] = []
+    size = 0
+    for row in rows:
+        batch.append(row)
+        size += len(row["audio"])
+        if size >= row_group_bytes:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema())
+            batch, size = [], 0
+    if batch:
+        yield pa.RecordBatch.from_pylist(batch, schema=schema())
+
+
+def export(out_path: str, fmt: str = "parquet", row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES) -> int:
+    """Write every labelled segment to `out_path`; returns the number of rows."""
+    tmp = f"{out_path}.tmp"
+    count = 0
+    if fmt == "parquet":
+        compression = {c: "zstd" for c in COLUMNS}
+        compression["audio"] = "none"
+        writer = pq.ParquetWriter(tmp, schema(), compression=compression, use_dictionary=["source", "character"])
+    else:
+        writer = pa.ipc.new_file(tmp, schema())
+    try:
+        for batch in iter_batches(iter_rows(), row_group_bytes):
+            if fmt == "parquet":
+                # one row group per batch
+                writer.write_batch(batch, row_group_size=batch.num_rows)
+            else:
+                writer.write_batch(batch)
+            count += batch.num_rows
+    finally:
+        writer.close()
+    os.replace(tmp, out_path)
+    return count
+
+
+def load(path: str, columns: Optional[Sequence[str]] = None, characters: Optional[Sequence[str]] = None) -> "pa.Table":
+    """Memory-map an exported file, reading only `columns` and, if given, only the rows of `characters`.
+
+    With Parquet only the projected column chunks are read; with Arrow IPC the file is mapped and the
+    columns are sliced from it without copying: the filter only copies the selected rows of the
+    requested columns (plus `character`), so unless `audio` is requested its payload is never touched.
+    """
+    if path.endswith(".parquet"):
+        filters = [("character", "in", list(characters))] if characters else None
+        return pq.read_table(path, columns=list(columns) if columns else None, filters=filters, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    if not characters:
+        return table.select(list(columns)) if columns else table
+    # project before filtering: filter copies every column it is given
+    selected = list(columns) if columns else table.column_names
+    table = table.select(selected if "character" in selected else selected + ["character"])
+    table = table.filter(pa.compute.is_in(table["character"], value_set=pa.array(list(characters), pa.string())))
+    return table.select(selected)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export the labelled segments with their audio to Parquet or Arrow IPC.")
+    parser.add_argument("--out", default="sukasuka.parquet", help="Output file (default: sukasuka.parquet)")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="Output format (default: from the --out extension, else parquet)")
+    parser.add_argument("--row-group-mb", type=int, default=DEFAULT_ROW_GROUP_BYTES // 1024 ** 2,
+                        help="Audio per row group / record batch in MiB (default: 64)")
+    args = parser.parse_args(argv)
+
+    if pa is None:
+        parser.error("pyarrow is not installed (pip install pyarrow)")
+    fmt = args.format or ("arrow" if args.out.endswith((".arrow", ".feather")) else "parquet")
+    count = export(args.out, fmt, args.row_group_mb * 1024 ** 2)
+    print(f"Wrote {count} row(s) to {args.out} ({fmt})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
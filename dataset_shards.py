@@ -0,0 +1,247 @@
+"""Pack segments into WebDataset-style tar shards with a seekable offset index.
+
+A sample is a group of tar members sharing a key: `<key>.ogg` (the encoded audio) and `<key>.json`
+(filename, character, content, source, start, end). WebDataset splits a member name into key and extension
+at the first dot, so the key is the segment filename without `.ogg` and with its dots replaced by `_`
+(`[01-0001][00_04_75-00_07_46]`); the real filename is in the json.
+Shards are written sequentially, so they can be filled while segments are being extracted:
+- one shard series per dataset and group (character, or train/val split): `<out dir>/ep-<group>-000000.tar`, ...
+  for the episodes and `cd-<group>-...` for the drama CDs, so both datasets can share one directory
+- a shard is closed and the next one started once it reaches `--shard-mb`
+- every shard gets a sidecar `<shard>.idx.json` mapping member name -> [data offset, size], so a single clip
+  is read with one seek (`read_member`) without scanning the tar
+- shards are written as `.tmp` files and only renamed into place when complete
+
+The extractors stream into shards with `--shards DIR` (no loose files are written); this module's CLI packs
+already extracted loose files:
+
+  python dataset_shards.py export --out shards --group-by character
+  python dataset_shards.py get shards/ep-Chtholly-000000.tar "[01-0001][00.04.75-00.07.46].ogg" > clip.ogg
+  python dataset_shards.py get shards/ep-Chtholly-000000.tar "[01-0001][00_04_75-00_07_46].json"
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import threading
+import zlib
+from typing import Iterator, Optional
+
+from segment_index import parse_segment_filename
+
+SHARD_INDEX_SUFFIX = ".idx.json"
+DEFAULT_SHARD_BYTES = 256 * 1024 ** 2
+GROUP_BYS = ("character", "split")
+UNLABELED_GROUP = "_unlabeled"
+DEFAULT_VAL_FRACTION = 0.05
+# (label CSV, loose segment directory) of the episode and drama CD datasets
+DATASETS = (("meta.csv", "raw-vocal-output"), ("drama-cd-transcript.csv", "drama-cd-raw-vocal-output"))
+# shard series prefix of each dataset (by its loose segment directory)
+SERIES_PREFIXES = {"raw-vocal-output": "ep", "drama-cd-raw-vocal-output": "cd"}
+EPISODE_SERIES, DRAMA_CD_SERIES = SERIES_PREFIXES["raw-vocal-output"], SERIES_PREFIXES["drama-cd-raw-vocal-output"]
+
+
+def member_name(filename: str) -> str:
+    """Tar member name of a segment file (or of a member name itself): `<key>.<ext>` with a dotless key."""
+    key, ext = os.path.splitext(filename)
+    return f"{key.replace('.', '_')}{ext}"
+
+
+def split_of(filename: str, val_fraction: float = DEFAULT_VAL_FRACTION) -> str:
+    """'train' or 'val': a stable split, the same segment always lands in the same split."""
+    return "val" if zlib.crc32(filename.encode("utf-8")) % 10000 < val_fraction * 10000 else "train"
+
+
+class ShardWriter:
+    """One series of tar shards `<prefix>-NNNNNN.tar`, rotated at `max_bytes`."""
+
+    def __init__(self, out_dir: str, prefix: str, max_bytes: int = DEFAULT_SHARD_BYTES):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.shard_no = 0
+        self.written: list[str] = []
+        self._tar: Optional[tarfile.TarFile] = None
+        self._path = ""
+        self._index: dict[str, list[int]] = {}
+
+    def _open(self) -> None:
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._path = os.path.join(self.out_dir, f"{self.prefix}-{self.shard_no:06d}.tar")
+        self._tar = tarfile.open(f"{self._path}.tmp", "w", format=tarfile.PAX_FORMAT)
+        self._index = {}
+        self.shard_no += 1
+
+    def write(self, key: str, members: dict[str, bytes]) -> None:
+        """Append one sample: `members` maps extension (e.g. 'ogg', 'json') -> bytes."""
+        incoming = sum(len(data) + 2 * tarfile.BLOCKSIZE for data in members.values())
+        if self._tar is not None and self._index and self._tar.offset + incoming > self.max_bytes:
+            self._close_shard()
+        if self._tar is None:
+            self._open()
+        for ext, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{ext}")
+            info.size = len(data)
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+            # the data block ends (padded to 512 bytes) where the tar's write position now is
+            self._index[info.name] = [self._tar.offset - (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE, len(data)]
+
+    def _close_shard(self) -> None:
+        self._tar.close()
+        self._tar = None
+        index_tmp = f"{self._path}{SHARD_INDEX_SUFFIX}.tmp"
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            json.dump({"members": self._index}, f, ensure_ascii=False)
+        os.replace(f"{self._path}.tmp", self._path)
+        os.replace(index_tmp, self._path + SHARD_INDEX_SUFFIX)
+        self.written.append(self._path)
+
+    def close(self) -> list[str]:
+        if self._tar is not None:
+            self._close_shard()
+        return self.written
+
+
+class ShardSet:
+    """Thread-safe set of shard series `<series_prefix>-<group>-NNNNNN.tar` of one dataset, one per group."""
+
+    def __init__(self, out_dir: str, series_prefix: str, group_by: str = "character", max_bytes: int = DEFAULT_SHARD_BYTES,
+                 val_fraction: float = DEFAULT_VAL_FRACTION):
+        if group_by not in GROUP_BYS:
+            raise ValueError(f"group_by must be one of {GROUP_BYS}, not {group_by!r}")
+        if not series_prefix:
+            raise ValueError("series_prefix must not be empty")
+        self.out_dir = out_dir
+        self.series_prefix = series_prefix
+        self.group_by = group_by
+        self.max_bytes = max_bytes
+        self.val_fraction = val_fraction
+        self.writers: dict[str, ShardWriter] = {}
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def group(self, filename: str, character: str) -> str:
+        if self.group_by == "character":
+            return character or UNLABELED_GROUP
+        return split_of(filename, self.val_fraction)
+
+    def write(self, filename: str, audio: bytes, meta: dict) -> None:
+        """Add a segment (`filename` like `[01-0001][...].ogg`) with its encoded audio and metadata."""
+        key, ext = os.path.splitext(member_name(filename))
+        members = {ext.lstrip("."): audio, "json": json.dumps(dict(meta, filename=filename), ensure_ascii=False).encode("utf-8")}
+        group = self.group(filename, meta.get("character", ""))
+        with self.lock:
+            writer = self.writers.get(group)
+            if writer is None:
+                writer = self.writers[group] = ShardWriter(self.out_dir, f"{self.series_prefix}-{group}", self.max_bytes)
+            writer.write(key, members)
+            self.count += 1
+
+    def close(self) -> list[str]:
+        """Finish every shard and delete this dataset's shards left in `out_dir` by an earlier, larger export.
+
+        Shards of other series prefixes (the other dataset) are never touched.
+        """
+        with self.lock:
+            written = [path for writer in self.writers.values() for path in writer.close()]
+        keep = {os.path.basename(p) for p in written}
+        own = re.compile(rf"{re.escape(self.series_prefix)}-.+-\d{{6}}\.tar")
+        if os.path.isdir(self.out_dir):
+            for name in os.listdir(self.out_dir):
+                shard = name[:-len(SHARD_INDEX_SUFFIX)] if name.endswith(SHARD_INDEX_SUFFIX) else name
+                if own.fullmatch(shard) and shard not in keep:
+                    os.remove(os.path.join(self.out_dir, name))
+        return written
+
+
+def read_index(shard_path: str) -> dict[str, list[int]]:
+    with open(shard_path + SHARD_INDEX_SUFFIX, encoding="utf-8") as f:
+        return json.load(f)["members"]
+
+
+def read_member(shard_path: str, name: str, index: Optional[dict[str, list[int]]] = None) -> bytes:
+    """Read one member of a shard with a single seek, using its sidecar index.
+
+    `name` is a member name (`<key>.ogg`, `<key>.json`) or the filename of the segment (`[01-0001][00.04.75-00.07.46].ogg`).
+    """
+    offset, size = (index or read_index(shard_path))[member_name(name)]
+    with open(shard_path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def read_labels(csv_path: str) -> dict[str, tuple[str, str]]:
+    """filename -> (character, content) from meta.csv / drama-cd-transcript.csv."""
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return {row[0]: (row[1] if len(row) > 1 else "", row[2] if len(row) > 2 else "") for row in reader if row}
+
+
+def iter_loose_segments(output_dir: str) -> Iterator[tuple[str, str]]:
+    """(filename, path) of every .ogg in `output_dir` and its character folders."""
+    for top in sorted(os.scandir(output_dir), key=lambda e: e.name):
+        if top.is_file() and top.name.endswith(".ogg"):
+            yield top.name, top.path
+        elif top.is_dir():
+            for sub in sorted(os.scandir(top.path), key=lambda e: e.name):
+                if sub.is_file() and sub.name.endswith(".ogg"):
+                    yield sub.name, sub.path
+
+
+def export(out_dir: str, group_by: str, max_bytes: int, val_fraction: float) -> int:
+    count = n_shards = 0
+    for csv_path, output_dir in DATASETS:
+        if not (os.path.isfile(csv_path) and os.path.isdir(output_dir)):
+            print(f"Skipping {output_dir}: {csv_path} or the directory is missing")
+            continue
+        shards = ShardSet(out_dir, SERIES_PREFIXES[output_dir], group_by, max_bytes, val_fraction)
+        labels = read_labels(csv_path)
+        for filename, path in iter_loose_segments(output_dir):
+            character, content = labels.get(filename, ("", ""))
+            # the same metadata the extractors stream into shards (source `ep01` / `cd01`)
+            source, start, end = parse_segment_filename(filename)
+            with open(path, "rb") as f:
+                shards.write(filename, f.read(), {"character": character, "content": content, "source": source,
+                                                  "start": start, "end": end})
+        count += shards.count
+        n_shards += len(shards.close())
+    print(f"Packed {count} segment(s) into {n_shards} shard(s) in {out_dir}")
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pack segments into WebDataset-style tar shards, or read one clip from a shard.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Pack the loose segments of raw-vocal-output/ and drama-cd-raw-vocal-output/")
+    p_export.add_argument("--out", default="shards", help="Output directory (default: shards)")
+    p_export.add_argument("--group-by", choices=GROUP_BYS, default="character", help="Shard series per character or per train/val split")
+    p_export.add_argument("--shard-mb", type=int, default=DEFAULT_SHARD_BYTES // 1024 ** 2, help="Shard size in MiB (default: 256)")
+    p_export.add_argument("--val-fraction", type=float, default=DEFAULT_VAL_FRACTION, help="Share of segments in the val split (default: 0.05)")
+    p_get = sub.add_parser("get", help="Write one member of a shard to stdout")
+    p_get.add_argument("shard")
+    p_get.add_argument("member", help="Segment filename, e.g. '[01-0001][00.04.75-00.07.46].ogg', or member name, "
+                                      "e.g. '[01-0001][00_04_75-00_07_46].json'")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        return export(args.out, args.group_by, args.shard_mb * 1024 ** 2, args.val_fraction)
+    try:
+        data = read_member(args.shard, args.member)
+    except KeyError:
+        print(f"{args.member} is not in {args.shard}", file=sys.stderr)
+        return 1
+    sys.stdout.buffer.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
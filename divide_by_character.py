@@ -1,34 +1,155 @@
+"""Move the episode segments in raw-vocal-output/ into per-character folders according to meta.csv.
+
+Default: labelled segments still at the top level are moved into `<character>/`.
+
+`--relabel` applies label corrections: the labels of meta.csv are compared with those applied on disk by
+the last run (`raw-vocal-output/.labels-applied.json`, the folder every extracted segment was left in) or
+with a git revision (`--since HEAD~1`), and only the segments whose character changed are moved: between
+character folders, or back to the top level when the label was removed. Segments the index finds outside
+their character's folder are moved as well. Each move is a single atomic rename; an interrupted run is
+completed by running it again.
+Per-character counts are updated from the moves instead of relisting every folder.
+"""
+
+import argparse
+import csv
+import io
+import json
 import os
+import subprocess
+import time
+
+from build_manifest import BuildManifest
+from segment_index import DATASETS, SegmentIndex
 
 OUTPUT_PATH = "raw-vocal-output"
-METADATA_CSV_FILE = "meta.csv"
-AUDIO_FORMAT = '.ogg'
-
-csv_file = open(METADATA_CSV_FILE, 'r', encoding='utf_8_sig')
-for line in csv_file:
-    if line == "filename,character,content\n":
-        continue
-    assert line.count(',') == 2 or line.count(',') == 1
-    if line.count(',') != 2:
-        continue
-    filename, character, content = line[:-1].split(',')  # [:-1] removes \n at the end of line
-    if character == '':
-        continue
-    character_path = os.path.join(OUTPUT_PATH, character)
-    if not os.path.exists(character_path):
-        os.mkdir(character_path)
-    original_voice_file_path = os.path.join(OUTPUT_PATH, filename)
-    if os.path.exists(original_voice_file_path):
-        os.rename(original_voice_file_path, os.path.join(character_path, filename))
-
-character_directories = [i for i in os.listdir(OUTPUT_PATH) if os.path.isdir(os.path.join(OUTPUT_PATH, i))]
-total_voice_count = 0
-for i in character_directories:
-    character_voice_files = os.listdir(os.path.join(OUTPUT_PATH, i))
-    for file in character_voice_files:
-        assert file.endswith(AUDIO_FORMAT)
-    character_voice_count = len(character_voice_files)
-    total_voice_count += character_voice_count
-    print(i, character_voice_count)
-print()
-print('TOTAL:', total_voice_count)
+DATASET = 'episode'
+# filename -> folder each extracted segment was left in by the last run, the baseline of --relabel
+APPLIED_LABELS_FILE = os.path.join(OUTPUT_PATH, ".labels-applied.json")
+
+
+def labels_at_revision(revision: str, csv_path: str = DATASETS[DATASET][0]) -> dict[str, str]:
+    """filename -> character of meta.csv as committed in a git revision."""
+    proc = subprocess.run(['git', 'show', f'{revision}:{csv_path}'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise SystemExit(f"ERROR: cannot read {csv_path} at {revision}: {proc.stderr.decode(errors='replace').strip()}")
+    data = proc.stdout
+    reader = csv.reader(io.StringIO(data.decode('utf_8_sig'), newline=''))
+    next(reader, None)
+    return {row[0]: row[1] if len(row) > 1 else '' for row in reader if row}
+
+
+def read_applied_labels() -> dict[str, str]:
+    try:
+        with open(APPLIED_LABELS_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_applied_labels(labels: dict[str, str]) -> None:
+    os.makedirs(OUTPUT_PATH, exist_ok=True)
+    tmp = f"{APPLIED_LABELS_FILE}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(labels, f, ensure_ascii=False)
+    os.replace(tmp, APPLIED_LABELS_FILE)
+
+
+def move_segment(manifest: BuildManifest, filename: str, src_rel: str, character: str) -> str:
+    """Move a segment from `src_rel` into its character's folder (the top level without one); return the new path."""
+    dest_rel = os.path.join(character, filename) if character else filename
+    dest = os.path.join(OUTPUT_PATH, dest_rel)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(os.path.join(OUTPUT_PATH, src_rel), dest)
+    manifest.relocate(filename, dest)
+    return dest_rel
+
+
+def divide(index: SegmentIndex, manifest: BuildManifest) -> list[tuple[str, str, str]]:
+    """Move labelled segments still at the top level; return (filename, old path, new path) per move."""
+    # the index knows where every segment is (from the build manifest), so only the labelled segments
+    # still at the top level are looked at
+    moves = []
+    for filename, character, output_path in index.misplaced(DATASET):
+        if '/' in output_path:
+            continue  # already in a character folder; see --relabel
+        if os.path.exists(os.path.join(OUTPUT_PATH, output_path)):
+            moves.append((filename, output_path, move_segment(manifest, filename, output_path, character)))
+    return moves
+
+
+def relabel(index: SegmentIndex, manifest: BuildManifest, old_labels: dict[str, str],
+            new_labels: dict[str, str]) -> list[tuple[str, str, str]]:
+    """Move only the segments whose character differs between `old_labels` and `new_labels`."""
+    changed = {filename: character for filename, character in new_labels.items() if old_labels.get(filename, '') != character}
+    # and those not in their character's folder whatever the baseline says
+    for filename, character, _ in index.misplaced(DATASET):
+        changed.setdefault(filename, character)
+    recorded = index.output_paths(DATASET, changed)
+    moves = []
+    for filename, character in changed.items():
+        old = old_labels.get(filename, '')
+        # where the index last saw it, else where the old label put it
+        candidates = [recorded.get(filename), os.path.join(old, filename) if old else filename, filename]
+        src_rel = next((rel for rel in candidates if rel and os.path.isfile(os.path.join(OUTPUT_PATH, rel))), None)
+        if src_rel is None:
+            continue  # not extracted (yet)
+        if os.path.normpath(src_rel) == os.path.normpath(os.path.join(character, filename) if character else filename):
+            continue  # already moved, e.g. by an interrupted run
+        moves.append((filename, src_rel, move_segment(manifest, filename, src_rel, character)))
+    return moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Move the segments in raw-vocal-output/ into per-character folders according to meta.csv.')
+    parser.add_argument('--relabel', action='store_true',
+                        help='Move only the segments whose label changed since the last run (or --since), also between character folders')
+    parser.add_argument('--since', default=None, metavar='REV', help='With --relabel, compare with meta.csv at this git revision instead of the last run')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    # the segment index re-imports meta.csv only when it was edited
+    index = SegmentIndex()
+    index.record_outputs(DATASET)
+    new_labels = {filename: character for filename, (character, _) in index.labels(DATASET).items()}
+    counts = index.counts(DATASET)
+    manifest = BuildManifest(OUTPUT_PATH)
+    if args.relabel:
+        old_labels = labels_at_revision(args.since) if args.since else read_applied_labels()
+        moves = relabel(index, manifest, old_labels, new_labels)
+    else:
+        moves = divide(index, manifest)
+    index.set_output_paths(DATASET, ((filename, new) for filename, _, new in moves))
+    if not args.relabel:
+        counts = index.counts(DATASET)
+    if moves and not manifest.adopting:
+        manifest.save()  # an output dir without a manifest yet is adopted by the next extractor run
+    # record the labels in effect on disk, not meta.csv's: segments the run left alone keep their folder
+    write_applied_labels({segment['filename']: segment['output_path'].rpartition('/')[0]
+                          for segment in index.extracted() if segment['dataset'] == DATASET})
+
+    delta: dict[str, int] = {}
+    for filename, old, new in moves:
+        print(f"Moved {old} -> {new}")
+        for rel, n in ((old, -1), (new, 1)):
+            folder = os.path.dirname(rel)
+            delta[folder] = delta.get(folder, 0) + n
+    if args.relabel:
+        for folder, n in delta.items():
+            counts[folder] = counts.get(folder, 0) + n
+
+    total_voice_count = 0
+    for character, character_voice_count in sorted(counts.items()):
+        if not character:
+            continue  # unlabelled, still at the top level
+        total_voice_count += character_voice_count
+        change = f" ({delta[character]:+d})" if delta.get(character) else ''
+        print(character, f"{character_voice_count}{change}")
+    print()
+    print('TOTAL:', total_voice_count)
+    print(f"{len(moves)} segment(s) moved in {(time.monotonic() - started) * 1000:.0f} ms")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
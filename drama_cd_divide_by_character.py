@@ -5,6 +5,14 @@ This script:
 - Locates source CD audio files in a configurable directory
 - Extracts segments and writes them to `drama-cd-raw-vocal-output/` using the original CSV filename
 - Does NOT create or modify `meta.csv` in the output directory
+- Keeps a build manifest (`drama-cd-raw-vocal-output/.manifest.json`) so reruns only re-encode rows whose
+  source audio or timing changed, move relabelled files, and delete files of removed rows
+- With `--rename-plan` (written by `build_drama_cd_transcript_from_srt.py --rename-plan`), renames segments
+  whose ID changed but whose audio did not, instead of re-encoding them
+- With `--shards DIR`, streams the encoded segments into WebDataset-style tar shards (see `dataset_shards.py`)
+  instead of writing loose files
+- Flags cross-talk: rows whose time range overlaps a row of another character on the same CD, so their
+  segment contains two voices; `--skip-crosstalk` leaves them out of the output
 
 IMPORTANT: Use `--dry-run` to perform a dry-run (no extraction). Without `--dry-run` the script will perform extraction when possible.
 Requires `ffmpeg` on PATH to actually perform extraction. Does not use Whisper.
@@ -12,15 +20,26 @@ Requires `ffmpeg` on PATH to actually perform extraction. Does not use Whisper.
 
 import argparse
 import csv
+import math
 import os
 import re
 import concurrent.futures
 from moviepy.editor import AudioFileClip
 from typing import Optional
 
+from audio_cache import CACHE_DIR, DEFAULT_MAX_BYTES, DecodedAudioCache, source_fingerprint
+from audio_segments import cut_segments, decode_audio, encode_segment, slice_samples, write_segment
+from build_manifest import BuildManifest
+from dataset_shards import DEFAULT_SHARD_BYTES, DRAMA_CD_SERIES, GROUP_BYS, ShardSet
+from segment_index import SegmentIndex
+from separation_store import find_stem, is_store_view, separated_source_id
+from separation_windows import covers, read_separation_windows
+from tools.srt_core import IntervalIndex
+
 # Config
 TRANSCRIPT_CSV = "drama-cd-transcript.csv"
 OUTPUT_DIR = "drama-cd-raw-vocal-output"
+INDEX_DATASET = "drama_cd"
 # Directory containing full CD audio files (user should set to the folder where source audio sits)
 CD_AUDIO_DIR = r"../[MH&Airota&FZSD&VCB-Studio] Shuumatsu Nani Shitemasuka？ Isogashii Desuka？ Sukutte Moratte Ii Desuka？ [Ma10p_1080p]/CDs/"  # original path; can be overridden with --cd-dir
 # Optional directory with htdemucs-separated vocal stems (each album dir contains `vocals.flac`)
@@ -28,9 +47,11 @@ SEPARATED_DIR = "separated/htdemucs"
 SEPARATED_VOCALS_NAME = "vocals.flac"
 AUDIO_EXTENSIONS = {'.flac'}  # only process .flac source audio files (CD sources)
 AUDIO_FORMAT = '.ogg'
+AUDIO_FPS = 44100
 META_CSV = 'meta.csv'
-
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+BACKENDS = ('pcm', 'ffmpeg-batch', 'moviepy')
+# recorded in the build manifest; changing any of these re-encodes every segment
+ENCODER_SETTINGS = {'format': AUDIO_FORMAT, 'codec': 'libvorbis', 'fps': AUDIO_FPS, 'channels': 1}
 
 FILENAME_RE = re.compile(r"\[cd(?P<cd_idx>\d{2})-(?P<track_idx>\d{4})\]\[(?P<start>[^-\]]+)-(?P<end>[^\]]+)\].ogg")
 TIME_RE = re.compile(r"(?P<min>\d{2})\.(?P<sec>\d{2})\.(?P<dec>\d{2})")
@@ -49,34 +70,17 @@ def parse_time_to_seconds(t: str) -> float:
 def find_cd_audio(cd_idx: str, cd_dir: str, separated_dir: Optional[str] = None) -> Optional[str]:
     """Locate the source audio for a given cd index (e.g., '01').
 
-    Priority (changed):
-    1. If `separated_dir` is provided, prefer an htdemucs `vocals.flac` that matches the CD index.
-    2. Otherwise (or if no matching `vocals.flac`), look for CD audio files (e.g. .flac) in `cd_dir` whose basename contains the CD index.
-    3. When multiple candidates exist, select deterministically by sorting or by index mapping.
-
-    This makes `separated/htdemucs/*/vocals.flac` take precedence when available.
+    Priority:
+    1. Look for CD audio files (e.g. .flac) in `cd_dir` whose basename contains the CD index; when multiple
+       candidates exist, select deterministically by sorting or by index mapping.
+    2. If `separated_dir` is provided, prefer the htdemucs `vocals.flac` separated from that CD's content,
+       looked up in the separation store next to `separated_dir`.
+    3. Otherwise fall back to a hand-made `separated_dir/<album>/vocals.flac` that matches the CD index.
     """
     cd_search = f"cd{cd_idx}"
 
-    # 1) prefer separated/htdemucs vocals.flac when available
-    if separated_dir and os.path.isdir(separated_dir):
-        sep_candidates: list[str] = []
-        for root, dirs, files in os.walk(separated_dir):
-            if SEPARATED_VOCALS_NAME in files:
-                sep_candidates.append(os.path.join(root, SEPARATED_VOCALS_NAME))
-        # prefer directories that contain the cd index or '75{cd_idx}' in their name
-        for sc in sep_candidates:
-            dirbase = os.path.basename(os.path.dirname(sc)).lower()
-            if cd_idx in dirbase or f"75{cd_idx}" in dirbase:
-                return sc
-        if sep_candidates:
-            sep_candidates = sorted(sep_candidates)
-            idx = int(cd_idx) - 1
-            if 0 <= idx < len(sep_candidates):
-                return sep_candidates[idx]
-            return sep_candidates[0]
-
-    # 2) fallback to searching original CD audio files (flac, etc.)
+    # 1) search original CD audio files (flac, etc.)
+    cd_audio = None
     candidates: list[str] = []
     if os.path.isdir(cd_dir):
         for root, _, files in os.walk(cd_dir):
@@ -86,16 +90,35 @@ def find_cd_audio(cd_idx: str, cd_dir: str, separated_dir: Optional[str] = None)
     # prefer filename containment
     for c in candidates:
         if cd_search.lower() in os.path.basename(c).lower():
-            return c
+            cd_audio = c
+            break
     # deterministic mapping by sorted order
-    if candidates:
+    if cd_audio is None and candidates:
         candidates = sorted(candidates)
         idx = int(cd_idx) - 1
         if 0 <= idx < len(candidates):
-            return candidates[idx]
-
-    # nothing found
-    return None
+            cd_audio = candidates[idx]
+
+    if separated_dir:
+        # 2) separated vocals of exactly this CD audio
+        if cd_audio:
+            stem = find_stem(cd_audio, separated_dir)
+            if stem:
+                return stem
+        # 3) legacy separated/htdemucs vocals.flac, matched by directory name
+        if os.path.isdir(separated_dir):
+            sep_candidates: list[str] = []
+            for root, dirs, files in os.walk(separated_dir):
+                if SEPARATED_VOCALS_NAME in files and not is_store_view(root):
+                    sep_candidates.append(os.path.join(root, SEPARATED_VOCALS_NAME))
+            # prefer directories that contain the cd index or '75{cd_idx}' in their name
+            for sc in sorted(sep_candidates):
+                dirbase = os.path.basename(os.path.dirname(sc)).lower()
+                if cd_idx in dirbase or f"75{cd_idx}" in dirbase:
+                    print(f"WARNING: using {sc}, which is not in the separation store and may be stale")
+                    return sc
+
+    return cd_audio
 
 
 def extract_segment(source: str, start: float, end: float, dest: str, run: bool = False):
@@ -125,31 +148,204 @@ def extract_segment(source: str, start: float, end: float, dest: str, run: bool
     print(f"Extracted: {dest}")
 
 
-def main(dry_run: bool = False, cd_dir: str = CD_AUDIO_DIR, separated_dir: str = SEPARATED_DIR, jobs: int | None = None):
+def write_batch(samples, segments: list[tuple[float, float, str]],
+                offset: float = 0.0) -> list[tuple[str, Optional[str]]]:
+    """Cut every (start, end, dest) segment from mono int16 `samples` (whose first frame is at `offset` seconds)."""
+    results: list[tuple[str, Optional[str]]] = []
+    for start, end, dest in segments:
+        try:
+            segment = slice_samples(samples, start, end, fps=AUDIO_FPS, offset=offset)
+            write_segment(segment, dest, fps=AUDIO_FPS, codec='libvorbis')
+        except Exception as exc:
+            results.append((dest, str(exc)))
+        else:
+            print(f"Extracted: {dest}")
+            results.append((dest, None))
+    return results
+
+
+def extract_batch(source: str, segments: list[tuple[float, float, str]], cache_dir: Optional[str] = None,
+                  cache_max_bytes: int = DEFAULT_MAX_BYTES) -> list[tuple[str, Optional[str]]]:
+    """Decode `source` once and write every (start, end, dest) segment of the batch (mono, 44.1kHz, .ogg libvorbis).
+
+    With `cache_dir` the whole source is memory-mapped from the decoded-audio cache; otherwise only the
+    time window covered by the batch is decoded. Returns (dest, error message or None) per segment,
+    so one bad segment does not fail the rest of the batch.
+    """
+    samples, window_start = _batch_samples(source, segments, cache_dir, cache_max_bytes)
+    return write_batch(samples, segments, offset=window_start)
+
+
+def _batch_samples(source: str, segments: list[tuple[float, float, str]], cache_dir: Optional[str],
+                   cache_max_bytes: int = DEFAULT_MAX_BYTES):
+    """(mono samples, source time of their first frame) covering every segment of a batch."""
+    if cache_dir:
+        return DecodedAudioCache(cache_dir, cache_max_bytes).get(source, fps=AUDIO_FPS, nchannels=1), 0.0
+    window_start = min(s for s, _, _ in segments)
+    window_end = max(e for _, e, _ in segments)
+    return decode_audio(source, fps=AUDIO_FPS, nchannels=1, start=window_start, end=window_end), window_start
+
+
+def encode_batch(source: str, segments: list[tuple[float, float, str]], cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = DEFAULT_MAX_BYTES) -> list[tuple[str, Optional[bytes], Optional[str]]]:
+    """Like `extract_batch`, but return (name, encoded .ogg bytes or None, error or None) instead of writing files."""
+    samples, window_start = _batch_samples(source, segments, cache_dir, cache_max_bytes)
+    results: list[tuple[str, Optional[bytes], Optional[str]]] = []
+    for start, end, name in segments:
+        try:
+            audio = encode_segment(slice_samples(samples, start, end, fps=AUDIO_FPS, offset=window_start),
+                                   fps=AUDIO_FPS, codec='libvorbis')
+        except Exception as exc:
+            results.append((name, None, str(exc)))
+        else:
+            results.append((name, audio, None))
+    return results
+
+
+def stream_to_shards(tasks: list[tuple[str, float, float, str]], meta: dict[str, dict], shards: ShardSet,
+                     workers: int, cache_dir: Optional[str], cache_max_bytes: int = DEFAULT_MAX_BYTES) -> tuple[int, int]:
+    """Encode (source, start, end, filename) tasks in worker processes and append them to `shards` as they finish.
+
+    Returns (written, failed).
+    """
+    written = failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(encode_batch, src, segments, cache_dir, cache_max_bytes) for src, segments in plan_batches(tasks, workers)]
+        for fut in concurrent.futures.as_completed(futures):
+            for name, audio, error in fut.result():
+                if error is None:
+                    shards.write(name, audio, meta[name])
+                    written += 1
+                else:
+                    failed += 1
+                    print(f"ERROR encoding {name}: {error}")
+    shards.close()
+    return written, failed
+
+
+def separate_and_slice(tasks: list[tuple[str, float, float, str]], separated_dir: str, workers: int,
+                       write_stem: bool = True) -> list[tuple[str, str, Optional[str]]]:
+    """Fused mode: separate each CD with Demucs in-process and cut its segments from the vocals stem in memory.
+
+    The next CD is separated while the current one's segments are encoded by `workers` threads. With
+    `write_stem` the vocals stem is also stored in the separation store. Returns (source, dest, error or None).
+    """
+    from run_demucs_batch import separate_to_pcm
+
+    by_source: dict[str, list[tuple[float, float, str]]] = {}
+    for src, s, e, out in tasks:
+        by_source.setdefault(src, []).append((s, e, out))
+    sources = sorted(by_source)
+    results: list[tuple[str, str, Optional[str]]] = []
+    encoded: list[tuple[str, concurrent.futures.Future]] = []
+    with concurrent.futures.ThreadPoolExecutor(1) as separator, concurrent.futures.ThreadPoolExecutor(workers) as encoders:
+        def separate(i: int) -> Optional[concurrent.futures.Future]:
+            if i >= len(sources):
+                return None
+            return separator.submit(separate_to_pcm, sources[i], 1, AUDIO_FPS, separated_dir=separated_dir, write_stem=write_stem)
+
+        pending = separate(0)
+        for i, src in enumerate(sources):
+            segments = sorted(by_source[src])
+            try:
+                samples = pending.result()
+            except Exception as exc:
+                results.extend((src, out, f"separation failed: {exc}") for _, _, out in segments)
+                continue
+            finally:
+                pending = separate(i + 1)
+            print(f"Separated {src}; cutting {len(segments)} segment(s)")
+            size = math.ceil(len(segments) / workers)
+            for j in range(0, len(segments), size):
+                encoded.append((src, encoders.submit(write_batch, samples, segments[j:j + size])))
+            samples = None
+        for src, fut in encoded:
+            results.extend((src, out, error) for out, error in fut.result())
+    return results
+
+
+def cut_batch(source: str, segments: list[tuple[float, float, str]]) -> list[tuple[str, Optional[str]]]:
+    """Write every segment of the batch through single-process ffmpeg commands (mono, 44.1kHz, .ogg libvorbis)."""
+    results = cut_segments(source, segments, fps=AUDIO_FPS, nchannels=1, codec='libvorbis')
+    for dest, error in results:
+        if error is None:
+            print(f"Extracted: {dest}")
+    return results
+
+
+def plan_batches(tasks: list[tuple[str, float, float, str]], workers: int) -> list[tuple[str, list[tuple[float, float, str]]]]:
+    """Group extraction tasks into per-source batches of time-contiguous segments.
+
+    Each source is split into chunks of at most ceil(len(tasks) / workers) segments, so a CD with many more
+    rows than the others does not leave workers idle. Batches are returned largest first, which makes the
+    executor's first-come scheduling a longest-processing-time-first assignment.
+    """
+    by_source: dict[str, list[tuple[float, float, str]]] = {}
+    for src, s, e, out in tasks:
+        by_source.setdefault(src, []).append((s, e, out))
+    target = max(1, math.ceil(len(tasks) / max(1, workers)))
+    batches: list[tuple[str, list[tuple[float, float, str]]]] = []
+    for src, segments in by_source.items():
+        segments.sort()
+        n_chunks = math.ceil(len(segments) / target)
+        size = math.ceil(len(segments) / n_chunks)
+        for i in range(0, len(segments), size):
+            batches.append((src, segments[i:i + size]))
+    batches.sort(key=lambda b: len(b[1]), reverse=True)
+    return batches
+
+
+def segment_inputs(source_sha256: str, start: float, end: float) -> dict:
+    """Everything a segment's audio depends on, as recorded in the build manifest."""
+    return {'source': source_sha256, 'start_ms': round(start * 1000), 'end_ms': round(end * 1000), 'encoder': ENCODER_SETTINGS}
+
+
+def find_crosstalk(rows) -> dict[str, list[str]]:
+    """Map the filename of every row that overlaps a row of another character on the same CD to those rows' filenames.
+
+    Rows without a character overlap everyone.
+    """
+    by_cd: dict[str, list] = {}
+    for filename, character, _, cd_idx, start_s, end_s in rows:
+        by_cd.setdefault(cd_idx, []).append((start_s, end_s, (filename, character)))
+    crosstalk: dict[str, list[str]] = {}
+    for intervals in by_cd.values():
+        index = IntervalIndex(intervals)
+        for (filename, character), (other, other_character) in index.overlapping_pairs():
+            if character and character == other_character:
+                continue
+            crosstalk.setdefault(filename, []).append(other)
+            crosstalk.setdefault(other, []).append(filename)
+    return crosstalk
+
+
+def main(dry_run: bool = False, cd_dir: str = CD_AUDIO_DIR, separated_dir: str = SEPARATED_DIR, jobs: int | None = None,
+         backend: str = 'pcm', cache_dir: str | None = CACHE_DIR, cache_max_bytes: int = DEFAULT_MAX_BYTES,
+         remove_orphans: bool = True, rename_plan: Optional[str] = None, separate: bool = False, write_stem: bool = True,
+         skip_crosstalk: bool = False, shards: Optional[ShardSet] = None):
+    if (separate or shards) and backend != 'pcm':
+        raise SystemExit("ERROR: --separate and --shards need the 'pcm' backend")
+    if shards and (separate or rename_plan):
+        raise SystemExit("ERROR: --shards cannot be combined with --separate or --rename-plan")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     if not os.path.exists(TRANSCRIPT_CSV):
         raise FileNotFoundError(f"Transcript CSV not found at {TRANSCRIPT_CSV}")
 
     rows = []
     max_cdseen = 0
-    with open(TRANSCRIPT_CSV, newline='', encoding='utf_8_sig') as f:
-        reader = csv.reader(f)
-        header = next(reader, None)
-        for row in reader:
-            if not row or len(row) < 1:
-                continue
-            # allow empty character/content fields
-            filename = row[0]
-            character = row[1] if len(row) > 1 else ''
-            content = row[2] if len(row) > 2 else ''
-            m = FILENAME_RE.match(filename)
-            if not m:
-                print(f"Skipping unrecognized filename format: {filename}")
-                continue
-            cd_idx = m.group('cd_idx')
-            start_s = parse_time_to_seconds(m.group('start'))
-            end_s = parse_time_to_seconds(m.group('end'))
-            max_cdseen = max(max_cdseen, int(cd_idx))
-            rows.append((filename, character, content, cd_idx, start_s, end_s))
+    # the segment index re-imports the transcript CSV only when it was edited since the last run
+    index = SegmentIndex()
+    for filename, character, content in index.rows(INDEX_DATASET):
+        # allow empty character/content fields
+        m = FILENAME_RE.match(filename)
+        if not m:
+            print(f"Skipping unrecognized filename format: {filename}")
+            continue
+        cd_idx = m.group('cd_idx')
+        start_s = parse_time_to_seconds(m.group('start'))
+        end_s = parse_time_to_seconds(m.group('end'))
+        max_cdseen = max(max_cdseen, int(cd_idx))
+        rows.append((filename, character, content, cd_idx, start_s, end_s))
 
     # Try to automatically locate CD audio files for missing ones
     cd_cache = {}
@@ -175,10 +371,59 @@ def main(dry_run: bool = False, cd_dir: str = CD_AUDIO_DIR, separated_dir: str =
         print("No files were created (dry-run).\n")
         return
 
-    # Process each row (no meta.csv operations) — build task list first
+    # Process each row (no meta.csv operations) — build task list first.
+    # The build manifest decides what to (re-)encode: only rows whose source audio, timing or encoder
+    # settings changed; up-to-date files whose character changed are just moved.
+    manifest = BuildManifest(OUTPUT_DIR)
+    if rename_plan:
+        with open(rename_plan, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            renamed = manifest.rename_many((row[0], row[1]) for row in reader if len(row) >= 2)
+        print(f"Applied {renamed} rename(s) from {rename_plan}")
+    # fused separate-and-slice: CDs without separated vocals are separated in-process (see separate_and_slice)
+    fused_sources = {src for src in cd_cache.values() if separate and src and os.path.basename(src) != SEPARATED_VOCALS_NAME}
+    source_sha256 = {cd_idx: separated_source_id(src, separated_dir) if src in fused_sources else source_fingerprint(src)['sha256']
+                     for cd_idx, src in cd_cache.items() if src}
+    # dialogue-only stems are silent outside their separated windows
+    for cd_idx, src in cd_cache.items():
+        windows = read_separation_windows(src) if src else None
+        if windows is None:
+            continue
+        uncovered = sum(1 for _, _, _, row_cd, start_s, end_s in rows if row_cd == cd_idx and not covers(windows, start_s, end_s))
+        if uncovered:
+            print(f"WARNING: {uncovered} row(s) of cd{cd_idx} fall outside the separated windows of {src}; "
+                  f"re-run run_demucs_all_CDs.py --dialogue-only")
+    crosstalk = find_crosstalk(rows)
+    if crosstalk:
+        print(f"WARNING: {len(crosstalk)} row(s) overlap another character's line (cross-talk)"
+              f"{'; skipping them' if skip_crosstalk else ''}:")
+        for filename in sorted(crosstalk):
+            print(f"  {filename} overlaps {', '.join(crosstalk[filename])}")
+    if not skip_crosstalk:
+        crosstalk = {}
+
+    if shards is not None:
+        # no loose files and no build manifest: every row is encoded straight into the shards
+        shard_tasks = [(cd_cache[cd_idx], start_s, end_s, filename) for filename, _, _, cd_idx, start_s, end_s in rows
+                       if cd_cache.get(cd_idx) and filename not in crosstalk]
+        meta = {filename: {'character': character, 'content': content, 'source': f'cd{cd_idx}', 'start': start_s, 'end': end_s}
+                for filename, character, content, cd_idx, start_s, end_s in rows}
+        workers = jobs if (jobs and jobs > 0) else (os.cpu_count() or 1)
+        if cache_dir:
+            DecodedAudioCache(cache_dir, cache_max_bytes).prefill(sorted({src for src, _, _, _ in shard_tasks}),
+                                                                  fps=AUDIO_FPS, nchannels=1)
+        print(f"Streaming {len(shard_tasks)} segment(s) into shards in {shards.out_dir} with {workers} worker(s)...")
+        written, failed = stream_to_shards(shard_tasks, meta, shards, workers, cache_dir, cache_max_bytes)
+        print(f'\nFinished. Shards: {shards.out_dir}')
+        print(f'Written: {written}, Failed: {failed}, Skipped (missing source or cross-talk): {len(rows) - len(shard_tasks)}')
+        return
     processed = 0
     skipped_missing = 0
+    up_to_date = 0
+    skipped_crosstalk = 0
     tasks: list[tuple[str, float, float, str]] = []
+    task_inputs: dict[str, dict] = {}
 
     for filename, character, content, cd_idx, start_s, end_s in rows:
         src = cd_cache.get(cd_idx)
@@ -194,12 +439,27 @@ def main(dry_run: bool = False, cd_dir: str = CD_AUDIO_DIR, separated_dir: str =
             print(f"Skipping {filename}: no source audio for cd{cd_idx}")
             skipped_missing += 1
             continue
+        if filename in crosstalk:
+            skipped_crosstalk += 1
+            continue
 
-        if os.path.exists(out_path):
-            print(f"Skipping {filename}: output already exists at {out_path}")
+        inputs = segment_inputs(source_sha256[cd_idx], start_s, end_s)
+        if not manifest.plan(filename, inputs, out_path, relocate=True):
+            up_to_date += 1
             continue
 
         tasks.append((src, start_s, end_s, out_path))
+        task_inputs[out_path] = inputs
+
+    if remove_orphans:
+        # segments skipped for cross-talk are removed like those of deleted rows
+        for rel in manifest.remove_orphans(filename for filename, *_ in rows if filename not in crosstalk):
+            print(f"Removed orphan {rel}")
+    manifest.save()
+    index.record_outputs(INDEX_DATASET, manifest.segments)
+    print(f"Up to date: {up_to_date}")
+    if skipped_crosstalk:
+        print(f"Skipped (cross-talk): {skipped_crosstalk}")
 
     if not tasks:
         print('\nNo extraction tasks to run.')
@@ -216,29 +476,77 @@ def main(dry_run: bool = False, cd_dir: str = CD_AUDIO_DIR, separated_dir: str =
             print(f"  ... ({len(tasks)-10} more)")
         return
 
-    # Run extractions in parallel using ProcessPoolExecutor
     max_workers = jobs if (jobs and jobs > 0) else (os.cpu_count() or 1)
+    failures = 0
+    fused_tasks = [t for t in tasks if t[0] in fused_sources]
+    tasks = [t for t in tasks if t[0] not in fused_sources]
+    if fused_tasks:
+        print(f"Separating {len({t[0] for t in fused_tasks})} CD(s) in-process for {len(fused_tasks)} segment(s)...")
+        try:
+            for src, out, error in separate_and_slice(fused_tasks, separated_dir, max_workers, write_stem):
+                if error is None:
+                    processed += 1
+                    manifest.record(os.path.basename(out), task_inputs[out], out)
+                else:
+                    failures += 1
+                    print(f"ERROR extracting {os.path.basename(out)} from {src}: {error}")
+        finally:
+            manifest.save()
+
+    # Run extractions in parallel using ProcessPoolExecutor
     print(f"Running {len(tasks)} extraction tasks with {max_workers} worker(s)...")
 
-    failures = 0
+    if backend == 'pcm' and cache_dir:
+        # fill the decoded-audio cache up front (and apply its size cap, keeping every source of this run)
+        # so workers only memory-map entries
+        sources = sorted({src for src, _, _, _ in tasks})
+        for src in sources:
+            print(f"Decoded-audio cache: {src}")
+        DecodedAudioCache(cache_dir, cache_max_bytes).prefill(sources, fps=AUDIO_FPS, nchannels=1)
+    else:
+        cache_dir = None
+
     with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-        future_to_task = {executor.submit(extract_segment, src, s, e, out, True): (src, s, e, out)
-                          for (src, s, e, out) in tasks}
+        if backend in ('pcm', 'ffmpeg-batch'):
+            # one job per (source, contiguous chunk): every worker decodes each CD (or vocals.flac) window once
+            batches = plan_batches(tasks, max_workers)
+            print(f"Grouped into {len(batches)} per-source batch(es)")
+            if backend == 'pcm':
+                future_to_task = {executor.submit(extract_batch, src, segments, cache_dir, cache_max_bytes): (src, segments)
+                                  for (src, segments) in batches}
+            else:
+                future_to_task = {executor.submit(cut_batch, src, segments): (src, segments)
+                                  for (src, segments) in batches}
+        else:
+            future_to_task = {executor.submit(extract_segment, src, s, e, out, True): (src, [(s, e, out)])
+                              for (src, s, e, out) in tasks}
         try:
             for fut in concurrent.futures.as_completed(future_to_task):
-                src, s, e, out = future_to_task[fut]
+                src, segments = future_to_task[fut]
                 try:
-                    fut.result()
+                    result = fut.result()
                 except Exception as exc:
-                    failures += 1
-                    print(f"ERROR extracting {os.path.basename(out)} from {src}: {exc}")
-                else:
-                    processed += 1
+                    failures += len(segments)
+                    for _, _, out in segments:
+                        print(f"ERROR extracting {os.path.basename(out)} from {src}: {exc}")
+                    continue
+                if backend == 'moviepy':
+                    result = [(segments[0][2], None)]
+                for out, error in result:
+                    if error is None:
+                        processed += 1
+                        manifest.record(os.path.basename(out), task_inputs[out], out)
+                    else:
+                        failures += 1
+                        print(f"ERROR extracting {os.path.basename(out)} from {src}: {error}")
         except KeyboardInterrupt:
             print("Interrupted by user — cancelling remaining tasks...")
             for f in future_to_task:
                 f.cancel()
             raise
+        finally:
+            manifest.save()
+            index.record_outputs(INDEX_DATASET, manifest.segments)
 
     print('\nFinished. Output dir:', OUTPUT_DIR)
     print(f'Processed: {processed}, Failed: {failures}, Skipped (missing source): {skipped_missing}')
@@ -250,5 +558,25 @@ if __name__ == '__main__':
     parser.add_argument('--cd-dir', default=CD_AUDIO_DIR, help='Directory containing source CD audio files')
     parser.add_argument('--separated-dir', default=SEPARATED_DIR, help='Directory containing htdemucs separated outputs (contains <album>/vocals.flac)')
     parser.add_argument('--jobs', '-j', type=int, default=None, help='Number of worker processes to use (default: cpu_count())')
+    parser.add_argument('--backend', choices=BACKENDS, default='pcm',
+                        help="'pcm': each worker decodes a CD window once and cuts all its segments (default); "
+                             "'ffmpeg-batch': one ffmpeg process per chunk of segments; 'moviepy': open the source once per segment")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f'Decoded-audio cache directory (default: {CACHE_DIR})')
+    parser.add_argument('--cache-max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3, help='Size cap of the decoded-audio cache in GiB')
+    parser.add_argument('--no-cache', action='store_true', help='Decode only each batch window in memory without using the decoded-audio cache')
+    parser.add_argument('--keep-orphans', action='store_true', help='Do not delete previously built segments whose row was removed from the transcript')
+    parser.add_argument('--rename-plan', default=None, help='CSV of old_filename,new_filename renames to apply before extracting (from build_drama_cd_transcript_from_srt.py --rename-plan)')
+    parser.add_argument('--separate', action='store_true',
+                        help='Separate CDs without separated vocals with Demucs in-process and slice the vocals stem from memory '
+                             '(segments are tracked by the separation rather than by a vocals.flac, so switching modes re-encodes them)')
+    parser.add_argument('--no-write-stem', action='store_true', help='With --separate, do not also store the full vocals.flac')
+    parser.add_argument('--skip-crosstalk', action='store_true', help="Leave out rows that overlap another character's line")
+    parser.add_argument('--shards', default=None, help='Write the segments into WebDataset-style tar shards in this directory instead of loose files')
+    parser.add_argument('--shard-group-by', choices=GROUP_BYS, default='character', help='One shard series per character (default) or per train/val split')
+    parser.add_argument('--shard-mb', type=int, default=DEFAULT_SHARD_BYTES // 1024 ** 2, help='Shard size in MiB (default: 256)')
     args = parser.parse_args()
-    main(dry_run=args.dry_run, cd_dir=args.cd_dir, separated_dir=args.separated_dir, jobs=args.jobs)
+    main(dry_run=args.dry_run, cd_dir=args.cd_dir, separated_dir=args.separated_dir, jobs=args.jobs, backend=args.backend,
+         cache_dir=None if args.no_cache else args.cache_dir, cache_max_bytes=int(args.cache_max_gb * 1024 ** 3),
+         remove_orphans=not args.keep_orphans, rename_plan=args.rename_plan, separate=args.separate,
+         write_stem=not args.no_write_stem, skip_crosstalk=args.skip_crosstalk,
+         shards=ShardSet(args.shards, DRAMA_CD_SERIES, args.shard_group_by, args.shard_mb * 1024 ** 2) if args.shards else None)
@@ -1,14 +1,21 @@
 from collections import namedtuple
+import argparse
 import os
 import re
 import sys
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 import ass
 from moviepy.editor import VideoFileClip, AudioFileClip
 
-pool = ThreadPoolExecutor(os.cpu_count())
-metadata_lock = threading.Lock()
+from audio_cache import CACHE_DIR, DEFAULT_MAX_BYTES, DecodedAudioCache, demux_audio_track, source_fingerprint
+from audio_segments import cut_segments, decode_audio, encode_segment, iter_segment_chunks, slice_samples, write_segment
+from build_manifest import BuildManifest
+from dataset_shards import DEFAULT_SHARD_BYTES, EPISODE_SERIES, GROUP_BYS, ShardSet
+from segment_index import SegmentIndex
+from separation_store import find_stem, is_store_view, separated_source_id
+from separation_windows import covers, read_separation_windows
+from tools.srt_core import IntervalIndex
 
 SUBTITLE_PATH = "../[XKsub] 終末なにしてますか [简日·繁日双语字幕]/[XKsub] 終末なにしてますか chs_jap"
 VIDEO_PATH = "../[MH&Airota&FZSD&VCB-Studio] Shuumatsu Nani Shitemasuka？ Isogashii Desuka？ Sukutte Moratte Ii Desuka？ [Ma10p_1080p]"
@@ -17,23 +24,102 @@ SEPARATED_DIR = "separated/htdemucs"
 OUTPUT_PATH = "raw-vocal-output"
 METADATA_CSV_FILE = "meta.csv"
 AUDIO_FORMAT = '.ogg'
+AUDIO_FPS = 44100
+AUDIO_CHANNELS = 2
+# recorded in the build manifest; changing any of these re-encodes every segment
+ENCODER_SETTINGS = {'format': AUDIO_FORMAT, 'codec': 'libvorbis', 'fps': AUDIO_FPS, 'channels': AUDIO_CHANNELS}
+BACKENDS = ('pcm', 'ffmpeg-batch', 'moviepy')
+# in-flight segment tasks per worker thread; bounds memory held by queued tasks
+QUEUE_DEPTH_PER_JOB = 2
 
+SubtitleItem = namedtuple('SubtitleItem', ('start', 'end', 'text'))
 
-def main():
+
+def load_subtitles(subtitle_path: str) -> list[SubtitleItem]:
+    with open(subtitle_path, 'r', encoding='utf_8_sig') as f:
+        subtitle_doc = ass.parse_file(f)
+    return [SubtitleItem(s.start, s.end, re.sub(r"{.*}", "", s.text)) for s in subtitle_doc.events if s.TYPE == 'Dialogue' and "jap" in s.style]
+
+
+def list_subtitle_files(subtitle_dir: str = SUBTITLE_PATH) -> list[str]:
+    """Return the paths of the 12 episode .ass files, sorted by episode number."""
+    all_subtitles = [s for s in os.listdir(subtitle_dir) if s.endswith(".ass")]
+    assert len(all_subtitles) == 12
+    def epnum_from_sub(s: str) -> int:
+        m = re.search(r"(\d{2})\.chs_jap\.ass$", s)
+        return int(m.group(1)) if m else 999
+    return [os.path.join(subtitle_dir, s) for s in sorted(all_subtitles, key=epnum_from_sub)]
+
+
+def find_crosstalk(subtitles: list[SubtitleItem]) -> set[int]:
+    """Indices of subtitles whose time range overlaps another Japanese dialogue line (two voices in one segment).
+
+    The episode subtitles carry no speaker, so any overlap counts.
+    """
+    index = IntervalIndex((s.start.total_seconds(), s.end.total_seconds(), i) for i, s in enumerate(subtitles))
+    return {i for pair in index.overlapping_pairs() for i in pair}
+
+
+def segment_filename(episode: int, sub_index: int, s: SubtitleItem) -> str:
+    start_time_str = str(s.start).replace(':', '.')
+    if len(start_time_str) == len('0:01:22'):
+        start_time_str = start_time_str[2:] + '.00'
+    else:
+        start_time_str = start_time_str[2:-4]
+    end_time_str = str(s.end).replace(':', '.')
+    if len(end_time_str) == len('0:01:22'):
+        end_time_str = end_time_str[2:] + '.00'
+    else:
+        end_time_str = end_time_str[2:-4]
+    output_filename = f"[{str(episode).zfill(2)}-{str(sub_index + 1).zfill(4)}][{start_time_str}-{end_time_str}]{AUDIO_FORMAT}"
+    assert len(output_filename) == len(f'[01-0001][00.04.75-00.07.46]{AUDIO_FORMAT}')
+    return output_filename
+
+
+def extract_pcm_segment(samples, s: SubtitleItem, dest: str):
+    segment = slice_samples(samples, s.start.total_seconds(), s.end.total_seconds(), fps=AUDIO_FPS)
+    write_segment(segment, dest, fps=AUDIO_FPS)
+
+
+def shard_pcm_segment(samples, s: SubtitleItem, filename: str, shards: ShardSet, meta: dict):
+    segment = slice_samples(samples, s.start.total_seconds(), s.end.total_seconds(), fps=AUDIO_FPS)
+    shards.write(filename, encode_segment(segment, fps=AUDIO_FPS, codec=ENCODER_SETTINGS['codec']), meta)
+
+
+def extract_moviepy_segment(source_path: str, s: SubtitleItem, dest: str):
+    # MoviePy readers are not thread-safe, so every task opens its own clip
+    if source_path.lower().endswith(('.wav', '.flac', '.mka')):
+        with AudioFileClip(source_path) as clip:
+            clip.subclip(str(s.start), str(s.end)).write_audiofile(dest, verbose=False, logger=None)
+    else:
+        with VideoFileClip(source_path) as clip:
+            clip.subclip(str(s.start), str(s.end)).audio.write_audiofile(dest, verbose=False, logger=None)
+
+
+def segment_inputs(source_sha256: str, s: SubtitleItem) -> dict:
+    """Everything a segment's audio depends on, as recorded in the build manifest."""
+    return {
+        'source': source_sha256,
+        'start_ms': round(s.start.total_seconds() * 1000),
+        'end_ms': round(s.end.total_seconds() * 1000),
+        'encoder': ENCODER_SETTINGS,
+    }
+
+
+def main(backend: str = 'pcm', jobs: int | None = None, cache_dir: str | None = CACHE_DIR,
+         cache_max_bytes: int = DEFAULT_MAX_BYTES, remove_orphans: bool = True, demux: bool = True,
+         separate: bool = False, write_stem: bool = True, skip_crosstalk: bool = False,
+         shards: ShardSet | None = None):
+    if (separate or shards) and backend != 'pcm':
+        print("ERROR: --separate and --shards need the 'pcm' backend", file=sys.stderr)
+        return 2
     if not os.path.exists(OUTPUT_PATH):
         os.mkdir(OUTPUT_PATH)
     if os.listdir(OUTPUT_PATH):
         print(f"WARNING: OUTPUT_PATH {OUTPUT_PATH} not empty", file=sys.stderr)
         # input('Press ENTER to continue. This will overwrite everything including the metadata csv file!')
     
-    # collect and sort subtitle files by episode number
-    all_subtitles = [s for s in os.listdir(SUBTITLE_PATH) if s.endswith(".ass")]
-    assert len(all_subtitles) == 12
-    def epnum_from_sub(s: str) -> int:
-        m = re.search(r"(\d{2})\.chs_jap\.ass$", s)
-        return int(m.group(1)) if m else 999
-    all_subtitles = sorted(all_subtitles, key=epnum_from_sub)
-    all_subtitles_path = [os.path.join(SUBTITLE_PATH, s) for s in all_subtitles]
+    all_subtitles_path = list_subtitle_files()
 
     # collect MKV video sources (fallback)
     all_videos = [s for s in os.listdir(VIDEO_PATH) if s.endswith(".mkv")]
@@ -44,19 +130,25 @@ def main():
     all_videos = sorted(all_videos, key=epnum_from_mkv)
     all_videos_path = [os.path.join(VIDEO_PATH, s) for s in all_videos]
 
-    # prefer separated/htdemucs vocals.flac when available (ignore KAXA-75* dirs)
+    # prefer separated vocals when available, looked up in the separation store by the MKV's content hash
     separated_map: dict[int, str] = {}
+    for ep, video_path in enumerate(all_videos_path, 1):
+        stem = find_stem(video_path, SEPARATED_DIR)
+        if stem:
+            separated_map[ep] = stem
+    # fall back to hand-made separated/htdemucs/<name>/vocals.flac directories (ignore KAXA-75* dirs)
     if os.path.isdir(SEPARATED_DIR):
         for name in os.listdir(SEPARATED_DIR):
-            if name.startswith('KAXA-75'):
+            if name.startswith('KAXA-75') or is_store_view(os.path.join(SEPARATED_DIR, name)):
                 continue
             # expect directory names to include episode like 'sukasuka [01]'
             m = re.search(r"\[(\d{2})\]", name)
-            if not m:
+            if not m or int(m.group(1)) in separated_map:
                 continue
             ep = int(m.group(1))
             cand = os.path.join(SEPARATED_DIR, name, 'vocals.flac')
             if os.path.isfile(cand):
+                print(f"WARNING: using {cand}, which is not in the separation store and may be stale", file=sys.stderr)
                 separated_map[ep] = cand
 
     # build final ordered source list (separated vocals preferred)
@@ -69,55 +161,191 @@ def main():
             all_sources.append(all_videos_path[idx - 1])
 
     assert len(all_sources) == len(all_subtitles_path) == 12
+
+    # fused separate-and-slice: episodes without separated vocals are separated in-process and their vocals
+    # stem is sliced straight from memory (see prefetch below)
+    fused = {idx - 1 for idx in range(1, 13) if idx not in separated_map} if separate else set()
+    if fused:
+        from run_demucs_batch import separate_to_pcm
+        print(f"separating episode(s) {', '.join(str(i + 1) for i in sorted(fused))} in-process")
+
+    # Source preparation: stream-copy the audio track out of each MKV once (cached under audio-cache/demuxed),
+    # so slicing reads an audio-only file instead of setting up a 1080p video reader.
+    # all_sources_original keeps the MKV paths, which fingerprint the segments in the build manifest.
+    all_sources_original = list(all_sources)
+    if demux:
+        mkv_indices = [i for i, src in enumerate(all_sources) if src.lower().endswith('.mkv')]
+        with ThreadPoolExecutor(min(4, len(mkv_indices)) or 1) as demux_pool:
+            demuxed = demux_pool.map(lambda i: demux_audio_track(all_sources[i], cache_dir or CACHE_DIR), mkv_indices)
+            for i, path in zip(mkv_indices, demuxed):
+                print(f"audio track of episode {i + 1}: {path}")
+                all_sources[i] = path
     
-    SubtitleItem = namedtuple('SubtitleItem', ('start', 'end', 'text'))
-    # Do not read or write any CSV files anywhere. Determine already-completed audio
-    # segments from the existing files in the output directory so we never create
-    # or modify a .csv file.
-    completed_filenames = {f for f in os.listdir(OUTPUT_PATH) if f.lower().endswith(AUDIO_FORMAT)}
-
-    for i, (video_path, subtitle_path) in enumerate(zip(all_videos_path, all_subtitles_path)):
-        print(i, video_path, subtitle_path)
-        with open(subtitle_path, 'r', encoding='utf_8_sig') as f:
-            subtitle_doc = ass.parse_file(f)
-        subtitles = [SubtitleItem(s.start, s.end, re.sub(r"{.*}", "", s.text)) for s in subtitle_doc.events if s.TYPE == 'Dialogue' and "jap" in s.style]
-        print(f'{len(subtitles)} subtitles')
-
-        source_path = all_sources[i]
-        is_audio_source = source_path.lower().endswith(('.wav', '.flac'))
-        clip = AudioFileClip(source_path) if is_audio_source else VideoFileClip(source_path)
-
-        for sub_index, s in enumerate(subtitles):
-            start_time_str = str(s.start).replace(':', '.')
-            if len(start_time_str) == len('0:01:22'):
-                start_time_str = start_time_str[2:] + '.00'
-            else:
-                start_time_str = start_time_str[2:-4]
-            end_time_str = str(s.end).replace(':', '.')
-            if len(end_time_str) == len('0:01:22'):
-                end_time_str = end_time_str[2:] + '.00'
+    # Do not read or write any CSV files anywhere. Already-completed audio segments are tracked by the
+    # build manifest (OUTPUT_PATH/.manifest.json): a segment is re-encoded only when its source, timing or
+    # encoder settings changed, and it is found even after divide_by_character.py moved it.
+    # with --shards, every segment is encoded straight into the shards instead: no loose files, no manifest
+    manifest = BuildManifest(OUTPUT_PATH)
+    labels = SegmentIndex().labels('episode') if shards is not None else {}
+    planned_filenames: set[str] = set()
+    metadata_lock = threading.Lock()
+
+    max_workers = jobs if (jobs and jobs > 0) else (os.cpu_count() or 1)
+    print(f"Encoding segments with {max_workers} worker thread(s)")
+    pool = ThreadPoolExecutor(max_workers)
+    # decodes the next episode while segments of the current one are being encoded
+    decode_pool = ThreadPoolExecutor(1)
+    # bounded work queue: the main thread blocks once this many segment tasks are queued or running
+    slots = threading.BoundedSemaphore(max_workers * QUEUE_DEPTH_PER_JOB)
+    failures: list[str] = []
+    # decoded sources are memory-mapped from the persistent cache instead of being decoded every run
+    cache = DecodedAudioCache(cache_dir, cache_max_bytes) if (cache_dir and backend == 'pcm') else None
+
+    def submit(task, outputs: dict[str, dict], *task_args):
+        """Queue `task(*task_args)`, which writes the `outputs` (filename -> manifest inputs) and may return (dest, error) per file."""
+        output_filenames = list(outputs)
+
+        def thread_task():
+            print(f"starting {', '.join(output_filenames)}")
+            results = task(*task_args) or [(os.path.join(OUTPUT_PATH, name), None) for name in output_filenames]
+            for dest, error in results:
+                name = os.path.basename(dest)
+                if error is None:
+                    if shards is None:
+                        manifest.record(name, outputs[name], dest)
+                    print(f"finished {name}")
+                else:
+                    with metadata_lock:
+                        failures.append(name)
+                    print(f"ERROR extracting {name}: {error}", file=sys.stderr)
+
+        def on_done(fut: Future):
+            slots.release()
+            if fut.exception() is not None:
+                with metadata_lock:
+                    failures.extend(output_filenames)
+                print(f"ERROR extracting {', '.join(output_filenames)}: {fut.exception()}", file=sys.stderr)
+
+        slots.acquire()
+        pool.submit(thread_task).add_done_callback(on_done)
+
+    def prefetch(i: int) -> Future | None:
+        if backend != 'pcm' or i >= len(all_sources):
+            return None
+        if i in fused:
+            # separating the next episode overlaps with encoding the current one's segments
+            return decode_pool.submit(separate_to_pcm, all_videos_path[i], AUDIO_CHANNELS, AUDIO_FPS,
+                                      separated_dir=SEPARATED_DIR, write_stem=write_stem)
+        load = cache.get if cache else decode_audio
+        return decode_pool.submit(load, all_sources[i], fps=AUDIO_FPS, nchannels=AUDIO_CHANNELS)
+
+    try:
+        next_samples = prefetch(0)
+        for i, (video_path, subtitle_path) in enumerate(zip(all_videos_path, all_subtitles_path)):
+            print(i, video_path, subtitle_path)
+            subtitles = load_subtitles(subtitle_path)
+            print(f'{len(subtitles)} subtitles')
+
+            source_path = all_sources[i]
+            if i in fused:
+                source_sha256 = separated_source_id(all_videos_path[i], SEPARATED_DIR)
             else:
-                end_time_str = end_time_str[2:-4]
-            output_filename = f"[{str(i + 1).zfill(2)}-{str(sub_index + 1).zfill(4)}][{start_time_str}-{end_time_str}]{AUDIO_FORMAT}"
-            assert len(output_filename) == len(f'[01-0001][00.04.75-00.07.46]{AUDIO_FORMAT}')
-            if output_filename not in completed_filenames:
+                source_sha256 = source_fingerprint(all_sources_original[i])['sha256']
+            # a dialogue-only stem is silent outside its separated windows
+            windows = read_separation_windows(all_sources_original[i])
+            if windows is not None:
+                uncovered = [s for s in subtitles if not covers(windows, s.start.total_seconds(), s.end.total_seconds())]
+                if uncovered:
+                    print(f"WARNING: {len(uncovered)} subtitle(s) of episode {i + 1} fall outside the separated windows of "
+                          f"{all_sources_original[i]}; re-run run_demucs_all_episodes.py --dialogue-only", file=sys.stderr)
+            crosstalk = find_crosstalk(subtitles)
+            if crosstalk:
+                print(f"WARNING: {len(crosstalk)} subtitle(s) of episode {i + 1} overlap another line (cross-talk)"
+                      f"{'; skipping them' if skip_crosstalk else ''}: "
+                      f"{', '.join(segment_filename(i + 1, k, subtitles[k]) for k in sorted(crosstalk))}", file=sys.stderr)
+            if backend == 'pcm':
+                # the whole audio track is decoded once; every segment is then cut by sample index
+                samples = next_samples.result()
+                next_samples = prefetch(i + 1)
+
+            pending: list[tuple[float, float, str]] = []
+            pending_inputs: dict[str, dict] = {}
+            for sub_index, s in enumerate(subtitles):
+                if skip_crosstalk and sub_index in crosstalk:
+                    continue  # not planned, so an earlier build of it is removed as an orphan
+                output_filename = segment_filename(i + 1, sub_index, s)
+                planned_filenames.add(output_filename)
+                inputs = segment_inputs(source_sha256, s)
                 output_filename_and_path = os.path.join(OUTPUT_PATH, output_filename)
+                if shards is not None:
+                    character, content = labels.get(output_filename, ('', s.text))
+                    meta = {'character': character, 'content': content, 'source': f'ep{i + 1:02d}',
+                            'start': s.start.total_seconds(), 'end': s.end.total_seconds()}
+                    submit(shard_pcm_segment, {output_filename: inputs}, samples, s, output_filename, shards, meta)
+                    continue
+                if not manifest.plan(output_filename, inputs, output_filename_and_path):
+                    continue
+                if backend == 'pcm':
+                    submit(extract_pcm_segment, {output_filename: inputs}, samples, s, output_filename_and_path)
+                elif backend == 'moviepy':
+                    submit(extract_moviepy_segment, {output_filename: inputs}, source_path, s, output_filename_and_path)
+                else:
+                    pending.append((s.start.total_seconds(), s.end.total_seconds(), output_filename_and_path))
+                    pending_inputs[output_filename] = inputs
+            # ffmpeg-batch: one ffmpeg process per chunk of segments decodes its window once and writes them all
+            for chunk in iter_segment_chunks(pending):
+                chunk_outputs = {os.path.basename(dest): pending_inputs[os.path.basename(dest)] for _, _, dest in chunk}
+                submit(cut_segments, chunk_outputs, source_path, chunk, AUDIO_FPS, AUDIO_CHANNELS)
+            # queued tasks keep their own reference to this episode's buffer
+            samples = None
+    finally:
+        decode_pool.shutdown(wait=True, cancel_futures=True)
+        pool.shutdown(wait=True)
+        if shards is None:
+            manifest.save()
+
+    if shards is not None:
+        written = shards.close()
+        print(f"wrote {shards.count} segment(s) into {len(written)} shard(s) in {shards.out_dir}")
+    else:
+        if remove_orphans:
+            for rel in manifest.remove_orphans(planned_filenames):
+                print(f"removed orphan {rel}")
+            manifest.save()
+        # where every segment now is, for divide_by_character.py and `segment_index.py status`
+        index = SegmentIndex()
+        index.record_outputs('episode', manifest.segments)
+        index.close()
+
+    if failures:
+        print(f"{len(failures)} segment(s) failed", file=sys.stderr)
+        return 1
+    return 0
 
-                def thread_task():
-                    print(f"starting {output_filename}")
-                    if is_audio_source:
-                        clip.subclip(str(s.start), str(s.end)).write_audiofile(output_filename_and_path, verbose=False, logger=None)
-                    else:
-                        clip.subclip(str(s.start), str(s.end)).audio.write_audiofile(output_filename_and_path, verbose=False, logger=None)
-                    with metadata_lock:
-                        # track completed audio filenames in-memory only (do not write CSV)
-                        completed_filenames.add(output_filename)
-                    print(f"finished {output_filename}")
-                # pool.submit(thread_task)
-                thread_task()
-        clip.close()
-    
 
 if __name__ == '__main__':
-    main()
-    pool.shutdown(wait=True)
+    parser = argparse.ArgumentParser(description='Cut episode audio into .ogg segments according to the .ass subtitles')
+    parser.add_argument('--backend', choices=BACKENDS, default='pcm',
+                        help="'pcm': decode each episode once and slice segments from memory (default); "
+                             "'ffmpeg-batch': one ffmpeg process cuts a whole chunk of segments; 'moviepy': one subclip reader per segment")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='Number of encoder threads to use (default: cpu_count())')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help=f'Decoded-audio cache directory (default: {CACHE_DIR})')
+    parser.add_argument('--cache-max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3, help='Size cap of the decoded-audio cache in GiB')
+    parser.add_argument('--no-cache', action='store_true', help='Decode sources in memory without using the decoded-audio cache')
+    parser.add_argument('--no-demux', action='store_true', help='Read MKV sources directly instead of a cached audio-only copy of their audio track')
+    parser.add_argument('--keep-orphans', action='store_true', help='Do not delete previously built segments that no subtitle produces any more')
+    parser.add_argument('--separate', action='store_true',
+                        help='Separate episodes without separated vocals with Demucs in-process and slice the vocals stem from memory '
+                             '(segments are tracked by the separation rather than by a vocals.flac, so switching modes re-encodes them)')
+    parser.add_argument('--no-write-stem', action='store_true', help='With --separate, do not also store the full vocals.flac')
+    parser.add_argument('--skip-crosstalk', action='store_true', help='Leave out subtitles that overlap another line')
+    parser.add_argument('--shards', default=None, help='Write the segments into WebDataset-style tar shards in this directory instead of loose files')
+    parser.add_argument('--shard-group-by', choices=GROUP_BYS, default='character',
+                        help='One shard series per character (from meta.csv) or per train/val split')
+    parser.add_argument('--shard-mb', type=int, default=DEFAULT_SHARD_BYTES // 1024 ** 2, help='Shard size in MiB (default: 256)')
+    args = parser.parse_args()
+    raise SystemExit(main(backend=args.backend, jobs=args.jobs, cache_dir=None if args.no_cache else args.cache_dir,
+                          cache_max_bytes=int(args.cache_max_gb * 1024 ** 3), remove_orphans=not args.keep_orphans,
+                          demux=not args.no_demux, separate=args.separate, write_stem=not args.no_write_stem,
+                          skip_crosstalk=args.skip_crosstalk,
+                          shards=ShardSet(args.shards, EPISODE_SERIES, args.shard_group_by, args.shard_mb * 1024 ** 2) if args.shards else None))
@@ -0,0 +1,257 @@
+"""Build the drama CD MKVs (cover image + CD audio + JA/ZH/EN/trilingual subtitle tracks).
+
+Replaces `make_mkv.sh` and `update_subtitles_in_mkv.sh`:
+- CDs are discovered from `drama-cd-transcript/KAXA-75##CD_bilingual.srt`; their audio is found under
+  `--cd-dir` and their cover is `<n>.jpg` / `<n>.png` (n = CD number)
+- durations are probed with ffprobe once and cached in `.make_mkv-state.json` by file size and mtime
+- an MKV is encoded only when it is missing or its audio, cover or encoder settings changed; several
+  encodes run in parallel under a job budget (`--jobs` ffmpeg processes sharing the CPU threads)
+- when only the subtitles changed, the SRT is split again and remuxed into the existing MKV with stream copy
+- every MKV is checked to be at least as long as its CD audio, in the same run
+
+Usage:
+  python make_mkv.py [--jobs 2] [--cd-dir DIR] [--dry-run] [--force]
+
+Exit code: 1 if an ffmpeg run or a duration check failed, else 0.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from build_drama_cd_transcript_from_srt import SRT_BASENAME_RE
+from tools.srt_core import load_srt, write_role_srt
+
+SRT_DIR = "drama-cd-transcript"
+CD_AUDIO_DIR = "../[MH&Airota&FZSD&VCB-Studio] Shuumatsu Nani Shitemasuka？ Isogashii Desuka？ Sukutte Moratte Ii Desuka？ [Ma10p_1080p]/CDs/"
+COVER_EXTENSIONS = (".jpg", ".png")
+OUTPUT_TEMPLATE = "output-KAXA-75{cd_idx}CD.mkv"
+STATE_FILE = ".make_mkv-state.json"
+FFMPEG = "ffmpeg"
+FFPROBE = "ffprobe"
+# recorded per MKV; changing any of these re-encodes every MKV
+VIDEO_ARGS = ["-c:v", "libx264", "-preset", "slow", "-tune", "stillimage", "-crf", "26", "-pix_fmt", "yuv420p"]
+AUDIO_ARGS = ["-c:a", "aac", "-q:a", "4"]
+# subtitle tracks, in stream order: (line role of the split SRT or None for the trilingual SRT, language, title)
+SUBTITLE_TRACKS = (
+    ("ja", "jpn", "Japanese (原文)"),
+    ("zh", "chi", "Chinese (翻訳)"),
+    ("en", "eng", "English (translation)"),
+    (None, "mul", "Original (JP/ZH/EN)"),
+)
+
+
+class CD:
+    def __init__(self, cd_idx: str, srt: Path, audio: Optional[str], cover: Optional[str]):
+        self.cd_idx = cd_idx
+        self.name = f"KAXA-75{cd_idx}CD"
+        self.srt = srt
+        self.audio = audio
+        self.cover = cover
+        self.output = OUTPUT_TEMPLATE.format(cd_idx=cd_idx)
+
+    def subtitle_paths(self) -> list[str]:
+        """The `<stem>.<role>.srt` files written by tools/split_bilingual_srt.py, then the trilingual SRT."""
+        return [str(self.srt.with_name(f"{self.srt.stem}.{role}.srt")) if role else str(self.srt)
+                for role, _, _ in SUBTITLE_TRACKS]
+
+    def split_subtitles(self) -> None:
+        """Write the per-language SRTs (same output as tools/split_bilingual_srt.py)."""
+        srt = load_srt(self.srt)
+        for (role, _, _), path in zip(SUBTITLE_TRACKS, self.subtitle_paths()):
+            if role:
+                write_role_srt(path, [(srt.time_text(b), line) for b, line, _ in srt.role_lines(role) if line.strip()])
+
+
+def discover_cds(srt_dir: str, cd_dir: str, cover_dir: str = ".") -> list[CD]:
+    audio_files = glob.glob(os.path.join(glob.escape(cd_dir), "**", "*.flac"), recursive=True)
+    cds = []
+    for srt in sorted(Path(srt_dir).iterdir()):
+        m = SRT_BASENAME_RE.match(srt.name)
+        if not m:
+            continue
+        cd_idx = m.group("cd_idx")
+        audio = next((a for a in sorted(audio_files) if os.path.basename(a) == f"KAXA-75{cd_idx}CD.flac"), None)
+        covers = [os.path.join(cover_dir, f"{int(cd_idx)}{ext}") for ext in COVER_EXTENSIONS]
+        cds.append(CD(cd_idx, srt, audio, next((c for c in covers if os.path.isfile(c)), None)))
+    return cds
+
+
+class State:
+    """`.make_mkv-state.json`: cached ffprobe durations and the inputs each MKV was built from."""
+
+    def __init__(self, path: str = STATE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        self.durations: dict[str, dict] = data.get("durations", {})
+        self.outputs: dict[str, dict] = data.get("outputs", {})
+
+    def save(self) -> None:
+        with self.lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"durations": self.durations, "outputs": self.outputs}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+
+    def duration(self, path: str) -> float:
+        """Container duration of `path` in seconds, probed once per size/mtime."""
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.durations.get(key)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                return entry["duration"]
+        out = subprocess.run([FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+                             check=True, capture_output=True, text=True).stdout
+        duration = float(out.strip())
+        with self.lock:
+            self.durations[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "duration": duration}
+        return duration
+
+
+def file_stamp(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def encode_inputs(cd: CD) -> dict:
+    """What the encoded video and audio streams depend on (subtitles are tracked separately)."""
+    return {"audio": file_stamp(cd.audio), "cover": file_stamp(cd.cover), "video_args": VIDEO_ARGS, "audio_args": AUDIO_ARGS}
+
+
+def srt_sha256(cd: CD) -> str:
+    return hashlib.sha256(cd.srt.read_bytes()).hexdigest()
+
+
+def subtitle_args(first_input: int) -> list[str]:
+    args = [arg for i in range(len(SUBTITLE_TRACKS)) for arg in ("-map", f"{first_input + i}:0")]
+    args += ["-c:s", "srt"]
+    for i, (_, language, title) in enumerate(SUBTITLE_TRACKS):
+        args += [f"-metadata:s:s:{i}", f"language={language}", f"-metadata:s:s:{i}", f"title={title}"]
+    return args
+
+
+def encode_command(cd: CD, duration: float, threads: int, tmp: str) -> list[str]:
+    cmd = [FFMPEG, "-y", "-v", "error", "-nostdin", "-loop", "1", "-framerate", "1", "-i", cd.cover, "-i", cd.audio]
+    for sub in cd.subtitle_paths():
+        cmd += ["-i", sub]
+    cmd += ["-map", "0:v:0", "-map", "1:a:0"] + subtitle_args(2)
+    cmd += VIDEO_ARGS + AUDIO_ARGS + ["-threads", str(threads), "-t", f"{duration:.6f}", "-f", "matroska", tmp]
+    return cmd
+
+
+def remux_command(cd: CD, tmp: str) -> list[str]:
+    cmd = [FFMPEG, "-y", "-v", "error", "-nostdin", "-i", cd.output]
+    for sub in cd.subtitle_paths():
+        cmd += ["-i", sub]
+    cmd += ["-map", "0:v:0", "-map", "0:a:0", "-c:v", "copy", "-c:a", "copy"] + subtitle_args(1)
+    cmd += ["-f", "matroska", tmp]
+    return cmd
+
+
+def run_ffmpeg(cmd: list[str], output: str) -> None:
+    """Run an ffmpeg command writing `<output>.tmp`, then move it over `output`."""
+    tmp = cmd[-1]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise IOError(f"ffmpeg failed for {output}: {proc.stderr.decode(errors='replace').strip()}")
+    os.replace(tmp, output)
+
+
+def plan(cd: CD, state: State, force: bool) -> str:
+    """'encode', 'remux' or 'ok' for one CD."""
+    record = state.outputs.get(cd.output)
+    if force or record is None or not os.path.isfile(cd.output) or record["encode"] != encode_inputs(cd):
+        return "encode"
+    if record["srt_sha256"] != srt_sha256(cd) or not all(os.path.isfile(p) for p in cd.subtitle_paths()):
+        return "remux"
+    return "ok"
+
+
+def build(cd: CD, action: str, state: State, threads: int) -> None:
+    sha = srt_sha256(cd)
+    cd.split_subtitles()  # cheap; keeps the .ja/.zh/.en.srt tracks in step with the trilingual SRT
+    tmp = f"{cd.output}.tmp"
+    if action == "encode":
+        run_ffmpeg(encode_command(cd, state.duration(cd.audio), threads, tmp), cd.output)
+    else:
+        run_ffmpeg(remux_command(cd, tmp), cd.output)
+    with state.lock:
+        state.outputs[cd.output] = {"encode": encode_inputs(cd), "srt_sha256": sha}
+    state.save()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or update the drama CD MKVs, re-encoding or remuxing only what changed.")
+    parser.add_argument("--srt-dir", default=SRT_DIR, help=f"Directory of KAXA-75##CD_bilingual.srt files (default: {SRT_DIR})")
+    parser.add_argument("--cd-dir", default=CD_AUDIO_DIR, help="Directory searched (recursively) for KAXA-75##CD.flac")
+    parser.add_argument("--cover-dir", default=".", help="Directory of the <n>.jpg / <n>.png cover images (default: .)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Concurrent ffmpeg processes (default: min(CDs, cpu_count / 4) or 1)")
+    parser.add_argument("--force", action="store_true", help="Re-encode every MKV")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be done")
+    args = parser.parse_args(argv)
+
+    cds = discover_cds(args.srt_dir, args.cd_dir, args.cover_dir)
+    if not cds:
+        print(f"No KAXA-75##CD_bilingual.srt files found in {args.srt_dir}", file=sys.stderr)
+        return 1
+    state = State()
+    ok = True
+    actions: dict[str, str] = {}
+    for cd in cds:
+        if cd.audio is None or cd.cover is None:
+            missing = "CD audio" if cd.audio is None else f"cover image {int(cd.cd_idx)}.jpg/.png"
+            print(f"{cd.name}: SKIPPED, {missing} not found", file=sys.stderr)
+            ok = False
+            continue
+        actions[cd.name] = plan(cd, state, args.force)
+        print(f"{cd.name}: {actions[cd.name]}")
+    if args.dry_run:
+        return 0 if ok else 1
+
+    cpu = os.cpu_count() or 1
+    jobs = args.jobs if (args.jobs and args.jobs > 0) else max(1, min(len(actions) or 1, cpu // 4))
+    threads = max(1, cpu // jobs)
+    todo = [cd for cd in cds if actions.get(cd.name) in ("encode", "remux")]
+    with ThreadPoolExecutor(jobs) as pool:
+        futures = {cd.name: pool.submit(build, cd, actions[cd.name], state, threads) for cd in todo}
+        for name, fut in futures.items():
+            try:
+                fut.result()
+                print(f"{name}: {actions[name]} done")
+            except Exception as ex:
+                print(f"{name}: ERROR {ex}", file=sys.stderr)
+                ok = False
+
+    # verify durations (probes are cached, so unchanged MKVs cost nothing)
+    for cd in cds:
+        if cd.name not in actions or not os.path.isfile(cd.output):
+            continue
+        audio_duration = state.duration(cd.audio)
+        mkv_duration = state.duration(cd.output)
+        long_enough = mkv_duration >= audio_duration
+        ok = ok and long_enough
+        print(f"{cd.name}|{audio_duration}|{mkv_duration}|{'YES' if long_enough else 'NO'}")
+    state.save()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
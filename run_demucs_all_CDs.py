@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import argparse
+import csv
+import re
 
-from run_demucs_batch import run_demucs_batch
+from run_demucs_batch import CHUNK_SECONDS, ENGINES, run_demucs_batch
+from separation_windows import merge_intervals
 
 
 INPUT_FILES = [
@@ -14,6 +17,28 @@ INPUT_FILES = [
     "../[MH&Airota&FZSD&VCB-Studio] Shuumatsu Nani Shitemasuka？ Isogashii Desuka？ Sukutte Moratte Ii Desuka？ [Ma10p_1080p]/CDs/[171129] SPCD 06 (flac)/KAXA-7506CD.flac",
 ]
 
+DIALOGUE_ONLY_HELP = "Only separate the time ranges listed in drama-cd-transcript.csv (vocals.flac is silent elsewhere)"
+
+
+def dialogue_windows(padding: float, merge_gap: float) -> dict[str, list[tuple[float, float]]]:
+    """Map every input CD to the merged, padded time ranges of its rows in drama-cd-transcript.csv."""
+    from drama_cd_divide_by_character import FILENAME_RE, TRANSCRIPT_CSV, parse_time_to_seconds
+
+    intervals: dict[int, list[tuple[float, float]]] = {}
+    with open(TRANSCRIPT_CSV, newline="", encoding="utf_8_sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            m = FILENAME_RE.match(row[0]) if row else None
+            if m:
+                intervals.setdefault(int(m.group("cd_idx")), []).append(
+                    (parse_time_to_seconds(m.group("start")), parse_time_to_seconds(m.group("end"))))
+    windows = {}
+    for path in INPUT_FILES:
+        cd_idx = int(re.search(r"KAXA-75(\d{2})", path).group(1))
+        windows[path] = merge_intervals(intervals.get(cd_idx, []), padding=padding, min_gap=merge_gap)
+    return windows
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Run Demucs for all drama CDs with multiprocessing and skip existing outputs.")
@@ -21,8 +46,19 @@ def main() -> int:
     parser.add_argument("--out", default="separated", help="Output root directory (default: separated)")
     parser.add_argument("--model", default="htdemucs", help="Demucs model name (default: htdemucs)")
     parser.add_argument("--device", default=None, help="Demucs device, e.g. cpu/cuda (optional)")
+    parser.add_argument("--engine", choices=ENGINES, default="api",
+                        help="api: load the model once per worker (default); api-int8: same with a dynamically int8-quantised model "
+                             "(CPU; outputs go to separated/<model>-int8, see compare_demucs_engines.py); cli: run demucs.separate per file")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker (default: cpu_count / jobs)")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS,
+                        help=f"api engines: separate in chunks of this length, checkpointed so interrupted runs resume (default: {CHUNK_SECONDS:g})")
+    parser.add_argument("--dialogue-only", action="store_true", help=DIALOGUE_ONLY_HELP)
+    parser.add_argument("--padding", type=float, default=1.0, help="Seconds of context added around each line in --dialogue-only mode (default: 1.0)")
+    parser.add_argument("--merge-gap", type=float, default=2.0, help="Merge windows closer than this many seconds in --dialogue-only mode (default: 2.0)")
     args = parser.parse_args()
 
+    windows = dialogue_windows(args.padding, args.merge_gap) if args.dialogue_only else None
+
     return run_demucs_batch(
         INPUT_FILES,
         jobs=args.jobs,
@@ -30,6 +66,10 @@ def main() -> int:
         model_name=args.model,
         two_stems="vocals",
         device=args.device,
+        engine=args.engine,
+        threads=args.threads,
+        windows=windows,
+        chunk_seconds=args.chunk_seconds,
     )
 
 
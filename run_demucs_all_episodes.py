@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import argparse
+import re
 
-from run_demucs_batch import run_demucs_batch
+from run_demucs_batch import CHUNK_SECONDS, ENGINES, run_demucs_batch
+from separation_windows import merge_intervals
 
 
 INPUT_FILES = [
@@ -20,6 +22,22 @@ INPUT_FILES = [
     "../[MH&Airota&FZSD&VCB-Studio] Shuumatsu Nani Shitemasuka？ Isogashii Desuka？ Sukutte Moratte Ii Desuka？ [Ma10p_1080p]/[MH&Airota&FZSD&VCB-Studio] sukasuka [12][Ma10p_1080p][x265_flac_aac].mkv",
 ]
 
+DIALOGUE_ONLY_HELP = "Only separate the time ranges covered by the episode's .ass subtitles (vocals.flac is silent elsewhere)"
+
+
+def dialogue_windows(padding: float, merge_gap: float) -> dict[str, list[tuple[float, float]]]:
+    """Map every input episode to the merged, padded time ranges of its Japanese subtitle lines."""
+    from get_voice_from_video_and_subtitles import list_subtitle_files, load_subtitles
+
+    subtitle_files = list_subtitle_files()
+    windows = {}
+    for path in INPUT_FILES:
+        episode = int(re.search(r"\[(\d{2})\]", path).group(1))
+        subtitles = load_subtitles(subtitle_files[episode - 1])
+        windows[path] = merge_intervals(((s.start.total_seconds(), s.end.total_seconds()) for s in subtitles),
+                                        padding=padding, min_gap=merge_gap)
+    return windows
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Run Demucs for all episodes with multiprocessing and skip existing outputs.")
@@ -27,8 +45,19 @@ def main() -> int:
     parser.add_argument("--out", default="separated", help="Output root directory (default: separated)")
     parser.add_argument("--model", default="htdemucs", help="Demucs model name (default: htdemucs)")
     parser.add_argument("--device", default=None, help="Demucs device, e.g. cpu/cuda (optional)")
+    parser.add_argument("--engine", choices=ENGINES, default="api",
+                        help="api: load the model once per worker (default); api-int8: same with a dynamically int8-quantised model "
+                             "(CPU; outputs go to separated/<model>-int8, see compare_demucs_engines.py); cli: run demucs.separate per file")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker (default: cpu_count / jobs)")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS,
+                        help=f"api engines: separate in chunks of this length, checkpointed so interrupted runs resume (default: {CHUNK_SECONDS:g})")
+    parser.add_argument("--dialogue-only", action="store_true", help=DIALOGUE_ONLY_HELP)
+    parser.add_argument("--padding", type=float, default=1.0, help="Seconds of context added around each line in --dialogue-only mode (default: 1.0)")
+    parser.add_argument("--merge-gap", type=float, default=2.0, help="Merge windows closer than this many seconds in --dialogue-only mode (default: 2.0)")
     args = parser.parse_args()
 
+    windows = dialogue_windows(args.padding, args.merge_gap) if args.dialogue_only else None
+
     return run_demucs_batch(
         INPUT_FILES,
         jobs=args.jobs,
@@ -36,6 +65,10 @@ def main() -> int:
         model_name=args.model,
         two_stems="vocals",
         device=args.device,
+        engine=args.engine,
+        threads=args.threads,
+        windows=windows,
+        chunk_seconds=args.chunk_seconds,
     )
 
 
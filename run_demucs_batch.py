@@ -1,30 +1,81 @@
 from __future__ import annotations
 
+import json
 import os
+import shutil
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Sequence
+from typing import Mapping, Sequence
+
+import numpy as np
+
+from separation_store import link_view, open_entry, view_dir
+from separation_windows import covers, merge_intervals, read_separation_windows, write_separation_windows
 try:
     import torchaudio as _
 except:
     print("WARNING: torchaudio not found; demucs may fail on output.")
 
+# "cli": call `demucs.separate.main` per input (reloads the model every time)
+# "api": every worker process loads the model once in its initializer and separates all its inputs in-process
+# "api-int8": like "api" with dynamic int8 quantisation of the model (CPU); stored as "<model>-int8"
+ENGINES = ("cli", "api", "api-int8")
+# api engine: inputs are separated in overlapping chunks whose stems are checkpointed under
+# <store entry>/.chunks/, so an interrupted separation resumes with the missing chunks only
+CHUNK_SECONDS = 120.0
+CHUNK_OVERLAP_SECONDS = 2.0
+WORK_DIR_NAME = ".chunks"
 
-def expected_vocals_path(input_path: str, out_root: str, model_name: str) -> Path:
-    return Path(out_root) / model_name / Path(input_path).stem / "vocals.flac"
+# per-process state set up by `_init_worker`
+_worker_model = None
+_worker_device = "cpu"
 
 
-def _run_one(input_path: str, out_root: str, model_name: str, two_stems: str, device: str | None) -> tuple[str, bool, str]:
-    output_file = expected_vocals_path(input_path, out_root, model_name)
-    if output_file.exists():
-        return input_path, False, f"SKIP: {output_file} already exists"
+def load_model(model_name: str, quantize: bool = False):
+    """Load a pretrained Demucs model for inference; `quantize` applies dynamic int8 quantisation (CPU only)."""
+    import torch
+    from demucs.pretrained import get_model
+
+    model = get_model(model_name)
+    model.eval()
+    if quantize:
+        # int8 weights for the Linear/LSTM layers (htdemucs' cross-domain transformer and output projections);
+        # dynamic quantisation leaves the convolutions in float
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def stored_model_name(model_name: str, engine: str) -> str:
+    """Model label used in the separation store and views, so quantised outputs never mix with float ones."""
+    return f"{model_name}-int8" if engine == "api-int8" else model_name
 
-    if not Path(input_path).is_file():
-        return input_path, False, f"ERROR: input not found: {input_path}"
+
+def _init_worker(engine: str, model_name: str, device: str | None, threads: int) -> None:
+    global _worker_model, _worker_device
+    import torch
+
+    # total cores are shared between worker processes; without this each one would use every core
+    torch.set_num_threads(threads)
+    _worker_device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    if engine == "api-int8":
+        if _worker_device != "cpu":
+            print(f"WARNING: the int8 engine runs on the CPU, ignoring device {_worker_device}")
+        _worker_device = "cpu"
+    if engine != "cli":
+        _worker_model = load_model(model_name, quantize=engine == "api-int8")
+
+
+def _run_one(input_path: str, out_dir: str, model_name: str, two_stems: str, device: str | None) -> tuple[str, bool, str]:
+    output_file = Path(out_dir) / f"{two_stems}.flac"
+    # a dialogue-only stem is silent outside its windows: redo it as a full separation
+    if output_file.exists() and read_separation_windows(str(output_file)) is None:
+        return input_path, False, f"SKIP: {output_file} already exists"
 
     try:
         from demucs.separate import main as demucs_main
 
+        # demucs writes <out>/<model>/<input stem>/; run it in a scratch dir inside the store entry and move the stems up
+        scratch = Path(out_dir) / ".cli-out"
         args = [
             "--two-stems",
             two_stems,
@@ -32,7 +83,7 @@ def _run_one(input_path: str, out_root: str, model_name: str, two_stems: str, de
             "--name",
             model_name,
             "--out",
-            out_root,
+            str(scratch),
         ]
         if device:
             args.extend(["--device", device])
@@ -40,9 +91,16 @@ def _run_one(input_path: str, out_root: str, model_name: str, two_stems: str, de
 
         demucs_main(args)
 
-        if output_file.exists():
-            return input_path, True, f"DONE: {output_file}"
-        return input_path, False, f"ERROR: demucs finished but output missing: {output_file}"
+        produced = scratch / model_name / Path(input_path).stem
+        if not (produced / f"{two_stems}.flac").exists():
+            return input_path, False, f"ERROR: demucs finished but output missing: {produced / f'{two_stems}.flac'}"
+        for name in (f"no_{two_stems}.flac", f"{two_stems}.flac"):
+            if (produced / name).exists():
+                os.replace(produced / name, Path(out_dir) / name)
+        if os.path.exists(Path(out_dir) / "windows.json"):
+            os.remove(Path(out_dir) / "windows.json")
+        shutil.rmtree(scratch, ignore_errors=True)
+        return input_path, True, f"DONE: {output_file}"
     except SystemExit as exc:
         code = exc.code if isinstance(exc.code, int) else 1
         return input_path, False, f"ERROR: demucs exited with code {code} for {input_path}"
@@ -50,6 +108,204 @@ def _run_one(input_path: str, out_root: str, model_name: str, two_stems: str, de
         return input_path, False, f"ERROR: {input_path}: {exc}"
 
 
+def _separate_wav(wav, model=None):
+    """Run `model` (default: the worker's model) on a (channels, samples) tensor; return (sources, channels, samples)."""
+    import torch
+    from demucs.apply import apply_model
+
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+    with torch.no_grad():
+        sources = apply_model(model or _worker_model, wav[None], device=_worker_device, shifts=1, split=True, overlap=0.25, progress=False)[0]
+    return sources * ref.std() + ref.mean()
+
+
+def plan_chunks(ranges: Sequence[tuple[float, float]], samplerate: int, total: int,
+                chunk_seconds: float = CHUNK_SECONDS,
+                overlap_seconds: float = CHUNK_OVERLAP_SECONDS) -> list[tuple[int, int, bool, bool]]:
+    """Split (start, end) time ranges into overlapping chunks (offset, length, fade_in, fade_out) in samples.
+
+    Consecutive chunks of one range overlap by `overlap_seconds`; fade_in/fade_out mark the sides that are
+    cross-faded with a neighbouring chunk.
+    """
+    chunk = int(chunk_seconds * samplerate)
+    overlap = int(overlap_seconds * samplerate)
+    chunks = []
+    for start, end in ranges:
+        a = max(0, int(round(start * samplerate)))
+        b = min(total, int(round(end * samplerate)))
+        offset = a
+        while offset < b:
+            stop = min(offset + chunk, b)
+            chunks.append((offset, stop - offset, offset > a, stop < b))
+            if stop >= b:
+                break
+            offset = stop - overlap
+    return chunks
+
+
+def _chunk_work_dir(out_dir: Path, signature: dict) -> Path:
+    """Return the chunk checkpoint directory of `out_dir`, emptied when it belongs to another input or settings."""
+    work_dir = out_dir / WORK_DIR_NAME
+    job_file = work_dir / "job.json"
+    try:
+        same_job = json.loads(job_file.read_text(encoding="utf-8")) == signature
+    except (FileNotFoundError, ValueError):
+        same_job = False
+    if not same_job:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        work_dir.mkdir(parents=True)
+        job_file.write_text(json.dumps(signature), encoding="utf-8")
+    return work_dir
+
+
+def _separate_chunks(input_path: str, out_dir: Path, two_stems: str, windows: list[tuple[float, float]] | None,
+                     chunk_seconds: float, keep_rest: bool):
+    """Separate `input_path` chunk by chunk with the worker's model; return a (stems, channels, samples) tensor.
+
+    The stems are [stem] or, with `keep_rest`, [stem, everything else]. Every finished chunk is checkpointed
+    under `<out_dir>/.chunks/`, so a rerun after a crash only separates the missing chunks; the chunks are
+    cross-faded into the result. The caller deletes the checkpoints once the result is safely stored.
+    """
+    import torch
+    from demucs.audio import AudioFile
+
+    model = _worker_model
+    samplerate = model.samplerate
+    stem_index = model.sources.index(two_stems)
+    audio = AudioFile(Path(input_path))
+    read_kwargs = dict(streams=0, samplerate=samplerate, channels=model.audio_channels)
+    total = int(float(audio.info["format"]["duration"]) * samplerate)
+    chunks = plan_chunks(windows if windows is not None else [(0.0, total / samplerate)], samplerate, total, chunk_seconds)
+    nstems = 2 if keep_rest else 1
+
+    # the store entry already identifies the input content, model, stem and Demucs version
+    work_dir = _chunk_work_dir(out_dir, {
+        "two_stems": two_stems,
+        "keep_rest": keep_rest,
+        "chunk_seconds": chunk_seconds,
+        "overlap_seconds": CHUNK_OVERLAP_SECONDS,
+        "windows": [list(w) for w in windows] if windows is not None else None,
+    })
+
+    def chunk_path(offset: int, length: int) -> Path:
+        return work_dir / f"{offset:012d}-{length:012d}.npy"
+
+    for i, (offset, length, _, _) in enumerate(chunks):
+        path = chunk_path(offset, length)
+        if path.exists():
+            continue
+        sources = _separate_wav(audio.read(seek_time=offset / samplerate, duration=length / samplerate, **read_kwargs))
+        stem = sources[stem_index]
+        stems = torch.stack((stem, sources.sum(0) - stem)) if keep_rest else stem[None]
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, stems.cpu().numpy().astype(np.float32))
+        os.replace(tmp, path)
+        print(f"{Path(input_path).name}: chunk {i + 1}/{len(chunks)} separated")
+
+    # complementary linear ramps over each overlap sum to one, so overlap-adding the chunks cross-fades them
+    out = torch.zeros(nstems, model.audio_channels, total)
+    overlap = int(CHUNK_OVERLAP_SECONDS * samplerate)
+    for offset, length, fade_in, fade_out in chunks:
+        stems = torch.from_numpy(np.load(chunk_path(offset, length)))
+        n = min(stems.shape[-1], length, total - offset)
+        weight = torch.ones(n)
+        ramp = min(overlap, n)
+        if fade_in:
+            weight[:ramp] = torch.linspace(0.0, 1.0, ramp)
+        if fade_out:
+            weight[n - ramp:] = torch.linspace(1.0, 0.0, ramp)
+        out[..., offset:offset + n] += stems[..., :n] * weight
+    return out
+
+
+def _save_stem(wav, out_dir: Path, name: str) -> None:
+    from demucs.audio import save_audio
+
+    # write to a temporary name first: a half-written vocals.flac would otherwise count as done
+    tmp = out_dir / f"{name}.tmp.flac"
+    save_audio(wav, tmp, samplerate=_worker_model.samplerate, clip="rescale", bits_per_sample=16, as_float=False)
+    os.replace(tmp, out_dir / f"{name}.flac")
+
+
+def _separate_api(input_path: str, out_dir: str, two_stems: str, windows: list[tuple[float, float]] | None = None,
+                  chunk_seconds: float = CHUNK_SECONDS) -> tuple[str, bool, str]:
+    """Separate `input_path` with the model loaded by `_init_worker` into `out_dir`, writing the same files as `demucs --two-stems`.
+
+    The input is separated in overlapping, checkpointed chunks of `chunk_seconds` (see `_separate_chunks`).
+    With `windows` (dialogue-only mode) only those time ranges are separated: `vocals.flac` is written
+    full-length but silent elsewhere, alongside a `windows.json` index; `no_vocals.flac` is not written.
+    """
+    out_dir = Path(out_dir)
+    output_file = out_dir / f"{two_stems}.flac"
+    if output_file.exists():
+        done_windows = read_separation_windows(str(output_file))
+        if windows is None:
+            # a full request is only satisfied by a full separation, not by a dialogue-only stem
+            done = done_windows is None
+        else:
+            # a dialogue-only request (even one without windows) by any stem covering all of its windows
+            done = done_windows is None or all(covers(done_windows, s, e) for s, e in windows)
+        if done:
+            return input_path, False, f"SKIP: {output_file} already exists"
+
+    try:
+        out = _separate_chunks(input_path, out_dir, two_stems, windows, chunk_seconds, keep_rest=windows is None)
+        if windows is None:
+            _save_stem(out[1], out_dir, f"no_{two_stems}")
+        _save_stem(out[0], out_dir, two_stems)
+        if windows is not None:
+            write_separation_windows(str(output_file), windows)
+        elif os.path.exists(out_dir / "windows.json"):
+            os.remove(out_dir / "windows.json")
+        shutil.rmtree(out_dir / WORK_DIR_NAME, ignore_errors=True)
+        return input_path, True, f"DONE: {output_file}"
+    except Exception as exc:
+        return input_path, False, f"ERROR: {input_path}: {exc}"
+
+
+def stem_to_pcm(stem, nchannels: int) -> np.ndarray:
+    """Convert a float (channels, samples) stem tensor to int16 PCM of shape (frames, nchannels).
+
+    Rescales like `save_audio(clip="rescale")`, so the PCM matches what decoding the written stem would give.
+    """
+    # demucs.audio.save_audio: wav / max(1.01 * peak, 1)
+    peak = float(stem.abs().max()) if stem.numel() else 0.0
+    stem = stem / max(1.01 * peak, 1.0)
+    if nchannels == 1:
+        stem = stem.mean(0, keepdim=True)
+    elif stem.shape[0] != nchannels:
+        raise ValueError(f"cannot convert a {stem.shape[0]}-channel stem to {nchannels} channels")
+    return (stem * 32767).round().clamp(-32768, 32767).short().T.contiguous().numpy()
+
+
+def separate_to_pcm(input_path: str, nchannels: int, fps: int, separated_dir: str = "separated/htdemucs",
+                    two_stems: str = "vocals", device: str | None = None, threads: int | None = None,
+                    chunk_seconds: float = CHUNK_SECONDS, write_stem: bool = True) -> np.ndarray:
+    """Separate `input_path` in this process and hand the `two_stems` stem back as int16 PCM (frames, nchannels).
+
+    This is the fused "separate-and-slice" path of the extractors: the stem goes straight to the segment
+    cutter instead of being written to FLAC and decoded again. The model is loaded on first use. With
+    `write_stem` the stem is also stored in the separation store (`<two_stems>.flac` only) and linked into
+    `separated_dir`, so later runs can slice it without separating again.
+    """
+    out_root, model_name = os.path.split(os.path.normpath(separated_dir))
+    if _worker_model is None:
+        _init_worker("api", model_name, device, threads or os.cpu_count() or 1)
+    if _worker_model.samplerate != fps:
+        raise ValueError(f"{model_name} separates at {_worker_model.samplerate} Hz, the extractor slices at {fps} Hz")
+    entry = open_entry(input_path, out_root, model_name, two_stems)
+    stem = _separate_chunks(input_path, entry, two_stems, None, chunk_seconds, keep_rest=False)[0]
+    if write_stem:
+        _save_stem(stem, entry, two_stems)
+        if os.path.exists(entry / "windows.json"):
+            os.remove(entry / "windows.json")
+        link_view(entry, view_dir(input_path, out_root, model_name))
+    shutil.rmtree(entry / WORK_DIR_NAME, ignore_errors=True)
+    return stem_to_pcm(stem, nchannels)
+
+
 def run_demucs_batch(
     input_files: Sequence[str],
     jobs: int | None = None,
@@ -57,26 +313,68 @@ def run_demucs_batch(
     model_name: str = "htdemucs",
     two_stems: str = "vocals",
     device: str | None = None,
+    engine: str = "api",
+    threads: int | None = None,
+    windows: Mapping[str, list[tuple[float, float]]] | None = None,
+    chunk_seconds: float = CHUNK_SECONDS,
 ) -> int:
+    """Separate `input_files` in parallel; `windows` (input path -> merged time ranges) enables dialogue-only mode."""
     if not input_files:
         print("No input files configured.")
         return 0
+    if windows is not None and engine == "cli":
+        print("ERROR: dialogue-only separation needs an api engine.")
+        return 2
+    if chunk_seconds < 2 * CHUNK_OVERLAP_SECONDS:
+        print(f"ERROR: chunks must be at least {2 * CHUNK_OVERLAP_SECONDS:g}s long.")
+        return 2
 
     unique_inputs = list(dict.fromkeys(input_files))
-    workers = jobs if jobs and jobs > 0 else ((os.cpu_count() or 1) // 3 or 1)
-
     skip_count = 0
     fail_count = 0
     done_count = 0
 
-    print(f"Using {workers} process(es)")
-    print(f"Model: {model_name}, out: {out_root}, stem: {two_stems}, format: flac")
+    # identical audio reached under several names shares one store entry and is separated once
+    print("Fingerprinting inputs...")
+    entries: dict[Path, list[str]] = {}
+    for path in unique_inputs:
+        if not Path(path).is_file():
+            print(f"ERROR: input not found: {path}")
+            fail_count += 1
+            continue
+        entries.setdefault(open_entry(path, out_root, stored_model_name(model_name, engine), two_stems), []).append(path)
+    if not entries:
+        return 1
+
+    workers = jobs if jobs and jobs > 0 else ((os.cpu_count() or 1) // 3 or 1)
+    workers = min(workers, len(entries))
+    threads = threads if threads and threads > 0 else max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"Using {workers} process(es) x {threads} torch thread(s), engine: {engine}")
+    print(f"Model: {stored_model_name(model_name, engine)}, out: {out_root}, stem: {two_stems}, format: flac")
+
+    entry_windows: dict[Path, list[tuple[float, float]] | None] = {entry: None for entry in entries}
+    if windows is not None:
+        for entry, paths in entries.items():
+            entry_windows[entry] = merge_intervals(w for path in paths for w in windows.get(path, []))
+        total = sum(e - s for ws in entry_windows.values() for s, e in ws)
+        print(f"Dialogue-only: separating {total / 60:.1f} min in {sum(len(ws) for ws in entry_windows.values())} window(s)")
 
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = {
-            executor.submit(_run_one, path, out_root, model_name, two_stems, device): path
-            for path in unique_inputs
-        }
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(engine, model_name, device, threads),
+    ) as executor:
+        if engine != "cli":
+            futures = {
+                executor.submit(_separate_api, paths[0], str(entry), two_stems, entry_windows[entry], chunk_seconds): entry
+                for entry, paths in entries.items()
+            }
+        else:
+            futures = {
+                executor.submit(_run_one, paths[0], str(entry), model_name, two_stems, device): entry
+                for entry, paths in entries.items()
+            }
 
         for future in as_completed(futures):
             _, created, message = future.result()
@@ -87,6 +385,10 @@ def run_demucs_batch(
                 done_count += 1
             else:
                 fail_count += 1
+                continue
+            entry = futures[future]
+            for path in entries[entry]:
+                link_view(entry, view_dir(path, out_root, stored_model_name(model_name, engine)))
 
     print(f"\nSummary: done={done_count}, skipped={skip_count}, failed={fail_count}")
     return 0 if fail_count == 0 else 1
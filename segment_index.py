@@ -0,0 +1,353 @@
+"""SQLite index of every segment: labels, extraction state and QC, queried instead of rescanning CSVs and directories.
+
+`segments.sqlite` holds one row per CSV row of meta.csv (dataset `episode`) and drama-cd-transcript.csv
+(dataset `drama_cd`): filename, source (`ep01`.. / `cd01`..), start, end, duration, character, content,
+output path (relative to the dataset's output directory, NULL while not extracted), audio sha256 and size,
+and QC status/note; indexed by character and by source.
+- the CSVs stay the hand-edited label files: an index opened with `refresh=True` re-imports a CSV whose
+  sha256 changed, keeping the extraction state and QC fields of rows whose filename is unchanged
+- `export` writes a CSV back byte-for-byte: the BOM and the raw text of every record (its quoting, line
+  ending, extra fields and the blank lines before it) are recorded on import; a row whose labels changed in
+  the index is re-serialised with the record's own line ending
+- the extractors record their build manifest into the index after a run, the dividers record the moves
+  they make, so "what is missing" or "what is in the wrong folder" is a single query
+
+  python segment_index.py import               # (re-)import both CSVs and the build manifests
+  python segment_index.py verify               # check that the export of each CSV is byte-identical
+  python segment_index.py export --dataset episode --out meta.csv
+  python segment_index.py status               # per-character counts, missing and misplaced segments
+  python segment_index.py qc "[01-0001][00.04.75-00.07.46].ogg" bad --note "music over the line"
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+from typing import Iterable, Optional
+
+from build_manifest import MANIFEST_NAME
+
+INDEX_PATH = "segments.sqlite"
+# dataset -> (label CSV, output directory)
+DATASETS = {
+    "episode": ("meta.csv", "raw-vocal-output"),
+    "drama_cd": ("drama-cd-transcript.csv", "drama-cd-raw-vocal-output"),
+}
+SCHEMA_VERSION = 2
+SEGMENT_RE = re.compile(r"^\[(?P<cd>cd)?(?P<idx>\d{2})-\d{4}\]\[(?P<start>\d+\.\d{2}\.\d{2})-(?P<end>\d+\.\d{2}\.\d{2})\]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    dataset TEXT NOT NULL,
+    position INTEGER NOT NULL,      -- row number in the CSV, for a byte-identical export
+    n_fields INTEGER NOT NULL,      -- fields of the CSV row (rows without content have 2)
+    raw TEXT NOT NULL,              -- the record as written in the CSV, with the blank lines before it
+    filename TEXT NOT NULL,
+    source TEXT,
+    start REAL,
+    end REAL,
+    duration REAL,
+    character TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    output_path TEXT,               -- relative to the dataset's output directory, '/'-separated
+    audio_sha256 TEXT,
+    audio_size INTEGER,
+    qc_status TEXT,
+    qc_note TEXT,
+    PRIMARY KEY (dataset, position)
+);
+CREATE INDEX IF NOT EXISTS segments_filename ON segments (filename);
+CREATE INDEX IF NOT EXISTS segments_character ON segments (character);
+CREATE INDEX IF NOT EXISTS segments_source ON segments (source);
+CREATE TABLE IF NOT EXISTS csv_files (
+    dataset TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    bom INTEGER NOT NULL,
+    header TEXT NOT NULL,           -- raw, like segments.raw
+    tail TEXT NOT NULL              -- whatever follows the last record (blank lines)
+);
+"""
+
+
+def split_records(text: str) -> tuple[list[tuple[list[str], str]], str]:
+    """Split CSV text into (fields, raw text) records, skipping blank lines, and the text after the last record.
+
+    The raw text of a record runs from the end of the previous one through its own line ending, so the raw
+    texts followed by the tail add up to `text` exactly.
+    """
+    lines = text.split("\n")
+    pieces = [line + "\n" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+    consumed: list[str] = []
+
+    def feed():
+        for piece in pieces:
+            consumed.append(piece)
+            yield piece
+
+    records, start = [], 0
+    for fields in csv.reader(feed()):
+        if fields:
+            records.append((fields, "".join(consumed[start:])))
+            start = len(consumed)
+    return records, "".join(consumed[start:])
+
+
+def render_record(fields: list[str], raw: str, raw_fields: list[str]) -> str:
+    """`fields` as the CSV record written in place of `raw` (which holds `raw_fields`): `raw` itself unless they differ."""
+    if fields == raw_fields:
+        return raw
+    body = raw.rstrip("\r\n")
+    lead = body[:len(body) - len(body.lstrip("\r\n"))]  # the blank lines before the record
+    ending = "\r\n" if raw.endswith("\r\n") else "\n"
+    out = io.StringIO(newline="")
+    csv.writer(out, lineterminator=ending).writerow(fields)
+    return lead + (out.getvalue() if raw.endswith("\n") else out.getvalue()[:-len(ending)])
+
+
+def parse_segment_filename(filename: str) -> tuple[Optional[str], Optional[float], Optional[float]]:
+    """(source, start, end) of a `[01-0001][mm.ss.dd-mm.ss.dd].ogg` / `[cd01-0000][...].ogg` filename."""
+    m = SEGMENT_RE.match(filename)
+    if not m:
+        return None, None, None
+    start, end = (int(mm) * 60 + int(ss) + int(dd) / 100 for mm, ss, dd in (t.split(".") for t in m.group("start", "end")))
+    return f"{'cd' if m.group('cd') else 'ep'}{m.group('idx')}", start, end
+
+
+class SegmentIndex:
+    def __init__(self, path: str = INDEX_PATH, datasets: dict[str, tuple[str, str]] = DATASETS, refresh: bool = True):
+        self.path = path
+        self.datasets = datasets
+        self.db = sqlite3.connect(path)
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version == 1:
+            # version 1 did not keep the raw records: re-import the CSVs, keeping extraction state and QC
+            self.db.executescript("DROP TABLE csv_files; ALTER TABLE segments ADD COLUMN raw TEXT NOT NULL DEFAULT '';")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if refresh or version == 1:
+            self.refresh()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def output_dir(self, dataset: str) -> str:
+        return self.datasets[dataset][1]
+
+    # labels
+
+    def refresh(self) -> list[str]:
+        """Re-import every CSV whose content changed since it was last imported; return those datasets."""
+        imported = []
+        for dataset, (csv_path, _) in self.datasets.items():
+            if not os.path.isfile(csv_path):
+                continue
+            with open(csv_path, "rb") as f:
+                data = f.read()
+            row = self.db.execute("SELECT sha256 FROM csv_files WHERE dataset = ?", (dataset,)).fetchone()
+            if row is None or row[0] != hashlib.sha256(data).hexdigest():
+                self.import_csv(dataset, data)
+                imported.append(dataset)
+        return imported
+
+    def import_csv(self, dataset: str, data: Optional[bytes] = None) -> int:
+        """Replace the labels of `dataset` with its CSV, keeping the extraction state and QC of unchanged filenames."""
+        if data is None:
+            with open(self.datasets[dataset][0], "rb") as f:
+                data = f.read()
+        bom = data.startswith(b"\xef\xbb\xbf")
+        records, tail = split_records(data.decode("utf-8-sig"))
+        header = records.pop(0)[1] if records else ""
+        kept = {filename: state for filename, *state in self.db.execute(
+            "SELECT filename, output_path, audio_sha256, audio_size, qc_status, qc_note FROM segments WHERE dataset = ?", (dataset,))}
+        rows = []
+        for position, (fields, raw) in enumerate(records):
+            filename = fields[0]
+            source, start, end = parse_segment_filename(filename)
+            rows.append((dataset, position, len(fields), raw, filename, source, start, end,
+                         None if start is None else round(end - start, 2),
+                         fields[1] if len(fields) > 1 else "", fields[2] if len(fields) > 2 else "",
+                         *kept.get(filename, (None,) * 5)))
+        with self.db:
+            self.db.execute("DELETE FROM segments WHERE dataset = ?", (dataset,))
+            self.db.executemany(
+                "INSERT INTO segments (dataset, position, n_fields, raw, filename, source, start, end, duration, character, "
+                "content, output_path, audio_sha256, audio_size, qc_status, qc_note) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO csv_files (dataset, sha256, bom, header, tail) VALUES (?, ?, ?, ?, ?)",
+                            (dataset, hashlib.sha256(data).hexdigest(), bom, header, tail))
+        return len(rows)
+
+    def render_csv(self, dataset: str) -> bytes:
+        """The CSV of `dataset` as it would be exported."""
+        bom, header, tail = self.db.execute(
+            "SELECT bom, header, tail FROM csv_files WHERE dataset = ?", (dataset,)).fetchone()
+        parts = ["\ufeff" if bom else "", header]
+        for n_fields, raw, *labels in self.db.execute(
+                "SELECT n_fields, raw, filename, character, content FROM segments WHERE dataset = ? ORDER BY position", (dataset,)):
+            (raw_fields, _), = split_records(raw)[0]
+            # fields past the third, which the index does not model, are written back as they were
+            parts.append(render_record(labels[:n_fields] + raw_fields[3:], raw, raw_fields))
+        parts.append(tail)
+        return "".join(parts).encode("utf-8")
+
+    def export_csv(self, dataset: str, csv_path: Optional[str] = None) -> str:
+        csv_path = csv_path or self.datasets[dataset][0]
+        tmp = f"{csv_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.render_csv(dataset))
+        os.replace(tmp, csv_path)
+        return csv_path
+
+    def rows(self, dataset: str) -> list[tuple[str, str, str]]:
+        """(filename, character, content) in CSV order."""
+        return self.db.execute("SELECT filename, character, content FROM segments WHERE dataset = ? ORDER BY position",
+                               (dataset,)).fetchall()
+
+    def labels(self, dataset: str) -> dict[str, tuple[str, str]]:
+        """filename -> (character, content)."""
+        return {filename: (character, content) for filename, character, content in self.rows(dataset)}
+
+    # extraction state
+
+    def record_outputs(self, dataset: str, segments: Optional[dict[str, dict]] = None) -> None:
+        """Set the output path and audio hash of every row from a build manifest's entries.
+
+        `segments` defaults to the manifest saved in the dataset's output directory (or, when there is none
+        yet, to the files found in it and its character folders); rows it does not list are marked as not extracted.
+        """
+        if segments is None:
+            try:
+                with open(os.path.join(self.output_dir(dataset), MANIFEST_NAME), encoding="utf-8") as f:
+                    segments = json.load(f).get("segments", {})
+            except FileNotFoundError:
+                segments = self._scan_outputs(dataset)
+        updates = []
+        for (filename,) in self.db.execute("SELECT filename FROM segments WHERE dataset = ?", (dataset,)).fetchall():
+            entry = segments.get(filename)
+            if entry is None:
+                updates.append((None, None, None, dataset, filename))
+            else:
+                updates.append((entry["path"].replace(os.sep, "/"), entry["sha256"], entry["size"], dataset, filename))
+        with self.db:
+            self.db.executemany("UPDATE segments SET output_path = ?, audio_sha256 = ?, audio_size = ? "
+                                "WHERE dataset = ? AND filename = ?", updates)
+
+    def _scan_outputs(self, dataset: str) -> dict[str, dict]:
+        """Manifest-like entries (without hashes) for the segment files of an output directory without a manifest."""
+        found: dict[str, dict] = {}
+        output_dir = self.output_dir(dataset)
+        if not os.path.isdir(output_dir):
+            return found
+        for top in os.scandir(output_dir):
+            entries = os.scandir(top.path) if top.is_dir() else [top]
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    found.setdefault(entry.name, {"path": os.path.relpath(entry.path, output_dir), "sha256": None,
+                                                  "size": entry.stat().st_size})
+        return found
+
+    def set_output_paths(self, dataset: str, moves: Iterable[tuple[str, str]]) -> None:
+        """Record (filename, new output path) pairs after segments were moved."""
+        with self.db:
+            self.db.executemany("UPDATE segments SET output_path = ? WHERE dataset = ? AND filename = ?",
+                                ((rel.replace(os.sep, "/"), dataset, filename) for filename, rel in moves))
+
+    def output_paths(self, dataset: str, filenames: Iterable[str]) -> dict[str, Optional[str]]:
+        """filename -> recorded output path (None when not extracted) for just these filenames."""
+        return {filename: row[0] for filename in filenames for row in self.db.execute(
+            "SELECT output_path FROM segments WHERE dataset = ? AND filename = ?", (dataset, filename))}
+
+    def missing(self, dataset: str) -> list[str]:
+        """Filenames of rows that have not been extracted."""
+        return [r[0] for r in self.db.execute(
+            "SELECT filename FROM segments WHERE dataset = ? AND output_path IS NULL ORDER BY position", (dataset,))]
+
+    def misplaced(self, dataset: str) -> list[tuple[str, str, str]]:
+        """(filename, character, current output path) of labelled, extracted rows not in their character's folder."""
+        return self.db.execute(
+            "SELECT filename, character, output_path FROM segments WHERE dataset = ? AND character != '' "
+            "AND output_path IS NOT NULL AND output_path != character || '/' || filename ORDER BY position",
+            (dataset,)).fetchall()
+
+    def counts(self, dataset: str) -> dict[str, int]:
+        """Extracted segments per character folder (unlabelled ones, still at the top level, under '')."""
+        return dict(self.db.execute(
+            "SELECT CASE WHEN instr(output_path, '/') THEN substr(output_path, 1, instr(output_path, '/') - 1) ELSE '' END AS folder, "
+            "COUNT(*) FROM segments WHERE dataset = ? AND output_path IS NOT NULL GROUP BY folder ORDER BY folder", (dataset,)))
+
+    def extracted(self) -> list[dict]:
+        """Every extracted segment of both datasets as a dict of its columns, in CSV order."""
+        cur = self.db.execute("SELECT dataset, filename, source, start, end, duration, character, content, output_path, "
+                              "audio_sha256, qc_status FROM segments WHERE output_path IS NOT NULL ORDER BY dataset, position")
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur]
+
+    def set_qc(self, filename: str, status: Optional[str], note: Optional[str] = None) -> int:
+        with self.db:
+            return self.db.execute("UPDATE segments SET qc_status = ?, qc_note = ? WHERE filename = ?",
+                                   (status, note, filename)).rowcount
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the SQLite segment index (labels, extraction state, QC).")
+    parser.add_argument("--index", default=INDEX_PATH, help=f"Index database (default: {INDEX_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import", help="Re-import both CSVs and record the build manifests")
+    sub.add_parser("verify", help="Check that exporting each CSV reproduces it byte-for-byte")
+    p_export = sub.add_parser("export", help="Write a dataset's CSV from the index")
+    p_export.add_argument("--dataset", choices=DATASETS, required=True)
+    p_export.add_argument("--out", default=None, help="Output CSV (default: the dataset's CSV)")
+    sub.add_parser("status", help="Per-character counts, missing and misplaced segments")
+    p_qc = sub.add_parser("qc", help="Set the QC status of a segment")
+    p_qc.add_argument("filename")
+    p_qc.add_argument("status", help="e.g. ok, bad; 'none' clears it")
+    p_qc.add_argument("--note", default=None)
+    args = parser.parse_args(argv)
+
+    index = SegmentIndex(args.index, refresh=args.command != "export")
+    try:
+        if args.command == "import":
+            for dataset in DATASETS:
+                if os.path.isfile(DATASETS[dataset][0]):
+                    print(f"{dataset}: {index.import_csv(dataset)} row(s)")
+                    index.record_outputs(dataset)
+            return 0
+        if args.command == "verify":
+            failed = 0
+            for dataset, (csv_path, _) in DATASETS.items():
+                if not os.path.isfile(csv_path):
+                    continue
+                with open(csv_path, "rb") as f:
+                    same = f.read() == index.render_csv(dataset)
+                failed += not same
+                print(f"{csv_path}: {'byte-identical' if same else 'DIFFERS'}")
+            return 1 if failed else 0
+        if args.command == "export":
+            print(f"Wrote {index.export_csv(args.dataset, args.out)}")
+            return 0
+        if args.command == "qc":
+            if not index.set_qc(args.filename, None if args.status == "none" else args.status, args.note):
+                print(f"{args.filename} is not in the index", file=sys.stderr)
+                return 1
+            return 0
+        for dataset in DATASETS:
+            counts = index.counts(dataset)
+            missing = index.missing(dataset)
+            misplaced = index.misplaced(dataset)
+            print(f"{dataset}: {sum(counts.values())} extracted, {len(missing)} missing, {len(misplaced)} not in their character folder")
+            for folder, n in counts.items():
+                print(f"  {folder or '(top level)'}: {n}")
+        return 0
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
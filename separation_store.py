@@ -0,0 +1,126 @@
+"""Content-addressed store of Demucs outputs.
+
+Separated stems live under `separated/store/<key>/`, where the key combines the sha256 of the input file,
+the model name, the `--two-stems` stem and the Demucs version:
+- a re-ripped or re-encoded source with an unchanged name gets a new key instead of being skipped
+- identical audio reached under several names (e.g. from the episode list and a CD list) is separated once
+
+The familiar `separated/<model>/<name>/` layout is kept as views: a relative symlink to the store entry,
+or a directory of hardlinks where symlinks are not available. Input hashes come from the memoised
+fingerprints of the decoded-audio cache, so unchanged sources are not re-hashed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from importlib import metadata
+from pathlib import Path
+from typing import Optional
+
+from audio_cache import source_fingerprint
+
+STORE_DIR_NAME = "store"
+SOURCE_INFO_NAME = "source.json"
+
+
+def demucs_version() -> str:
+    try:
+        return metadata.version("demucs")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _key_prefix(input_path: str, model_name: str, two_stems: str) -> str:
+    return f"{source_fingerprint(input_path)['sha256'][:32]}-{model_name}-{two_stems}"
+
+
+def store_entry_dir(input_path: str, out_root: str, model_name: str, two_stems: str) -> Path:
+    """Store directory for separating `input_path`'s content with `model_name` and the installed Demucs."""
+    return Path(out_root) / STORE_DIR_NAME / f"{_key_prefix(input_path, model_name, two_stems)}-{demucs_version()}"
+
+
+def separated_source_id(input_path: str, separated_dir: str = "separated/htdemucs", two_stems: str = "vocals") -> str:
+    """Build-manifest identity of the stem separated from `input_path` before it exists (fused separate-and-slice)."""
+    out_root, model_name = os.path.split(os.path.normpath(separated_dir))
+    return f"separated:{store_entry_dir(input_path, out_root, model_name, two_stems).name}"
+
+
+def view_dir(input_path: str, out_root: str, model_name: str) -> Path:
+    return Path(out_root) / model_name / Path(input_path).stem
+
+
+def is_store_view(path: str | Path) -> bool:
+    """True for a view directory created by `link_view` (as opposed to a hand-made legacy output directory)."""
+    path = Path(path)
+    return path.is_symlink() or (path / SOURCE_INFO_NAME).is_file()
+
+
+def find_stem(input_path: str, separated_dir: str = "separated/htdemucs", two_stems: str = "vocals") -> Optional[str]:
+    """Return the stored `two_stems` stem separated from the content of `input_path`, or None.
+
+    `separated_dir` is the `<out root>/<model>` directory; entries of any Demucs version match, newest first.
+    """
+    out_root, model_name = os.path.split(os.path.normpath(separated_dir))
+    store = Path(out_root) / STORE_DIR_NAME
+    if not store.is_dir() or not os.path.isfile(input_path):
+        return None
+    prefix = _key_prefix(input_path, model_name, two_stems) + "-"
+    stems = [entry / f"{two_stems}.flac" for entry in store.iterdir() if entry.name.startswith(prefix)]
+    stems = [stem for stem in stems if stem.is_file()]
+    return str(max(stems, key=lambda stem: stem.stat().st_mtime)) if stems else None
+
+
+def open_entry(input_path: str, out_root: str, model_name: str, two_stems: str) -> Path:
+    """Create (or reuse) the store entry for `input_path` and record the input in its `source.json`.
+
+    A legacy (non-view) output directory at the input's view path is adopted into the store when its stem is
+    newer than the input, i.e. it was separated from the current file; otherwise it is set aside as `<name>.stale`.
+    """
+    entry = store_entry_dir(input_path, out_root, model_name, two_stems)
+    view = view_dir(input_path, out_root, model_name)
+    if view.is_dir() and not is_store_view(view):
+        stem = view / f"{two_stems}.flac"
+        if not entry.exists() and stem.is_file() and stem.stat().st_mtime >= os.stat(input_path).st_mtime:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(view, entry)
+            print(f"Adopted {view} into {entry}")
+        else:
+            stale = view.with_name(view.name + ".stale")
+            shutil.rmtree(stale, ignore_errors=True)
+            os.replace(view, stale)
+            print(f"WARNING: {view} was not separated from the current {input_path}; moved it to {stale}")
+    entry.mkdir(parents=True, exist_ok=True)
+
+    info_path = entry / SOURCE_INFO_NAME
+    try:
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        info = {"sha256": source_fingerprint(input_path)["sha256"], "model": model_name,
+                "two_stems": two_stems, "demucs": demucs_version(), "inputs": []}
+    abspath = os.path.abspath(input_path)
+    if abspath not in info["inputs"]:
+        info["inputs"].append(abspath)
+        tmp = info_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(info, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, info_path)
+    return entry
+
+
+def link_view(entry: Path, view: Path) -> None:
+    """Point `view` at the store `entry`: a relative directory symlink, or per-file hardlinks as a fallback."""
+    if view.is_symlink():
+        if view.resolve() == entry.resolve():
+            return
+        view.unlink()
+    elif view.is_dir():
+        shutil.rmtree(view)  # an earlier hardlink view (open_entry already moved legacy directories away)
+    view.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.symlink(os.path.relpath(entry, view.parent), view, target_is_directory=True)
+    except OSError:
+        view.mkdir()
+        for f in entry.iterdir():
+            if f.is_file():
+                os.link(f, view / f.name)
@@ -0,0 +1,52 @@
+"""Time windows for "dialogue-only" Demucs separation.
+
+Only the subtitled parts of an episode or CD are ever extracted, so Demucs can skip OP/ED songs,
+eyecatches and silence. Subtitle intervals are padded and merged into windows; the separated stem is
+written full-length (silent outside the windows, so extractors slice it unchanged), together with a
+`windows.json` index next to it recording which ranges were actually separated.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterable, Optional
+
+WINDOWS_INDEX_NAME = "windows.json"
+
+
+def merge_intervals(intervals: Iterable[tuple[float, float]], padding: float = 0.0,
+                    min_gap: float = 0.0) -> list[tuple[float, float]]:
+    """Pad every (start, end) interval and merge those that overlap or are less than `min_gap` apart."""
+    merged: list[tuple[float, float]] = []
+    for start, end in sorted((max(0.0, s - padding), e + padding) for s, e in intervals):
+        if merged and (start <= merged[-1][1] or start - merged[-1][1] < min_gap):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def covers(windows: list[tuple[float, float]], start: float, end: float) -> bool:
+    """True when [start, end] lies inside a single window (windows are merged, so they never touch)."""
+    return any(ws <= start and end <= we for ws, we in windows)
+
+
+def windows_index_path(stem_path: str) -> str:
+    return os.path.join(os.path.dirname(stem_path), WINDOWS_INDEX_NAME)
+
+
+def read_separation_windows(stem_path: str) -> Optional[list[tuple[float, float]]]:
+    """Return the separated windows of a dialogue-only stem, or None for a full-length separation."""
+    try:
+        with open(windows_index_path(stem_path), encoding="utf-8") as f:
+            return [(s, e) for s, e in json.load(f)["windows"]]
+    except FileNotFoundError:
+        return None
+
+
+def write_separation_windows(stem_path: str, windows: list[tuple[float, float]]) -> None:
+    tmp = windows_index_path(stem_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"mode": "dialogue-only", "windows": windows}, f, indent=1)
+    os.replace(tmp, windows_index_path(stem_path))
@@ -21,6 +21,8 @@ import re
 import csv
 import sys
 
+from srt_core import load_srt
+
 SPEAKER_RE = re.compile(r"^\s*(?P<name>[^：\n]+)：")
 
 
@@ -43,58 +45,24 @@ def load_chinese_names(csv_path: Path):
     return names
 
 
-def parse_srt_blocks(lines):
-    """Yield subtitle blocks as (index, timecode, text_lines, start_line_no)."""
-    i = 0
-    n = len(lines)
-    while i < n:
-        # skip empty lines
-        if lines[i].strip() == '':
-            i += 1
-            continue
-        # expect numeric index
-        idx_line_no = i + 1
-        idx_line = lines[i].strip()
-        if not idx_line.isdigit():
-            # skip until next blank or digit to be permissive
-            i += 1
-            continue
-        idx = int(idx_line)
-        # timecode should follow
-        tline = lines[i + 1].rstrip() if i + 1 < n else ''
-        # gather text lines until a blank line or EOF
-        j = i + 2
-        text_lines = []
-        while j < n and lines[j].strip() != '':
-            text_lines.append(lines[j].rstrip())
-            j += 1
-        yield idx, tline, text_lines, idx_line_no
-        i = j + 1
-
-
 def check_file(path: Path, chinese_names: set):
     problems = []
-    text = path.read_text(encoding='utf-8')
-    lines = text.splitlines()
-    for idx, times, text_lines, start_line_no in parse_srt_blocks(lines):
-        if len(text_lines) < 2:
-            continue
-
-        # Rule: when there are >=2 subtitle text lines, treat the 2nd line as Chinese.
-        offset = 1
-        tl = text_lines[offset]
-
+    srt = load_srt(path)
+    # Rule: when there are >=2 subtitle text lines, treat the 2nd line as Chinese.
+    for b, tl, line_no in srt.role_lines('zh'):
         stripped = tl.lstrip()
         if stripped.startswith('：'):
             continue
 
+        idx = srt.index[b] if srt.index[b] >= 0 else None
+        times = srt.time_text(b)
         m = SPEAKER_RE.match(tl)
         if not m:
             problems.append({
                 'file': str(path),
                 'block_index': idx,
                 'time': times,
-                'line_no': start_line_no + 2 + offset,
+                'line_no': line_no,
                 'text': tl,
                 'type': 'missing_marker',
                 'speaker': None,
@@ -107,7 +75,7 @@ def check_file(path: Path, chinese_names: set):
                 'file': str(path),
                 'block_index': idx,
                 'time': times,
-                'line_no': start_line_no + 2 + offset,  # approximate file line number
+                'line_no': line_no,
                 'text': tl,
                 'type': 'unknown_speaker',
                 'speaker': speaker,
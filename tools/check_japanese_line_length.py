@@ -13,10 +13,11 @@ Exit code: 0 when no violations (or --fail-on-violation not used), 1 if --fail-o
 from __future__ import annotations
 import argparse
 import json
-import re
 from pathlib import Path
 import sys
 
+from srt_core import load_srt
+
 
 def iter_srt_files(root: Path):
     if not root.exists():
@@ -30,57 +31,17 @@ def iter_srt_files(root: Path):
         yield p
 
 
-def parse_srt_blocks(text: str):
-    """Yield (index, timecode, text_lines) for each subtitle block.
-
-    This is a forgiving parser that handles common small SRT variations.
-    """
-    # split on blank lines (one or more)
-    blocks = re.split(r"\n\s*\n", text.strip(), flags=re.M)
-    for block in blocks:
-        if not block.strip():
-            continue
-        lines = [ln for ln in block.splitlines() if ln.strip()]
-        if not lines:
-            continue
-        idx = None
-        timecode = ""
-        text_lines = []
-        # common: index, timecode, text...
-        if re.fullmatch(r"\d+", lines[0]):
-            idx = int(lines[0])
-            if len(lines) >= 2 and "-->" in lines[1]:
-                timecode = lines[1].strip()
-                text_lines = lines[2:]
-            else:
-                # missing/odd timecode line
-                text_lines = lines[1:]
-        elif "-->" in lines[0]:
-            # index omitted
-            timecode = lines[0].strip()
-            text_lines = lines[1:]
-        else:
-            # fallback: treat everything after first line as text
-            text_lines = lines[1:] or lines
-        yield idx, timecode, text_lines
-
-
 def check_file(path: Path, max_len: int):
     violations = []
-    try:
-        raw = path.read_text(encoding="utf-8")
-    except Exception:
-        raw = path.read_text(encoding="utf-8", errors="replace")
-    for idx, timecode, text_lines in parse_srt_blocks(raw):
-        if not text_lines:
-            continue
-        first = text_lines[0].strip()
+    srt = load_srt(path)
+    for b, line, _ in srt.role_lines("ja"):
+        first = line.strip()
         # count characters (unicode code points)
         length = len(first)
         if length > max_len:
             violations.append({
-                "index": idx,
-                "timecode": timecode,
+                "index": srt.index[b] if srt.index[b] >= 0 else None,
+                "timecode": srt.time_text(b),
                 "length": length,
                 "line": first,
             })
@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
-"""Check adjacent SRT subtitle blocks for overlapping timestamps.
+"""Check SRT subtitle blocks for overlapping timestamps.
+
+Every pair of overlapping blocks in a file is reported (a sweep line over srt_core.IntervalIndex), not
+just neighbours: a long block overlapping several later ones yields one pair per overlap. Each block's
+speaker is taken from the `Name：` label of its Chinese (2nd) line; --by-speaker summarises the overlaps
+per speaker pair, separating cross-talk between two speakers from same-speaker timing mistakes.
 
 Usage:
   python tools/check_srt_overlaps.py path/to/file.srt
-  python tools/check_srt_overlaps.py path/to/directory [-r|--recursive]
+  python tools/check_srt_overlaps.py path/to/directory [-r|--recursive] [--by-speaker]
 
 This script only *reports* overlaps — it does not modify files.
 """
@@ -12,99 +17,34 @@ from __future__ import annotations
 import argparse
 import glob
 import os
-import re
 import sys
 import textwrap
+from collections import Counter
 from typing import List, Dict, Optional
 
-TIMESTAMP_RE = re.compile(r"(\d{1,2}:\d{2}:\d{2}[,\.]\d{3})\s*-->\s*(\d{1,2}:\d{2}:\d{2}[,\.]\d{3})")
-
+from check_chinese_speaker_labels import SPEAKER_RE
+from srt_core import IntervalIndex, SrtBlock, load_srt
 
-def parse_timestamp(ts: str) -> float:
-    """Return seconds (float) for an SRT timestamp like 00:01:23,456 or 0:01:23.456."""
-    m = re.match(r"^(\d+):(\d{2}):(\d{2})[,\.](\d{3})$", ts.strip())
-    if not m:
-        raise ValueError(f"Invalid timestamp: {ts!r}")
-    h, mm, ss, ms = m.groups()
-    return int(h) * 3600 + int(mm) * 60 + int(ss) + int(ms) / 1000.0
+def parse_srt(path: str) -> List[SrtBlock]:
+    """Parse an .srt file into its blocks (see srt_core.SrtBlock); blocks with unparsable timestamps are skipped."""
+    return list(load_srt(path).timed_blocks())
 
 
-def parse_srt(path: str) -> List[Dict]:
-    """Parse an .srt file into a list of blocks.
+def speaker_of(block: SrtBlock) -> Optional[str]:
+    """The `Name：` label of the block's Chinese line, or None when it has none."""
+    zh = block.role("zh")
+    m = SPEAKER_RE.match(zh) if zh else None
+    return m.group("name").strip() if m else None
 
-    Each block is a dict: {index, start (s), end (s), start_ts, end_ts, text}
-    Blocks with unparsable timestamps are skipped.
-    """
-    raw = open(path, "r", encoding="utf-8-sig").read()
-    # split on blank lines (one or more)
-    chunks = re.split(r"\n\s*\n", raw.strip())
-    blocks: List[Dict] = []
-
-    for chunk in chunks:
-        lines = [ln.rstrip() for ln in chunk.splitlines() if ln.strip() != ""]
-        if not lines:
-            continue
-        # detect timestamp line (usually second line)
-        ts_line_idx = None
-        for i, ln in enumerate(lines[:3]):
-            if "-->" in ln:
-                ts_line_idx = i
-                break
-        if ts_line_idx is None:
-            # skip malformed block
-            continue
 
-        index = None
-        if ts_line_idx >= 1 and re.match(r"^\d+\s*$", lines[0]):
-            try:
-                index = int(lines[0].strip())
-            except Exception:
-                index = None
+def find_overlaps(blocks: List[SrtBlock]) -> List[Dict]:
+    """Return every pair of blocks whose time ranges overlap, as {"a": earlier, "b": later} dicts.
 
-        ts_line = lines[ts_line_idx]
-        m = TIMESTAMP_RE.search(ts_line)
-        if not m:
-            continue
-        start_ts, end_ts = m.group(1), m.group(2)
-        try:
-            start = parse_timestamp(start_ts)
-            end = parse_timestamp(end_ts)
-        except Exception:
-            continue
-
-        # text is what's after the timestamp line
-        text_lines = lines[ts_line_idx + 1 :]
-        text = "\n".join(text_lines).strip()
-        blocks.append({
-            "index": index,
-            "start": start,
-            "end": end,
-            "start_ts": start_ts,
-            "end_ts": end_ts,
-            "text": text,
-        })
-
-    return blocks
-
-
-def find_overlaps(blocks: List[Dict]) -> List[Dict]:
-    """Return list of overlapping adjacent block-pairs (as tuples in dict form).
-
-    We consider "adjacent" by index when all blocks have indexes; otherwise by start time.
-    Overlap condition: next.start < current.end
+    Overlap condition: b.start < a.end (blocks that merely touch do not overlap).
     """
-    if not blocks:
-        return []
-    if all(b.get("index") is not None for b in blocks):
-        ordered = sorted(blocks, key=lambda b: b["index"])  # adjacent by index
-    else:
-        ordered = sorted(blocks, key=lambda b: b["start"])  # adjacent by time
-
-    overlaps = []
-    for a, b in zip(ordered, ordered[1:]):
-        if b["start"] < a["end"]:
-            overlaps.append({"a": a, "b": b})
-    return overlaps
+    index = IntervalIndex((b.start_ms, b.end_ms, b) for b in blocks)
+    pairs = sorted(index.overlapping_pairs(), key=lambda ab: (ab[1].start_ms, ab[0].start_ms, ab[1].pos, ab[0].pos))
+    return [{"a": a, "b": b} for a, b in pairs]
 
 
 def scan_path(path: str, recursive: bool = False) -> List[str]:
@@ -123,21 +63,23 @@ def scan_path(path: str, recursive: bool = False) -> List[str]:
 def print_overlap(file: str, pair: Dict) -> None:
     a = pair["a"]
     b = pair["b"]
-    idx_a = a.get("index")
-    idx_b = b.get("index")
+    idx_a = a.index
+    idx_b = b.index
     print(f"File: {file}")
-    print(f"Overlap between blocks {idx_a if idx_a is not None else '?'} and {idx_b if idx_b is not None else '?'}:")
-    print(f"  [{idx_a if idx_a is not None else '?'}] {a['start_ts']} --> {a['end_ts']}")
-    print(textwrap.indent(a['text'] or '<no text>', '    '))
-    print(f"  [{idx_b if idx_b is not None else '?'}] {b['start_ts']} --> {b['end_ts']}")
-    print(textwrap.indent(b['text'] or '<no text>', '    '))
+    speakers = f"{speaker_of(a) or '?'} / {speaker_of(b) or '?'}"
+    print(f"Overlap between blocks {idx_a if idx_a is not None else '?'} and {idx_b if idx_b is not None else '?'} ({speakers}):")
+    print(f"  [{idx_a if idx_a is not None else '?'}] {a.start_ts} --> {a.end_ts}")
+    print(textwrap.indent(a.text or '<no text>', '    '))
+    print(f"  [{idx_b if idx_b is not None else '?'}] {b.start_ts} --> {b.end_ts}")
+    print(textwrap.indent(b.text or '<no text>', '    '))
     print("-" * 60)
 
 
 def main(argv: Optional[List[str]] = None) -> int:
-    p = argparse.ArgumentParser(description="Report overlapping adjacent subtitle blocks in .srt files.")
+    p = argparse.ArgumentParser(description="Report overlapping subtitle blocks in .srt files.")
     p.add_argument("path", help="Path to a .srt file or a directory containing .srt files")
     p.add_argument("-r", "--recursive", action="store_true", help="Recurse into subdirectories when path is a directory")
+    p.add_argument("--by-speaker", action="store_true", help="Also summarise the overlaps per pair of speakers")
     args = p.parse_args(argv)
 
     try:
@@ -151,6 +93,7 @@ def main(argv: Optional[List[str]] = None) -> int:
         return 0
 
     total_overlaps = 0
+    by_speaker: Counter = Counter()
     for f in files:
         try:
             blocks = parse_srt(f)
@@ -161,13 +104,19 @@ def main(argv: Optional[List[str]] = None) -> int:
         if overlaps:
             for pair in overlaps:
                 print_overlap(f, pair)
+                by_speaker[tuple(sorted((speaker_of(pair["a"]) or "?", speaker_of(pair["b"]) or "?")))] += 1
             total_overlaps += len(overlaps)
 
+    if args.by_speaker and by_speaker:
+        print("\nOverlaps by speaker pair:")
+        for (sa, sb), n in by_speaker.most_common():
+            kind = "same speaker" if sa == sb and sa != "?" else "cross-talk"
+            print(f"  {n:4d}  {sa} / {sb}  ({kind})")
     if total_overlaps:
-        print(f"\n✅ Found {total_overlaps} overlapping adjacent subtitle pair(s) across {len(files)} scanned file(s).")
+        print(f"\n✅ Found {total_overlaps} overlapping subtitle pair(s) across {len(files)} scanned file(s).")
         return 1
     else:
-        print("✅ No overlapping adjacent subtitle blocks found.")
+        print("✅ No overlapping subtitle blocks found.")
         return 0
 
 
@@ -1,80 +1,55 @@
 #!/usr/bin/env python3
-"""Find identical subtitle text appearing in multiple subtitle blocks (single .srt file).
+"""Find identical subtitle text appearing in multiple subtitle blocks (single .srt file), or exact and
+near-duplicate lines across the whole corpus (--corpus).
 
 Usage:
   python tools/find_duplicate_subtitles.py path/to/file.srt
   python tools/find_duplicate_subtitles.py path/to/file.srt -i
+  python tools/find_duplicate_subtitles.py --corpus [--threshold 0.7] [--json] [extra.srt ...]
 
 By default the comparison collapses whitespace; use -i/--ignore-case to ignore case.
+
+Corpus mode indexes every line of `meta.csv`, `drama-cd-transcript.csv` and the transcript SRTs
+(`drama-cd-transcript/*.srt` plus any .srt files given on the command line):
+- SRT lines are indexed per role (JA / ZH / EN); ZH lines lose their `Name：` speaker label. The JA lines
+  of a CD that already has rows in `drama-cd-transcript.csv` are skipped, since those rows were built from them.
+- Lines are normalised (NFKC, case, punctuation and whitespace removed); equal keys form exact groups.
+- Near duplicates are found with MinHash signatures over character 3-grams (no word segmentation needed
+  for Japanese/Chinese) and LSH banding, so only lines sharing a band are compared; candidate pairs are
+  confirmed by their true 3-gram Jaccard similarity (--threshold) and merged into groups.
+
 This script only reports duplicates — it does not modify files.
 """
 
 from __future__ import annotations
 import argparse
+import csv
+import glob
+import json
 import os
+import random
 import re
 import sys
 import textwrap
-from typing import List, Dict, Optional
-
-TIMESTAMP_RE = re.compile(r"(\d{1,2}:\d{2}:\d{2}[,\.]\d{3})\s*-->\s*(\d{1,2}:\d{2}:\d{2}[,\.]\d{3})")
-
-
-def parse_timestamp(ts: str) -> float:
-    m = re.match(r"^(\d+):(\d{2}):(\d{2})[,\.](\d{3})$", ts.strip())
-    if not m:
-        raise ValueError(f"Invalid timestamp: {ts!r}")
-    h, mm, ss, ms = m.groups()
-    return int(h) * 3600 + int(mm) * 60 + int(ss) + int(ms) / 1000.0
-
-
-def parse_srt(path: str) -> List[Dict]:
-    raw = open(path, "r", encoding="utf-8-sig").read()
-    chunks = re.split(r"\n\s*\n", raw.strip())
-    blocks: List[Dict] = []
-
-    for chunk in chunks:
-        lines = [ln.rstrip() for ln in chunk.splitlines() if ln.strip() != ""]
-        if not lines:
-            continue
-        ts_line_idx = None
-        for i, ln in enumerate(lines[:3]):
-            if "-->" in ln:
-                ts_line_idx = i
-                break
-        if ts_line_idx is None:
-            continue
-
-        index = None
-        if ts_line_idx >= 1 and re.match(r"^\d+\s*$", lines[0]):
-            try:
-                index = int(lines[0].strip())
-            except Exception:
-                index = None
-
-        ts_line = lines[ts_line_idx]
-        m = TIMESTAMP_RE.search(ts_line)
-        if not m:
-            continue
-        start_ts, end_ts = m.group(1), m.group(2)
-        try:
-            start = parse_timestamp(start_ts)
-            end = parse_timestamp(end_ts)
-        except Exception:
-            continue
-
-        text_lines = lines[ts_line_idx + 1 :]
-        text = "\n".join(text_lines).strip()
-        blocks.append({
-            "index": index,
-            "start": start,
-            "end": end,
-            "start_ts": start_ts,
-            "end_ts": end_ts,
-            "text": text,
-        })
-
-    return blocks
+import unicodedata
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from check_chinese_speaker_labels import SPEAKER_RE
+from srt_core import ROLES, SrtBlock, load_srt
+
+CORPUS_CSVS = ("meta.csv", "drama-cd-transcript.csv")
+CORPUS_SRT_GLOB = "drama-cd-transcript/*.srt"
+CD_SRT_RE = re.compile(r"^KAXA-75(?P<cd_idx>\d{2})CD_bilingual\.srt$")
+CD_ROW_RE = re.compile(r"^\[cd(?P<cd_idx>\d{2})-")
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard become candidates with high probability
+MERSENNE_PRIME = (1 << 61) - 1
+
+def parse_srt(path: str) -> List[SrtBlock]:
+    """Parse an .srt file into its blocks (see srt_core.SrtBlock); blocks with unparsable timestamps are skipped."""
+    return list(load_srt(path).timed_blocks())
 
 
 def normalize_text(text: str, ignore_case: bool = False) -> str:
@@ -86,20 +61,180 @@ def normalize_text(text: str, ignore_case: bool = False) -> str:
     return t
 
 
-def find_duplicates(blocks: List[Dict], ignore_case: bool = False) -> Dict[str, List[Dict]]:
-    mapping: Dict[str, List[Dict]] = {}
+def find_duplicates(blocks: List[SrtBlock], ignore_case: bool = False) -> Dict[str, List[SrtBlock]]:
+    mapping: Dict[str, List[SrtBlock]] = {}
     for b in blocks:
-        key = normalize_text(b["text"], ignore_case=ignore_case)
+        key = normalize_text(b.text, ignore_case=ignore_case)
         mapping.setdefault(key, []).append(b)
     return {k: v for k, v in mapping.items() if k != "" and len(v) > 1}
 
 
+class CorpusLine(NamedTuple):
+    source: str     # file the line comes from
+    location: str   # row filename (CSV) or `#index role` (SRT)
+    lang: str       # 'ja', 'zh' or 'en'; lines are only compared within one language
+    text: str
+
+
+def iter_corpus_lines(csv_paths: List[str], srt_paths: List[str]) -> Iterator[CorpusLine]:
+    covered_cds = set()
+    for path in csv_paths:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                m = CD_ROW_RE.match(row["filename"])
+                if m:
+                    covered_cds.add(m.group("cd_idx"))
+                yield CorpusLine(path, row["filename"], "ja", row["content"])
+    for path in srt_paths:
+        m = CD_SRT_RE.match(os.path.basename(path))
+        skip_ja = bool(m) and m.group("cd_idx") in covered_cds
+        srt = load_srt(path)
+        for role in ROLES:
+            if role == "ja" and skip_ja:
+                continue
+            for b, line, _ in srt.role_lines(role):
+                if role == "zh":
+                    line = line[SPEAKER_RE.match(line).end():] if SPEAKER_RE.match(line) else line.lstrip().lstrip("：")
+                index = srt.index[b] if srt.index[b] >= 0 else "?"
+                yield CorpusLine(path, f"#{index} {role}", role, line)
+
+
+def corpus_key(text: str) -> str:
+    """Normalise a line for comparison: NFKC, lower case, only letters/digits/marks kept."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] in "LNM")
+
+
+def shingles(key: str) -> set:
+    if len(key) <= SHINGLE_SIZE:
+        return {key}
+    return {key[i:i + SHINGLE_SIZE] for i in range(len(key) - SHINGLE_SIZE + 1)}
+
+
+def minhash(hashes: List[int], perms: List[tuple[int, int]]) -> tuple:
+    return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in perms)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int) -> None:
+        self.parent[self.find(x)] = self.find(y)
+
+
+def find_corpus_duplicates(lines: List[CorpusLine], threshold: float = 0.7,
+                           min_length: int = 4) -> List[Dict]:
+    """Group `lines` into exact and near-duplicate groups.
+
+    Returns [{"exact": all lines share one normalised key, "similarity": lowest confirmed 3-gram Jaccard
+    similarity that joined the group (1.0 for exact groups), "lines": [...]}, ...] for every group of two or
+    more lines, largest first. Lines whose normalised key is shorter than `min_length` characters (interjections,
+    bare names) are ignored.
+    """
+    by_key: Dict[tuple[str, str], List[CorpusLine]] = {}
+    for line in lines:
+        key = corpus_key(line.text)
+        if key:
+            by_key.setdefault((line.lang, key), []).append(line)
+    keys = list(by_key)
+
+    rng = random.Random(0)
+    perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+    rows = NUM_PERM // BANDS
+    sets: Dict[int, set] = {}
+    buckets: Dict[tuple, List[int]] = {}
+    by_length = [i for i, (_, key) in enumerate(keys) if len(key) >= min_length]
+    for i in by_length:
+        lang, key = keys[i]
+        sets[i] = shingles(key)
+        sig = minhash([zlib.crc32(sh.encode("utf-8")) for sh in sets[i]], perms)
+        for band in range(BANDS):
+            buckets.setdefault((lang, band, sig[band * rows:(band + 1) * rows]), []).append(i)
+
+    uf = _UnionFind(len(keys))
+    confirmed: List[tuple[int, float]] = []
+    checked = set()
+    for members in buckets.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                pair = (members[x], members[y])
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                a, b = sets[pair[0]], sets[pair[1]]
+                jaccard = len(a & b) / len(a | b)
+                if jaccard >= threshold:
+                    uf.union(*pair)
+                    confirmed.append((pair[0], jaccard))
+
+    similarity: Dict[int, float] = {}
+    for i, jaccard in confirmed:
+        root = uf.find(i)
+        similarity[root] = min(similarity.get(root, 1.0), jaccard)
+    groups: Dict[int, List[int]] = {}
+    for i in by_length:
+        groups.setdefault(uf.find(i), []).append(i)
+    result = []
+    for root, members in groups.items():
+        group_lines = [line for i in members for line in by_key[keys[i]]]
+        if len(group_lines) > 1:
+            result.append({"exact": len(members) == 1, "similarity": round(similarity.get(root, 1.0), 3),
+                           "lines": group_lines})
+    result.sort(key=lambda g: (-len(g["lines"]), g["similarity"]))
+    return result
+
+
+def corpus_main(args) -> int:
+    csv_paths = [p for p in CORPUS_CSVS if os.path.isfile(p)]
+    srt_paths = list(dict.fromkeys(sorted(glob.glob(CORPUS_SRT_GLOB)) + args.srt))
+    missing = [p for p in args.srt if not os.path.isfile(p)]
+    if missing:
+        print(f"File not found: {missing[0]}", file=sys.stderr)
+        return 2
+    lines = list(iter_corpus_lines(csv_paths, srt_paths))
+    groups = find_corpus_duplicates(lines, threshold=args.threshold, min_length=args.min_length)
+    if args.json:
+        print(json.dumps([dict(g, lines=[line._asdict() for line in g["lines"]]) for g in groups], ensure_ascii=False, indent=2))
+        return 1 if groups else 0
+    print(f"Indexed {len(lines)} line(s) from {len(csv_paths) + len(srt_paths)} file(s).")
+    if not groups:
+        print("✅ No duplicate or near-duplicate lines found.")
+        return 0
+    print(f"Found {len(groups)} duplicate group(s):\n")
+    for i, g in enumerate(groups, start=1):
+        kind = "exact" if g["exact"] else f"near, Jaccard >= {g['similarity']}"
+        print(f"Group {i} — {len(g['lines'])} occurrences ({kind}):")
+        for line in g["lines"]:
+            print(f"  {line.source} {line.location}: {line.text}")
+        print("-" * 60)
+    return 1
+
+
 def main(argv: Optional[List[str]] = None) -> int:
-    p = argparse.ArgumentParser(description="Find identical subtitle text appearing in multiple blocks in a single .srt file.")
-    p.add_argument("file", help="Path to a .srt file to check")
+    p = argparse.ArgumentParser(description="Find identical subtitle text appearing in multiple blocks in a single .srt file, "
+                                            "or exact and near-duplicate lines across the corpus (--corpus).")
+    p.add_argument("file", nargs="?", help="Path to a .srt file to check")
     p.add_argument("-i", "--ignore-case", action="store_true", help="Ignore case when comparing subtitle text")
+    p.add_argument("--corpus", action="store_true", help=f"Index {', '.join(CORPUS_CSVS)} and {CORPUS_SRT_GLOB} (plus the given .srt files)")
+    p.add_argument("--threshold", type=float, default=0.7, help="Corpus mode: minimum 3-gram Jaccard similarity of near duplicates (default: 0.7)")
+    p.add_argument("--min-length", type=int, default=4, help="Corpus mode: ignore lines shorter than this after normalisation (default: 4)")
+    p.add_argument("--json", action="store_true", help="Corpus mode: print the groups as JSON")
+    p.add_argument("srt", nargs="*", help=argparse.SUPPRESS)
     args = p.parse_args(argv)
 
+    if args.corpus:
+        args.srt = ([args.file] if args.file else []) + args.srt
+        return corpus_main(args)
+    if not args.file or args.srt:
+        p.error("expected exactly one .srt file (or --corpus)")
+
     if not os.path.isfile(args.file):
         print(f"File not found: {args.file}", file=sys.stderr)
         return 2
@@ -118,9 +253,9 @@ def main(argv: Optional[List[str]] = None) -> int:
     for i, (text_key, items) in enumerate(sorted(duplicates.items(), key=lambda kv: -len(kv[1])), start=1):
         print(f"Group {i} — {len(items)} occurrences:")
         for b in items:
-            print(f"  [{b.get('index') if b.get('index') is not None else '?'}] {b['start_ts']} --> {b['end_ts']}")
+            print(f"  [{b.index if b.index is not None else '?'}] {b.start_ts} --> {b.end_ts}")
         print("  Text:")
-        print(textwrap.indent(items[0]['text'], '    '))
+        print(textwrap.indent(items[0].text, '    '))
         print("-" * 60)
 
     return 1
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Run every subtitle check over .srt files in one pass per file, with a per-file result cache.
+
+Checks (the same logic as the standalone tools):
+- overlaps:   every pair of blocks with overlapping timestamps, with each block's speaker (check_srt_overlaps.py)
+- speakers:   Chinese lines with a missing or unknown `Name：` label (check_chinese_speaker_labels.py)
+- ja_length:  Japanese lines longer than --max characters (check_japanese_line_length.py)
+- duplicates: identical text in several blocks of a file (find_duplicate_subtitles.py)
+- indices:    sequence indices that are not 1..N (validate_and_fix_srt_indices.py, check-only)
+
+Each file is parsed once (srt_core) and checked in a worker process. Results are cached in
+`.lint-cache.json` by the file's content hash and the lint settings (including a hash of characters.csv),
+so unchanged files are not parsed at all; an unchanged corpus lints in a few milliseconds.
+
+Usage:
+  python tools/lint_subtitles.py                       # drama-cd-transcript/*.srt
+  python tools/lint_subtitles.py path/to/file.srt dir/ --json
+  python tools/lint_subtitles.py --no-cache --fail-on-length
+
+Exit code: 2 if characters.csv or a path cannot be read, 1 if any check failed (ja_length only with
+--fail-on-length, like check_japanese_line_length.py --fail-on-violation), else 0.
+"""
+
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from check_chinese_speaker_labels import check_file as check_speakers, load_chinese_names
+from check_japanese_line_length import check_file as check_ja_length
+from check_srt_overlaps import find_overlaps, parse_srt, speaker_of
+from find_duplicate_subtitles import find_duplicates
+from srt_core import load_srt
+from validate_and_fix_srt_indices import analyze_srt, summarize_mismatches
+
+CHECKS = ("overlaps", "speakers", "ja_length", "duplicates", "indices")
+CACHE_FILE = ".lint-cache.json"
+# bump when a check's logic or its result format changes, to invalidate cached results
+LINT_VERSION = 3
+
+
+def lint_file(path: str, chinese_names: set, max_len: int, ignore_case: bool) -> Dict[str, list]:
+    """Run every check on one file (parsed once) and return {check: [problem dicts]}."""
+    blocks = parse_srt(path)
+    return {
+        "overlaps": [
+            {side: {"index": p[side].index, "time": p[side].time_text, "text": p[side].text, "speaker": speaker_of(p[side])}
+             for side in ("a", "b")}
+            for p in find_overlaps(blocks)
+        ],
+        "speakers": [
+            {k: v for k, v in problem.items() if k != "file"}
+            for problem in check_speakers(Path(path), chinese_names)
+        ],
+        "ja_length": check_ja_length(Path(path), max_len),
+        "duplicates": [
+            {"text": items[0].text, "blocks": [{"index": b.index, "time": b.time_text} for b in items]}
+            for items in find_duplicates(blocks, ignore_case=ignore_case).values()
+        ],
+        "indices": [
+            {"line_no": line_no, "found": found, "expected": expected}
+            for line_no, found, expected in summarize_mismatches(analyze_srt(load_srt(path).buffer.splitlines()))
+        ],
+    }
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    files: List[str] = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(sorted(str(f) for f in Path(p).glob("*.srt")))
+        elif os.path.isfile(p):
+            files.append(p)
+        else:
+            raise FileNotFoundError(p)
+    return list(dict.fromkeys(files))
+
+
+def load_cache(path: str, settings: str) -> Dict[str, dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data.get("files", {}) if data.get("settings") == settings else {}
+
+
+def save_cache(path: str, settings: str, files: Dict[str, dict]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "files": files}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def failing_checks(results: Dict[str, list], fail_on_length: bool) -> List[str]:
+    return [c for c in CHECKS if results[c] and (c != "ja_length" or fail_on_length)]
+
+
+def print_text_report(report: Dict[str, Dict[str, list]], max_len: int) -> None:
+    for path, results in report.items():
+        if not any(results.values()):
+            continue
+        print(f"\nFile: {path}")
+        for p in results["overlaps"]:
+            print(f"  overlaps:   blocks {p['a']['index']} [{p['a']['time']}] and {p['b']['index']} [{p['b']['time']}]"
+                  f" ({p['a']['speaker'] or '?'} / {p['b']['speaker'] or '?'})")
+        for p in results["speakers"]:
+            what = "missing speaker marker (expected Name：...)" if p["type"] == "missing_marker" else f"speaker='{p['speaker']}' NOT in characters.csv"
+            print(f"  speakers:   [block #{p['block_index']} | line {p['line_no']}] {p['text']}  -> {what}")
+        for p in results["ja_length"]:
+            print(f"  ja_length:  #{p['index'] if p['index'] is not None else '-'} len={p['length']} > {max_len}: {p['line']}")
+        for p in results["duplicates"]:
+            where = ", ".join(str(b["index"] if b["index"] is not None else "?") for b in p["blocks"])
+            print(f"  duplicates: blocks {where}: {p['text']!r}")
+        for p in results["indices"]:
+            print(f"  indices:    line {p['line_no']}: {p['found']}  ->  {p['expected']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Run all subtitle checks over .srt files in one cached, parallel pass.")
+    p.add_argument("paths", nargs="*", default=["drama-cd-transcript"], help="Files or directories (default: drama-cd-transcript)")
+    p.add_argument("--csv", default="characters.csv", help="Path to characters.csv (default: characters.csv)")
+    p.add_argument("--max", "-m", type=int, default=30, help="Maximum Japanese line length (default: 30)")
+    p.add_argument("-i", "--ignore-case", action="store_true", help="Ignore case when looking for duplicate texts")
+    p.add_argument("--fail-on-length", action="store_true", help="Let Japanese line length violations fail the run")
+    p.add_argument("--json", action="store_true", help="Print the combined report as JSON")
+    p.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes for changed files (default: cpu_count())")
+    p.add_argument("--cache", default=CACHE_FILE, help=f"Result cache file (default: {CACHE_FILE})")
+    p.add_argument("--no-cache", action="store_true", help="Lint every file and do not touch the cache")
+    args = p.parse_args(argv)
+
+    try:
+        files = collect_files(args.paths)
+    except FileNotFoundError as ex:
+        print(f"Path not found: {ex}", file=sys.stderr)
+        return 2
+    try:
+        chinese_names = load_chinese_names(Path(args.csv))
+        csv_hash = hashlib.sha256(Path(args.csv).read_bytes()).hexdigest()
+    except Exception as ex:
+        print("ERROR loading characters.csv:", ex, file=sys.stderr)
+        return 2
+
+    settings = json.dumps([LINT_VERSION, args.max, args.ignore_case, csv_hash])
+    cache = {} if args.no_cache else load_cache(args.cache, settings)
+    report: Dict[str, Dict[str, list]] = {}
+    todo: Dict[str, str] = {}
+    for f in files:
+        digest = hashlib.sha256(Path(f).read_bytes()).hexdigest()
+        entry = cache.get(f)
+        if entry and entry["sha256"] == digest:
+            report[f] = entry["results"]
+        else:
+            todo[f] = digest
+
+    if todo:
+        if len(todo) == 1 or args.jobs == 1:
+            fresh = [lint_file(f, chinese_names, args.max, args.ignore_case) for f in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=min(len(todo), args.jobs or os.cpu_count() or 1)) as pool:
+                fresh = list(pool.map(lint_file, todo, [chinese_names] * len(todo), [args.max] * len(todo),
+                                      [args.ignore_case] * len(todo)))
+        for (f, digest), results in zip(todo.items(), fresh):
+            report[f] = results
+            cache[f] = {"sha256": digest, "results": results}
+        if not args.no_cache:
+            save_cache(args.cache, settings, cache)
+
+    report = {f: report[f] for f in files}
+    failing = {f: failing_checks(results, args.fail_on_length) for f, results in report.items()}
+    if args.json:
+        print(json.dumps({
+            "files_checked": len(files),
+            "files_linted": len(todo),
+            "max_length": args.max,
+            "failing": {f: checks for f, checks in failing.items() if checks},
+            "results": report,
+        }, ensure_ascii=False, indent=2))
+    else:
+        print_text_report(report, args.max)
+        counts = {c: sum(len(results[c]) for results in report.values()) for c in CHECKS}
+        print(f"\nScanned {len(files)} file(s) ({len(todo)} linted, {len(files) - len(todo)} cached): "
+              + ", ".join(f"{c}={n}" for c, n in counts.items()))
+    return 1 if any(failing.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
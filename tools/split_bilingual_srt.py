@@ -16,45 +16,36 @@ that language line exists for the block.
 import sys
 from pathlib import Path
 
-if len(sys.argv) != 2:
-    print("Usage: python split_bilingual_srt.py <input.srt>")
-    sys.exit(2)
-
-inp = Path(sys.argv[1])
-if not inp.exists():
-    print(f"File not found: {inp}")
-    sys.exit(1)
-
-text = inp.read_text(encoding='utf-8')
-blocks = [b.strip() for b in text.split('\n\n') if b.strip()]
-
-outs = {
-    'ja': [],
-    'zh': [],
-    'en': [],
-}
-
-for b in blocks:
-    lines = b.splitlines()
-    if len(lines) < 2:
-        continue
-    idx = lines[0].strip()
-    timecode = lines[1].strip()
-    body = lines[2:]
-    # body expected: [ja, zh, en] but may be shorter/longer
-    if len(body) >= 1 and body[0].strip():
-        outs['ja'].append((timecode, body[0].rstrip()))
-    if len(body) >= 2 and body[1].strip():
-        outs['zh'].append((timecode, body[1].rstrip()))
-    if len(body) >= 3 and body[2].strip():
-        outs['en'].append((timecode, body[2].rstrip()))
-
-# write outputs with sequential indices
-for code, items in outs.items():
-    out_path = inp.with_name(inp.stem + f'.{code}.srt')
-    with out_path.open('w', encoding='utf-8') as f:
-        for i, (timecode, txt) in enumerate(items, start=1):
-            f.write(f"{i}\n")
-            f.write(f"{timecode}\n")
-            f.write(f"{txt}\n\n")
-    print(f"Wrote {out_path} ({len(items)} blocks)")
+from srt_core import ROLES, load_srt, write_role_srt
+
+
+def split_srt(inp: Path) -> dict:
+    """Write `<stem>.<role>.srt` next to `inp` for every line role; return {role: (output path, block count)}."""
+    srt = load_srt(inp)
+    written = {}
+    for code in ROLES:
+        # body expected: [ja, zh, en] but may be shorter/longer
+        items = [(srt.time_text(b), line) for b, line, _ in srt.role_lines(code) if line.strip()]
+        out_path = inp.with_name(inp.stem + f'.{code}.srt')
+        write_role_srt(out_path, items)
+        written[code] = (out_path, len(items))
+    return written
+
+
+def main() -> int:
+    if len(sys.argv) != 2:
+        print("Usage: python split_bilingual_srt.py <input.srt>")
+        return 2
+
+    inp = Path(sys.argv[1])
+    if not inp.exists():
+        print(f"File not found: {inp}")
+        return 1
+
+    for out_path, count in split_srt(inp).values():
+        print(f"Wrote {out_path} ({count} blocks)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,294 @@
+"""Shared streaming SRT parser used by the subtitle tools and `build_drama_cd_transcript_from_srt.py`.
+
+A file is read and scanned once, line by line, without per-line regexes:
+- a block is a run of non-blank lines: an optional numeric index line, a time line (`start --> end`)
+  and the text lines
+- timings are stored as integer milliseconds in compact `array('i')` columns (-1 when missing/unparsable)
+- text lines are stored as (start, end) offsets into the decoded file buffer and only sliced on access
+
+Views:
+- `SrtFile.blocks()`: one `SrtBlock` per block (index, timing, time line, text lines, line numbers)
+- `SrtFile.role_lines(role)`: the Japanese / Chinese / English line of every block (line roles of the
+  trilingual transcripts: 1st text line JA, 2nd ZH, 3rd EN)
+- `SrtFile.start_ms` / `SrtFile.end_ms`: the timing columns
+
+`load_srt` memoises parsed files by path, size and mtime, so tools run in one process parse each file once.
+
+`IntervalIndex` indexes (start, end, item) intervals, e.g. the blocks of a file or the rows of a transcript:
+all overlapping pairs by a sweep line in O(n log n + k), and "what overlaps this range" queries in
+O(log n + k) over an implicit interval tree (the start-sorted array, each subtree annotated with its max end).
+
+Import as `from srt_core import ...` from scripts in `tools/`, or `from tools.srt_core import ...` from the repository root.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+from array import array
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+
+ROLES = ("ja", "zh", "en")
+_ROLE_INDEX = {role: i for i, role in enumerate(ROLES)}
+
+
+def parse_timestamp_ms(ts: str) -> int:
+    """Return milliseconds for an SRT timestamp like 00:01:23,456 or 0:01:23.456; -1 when it is malformed."""
+    ts = ts.strip()
+    if len(ts) < 11 or ts[-4] not in ",." or ts[-7] != ":" or ts[-10] != ":":
+        return -1
+    h, mm, ss, ms = ts[:-10], ts[-9:-7], ts[-6:-4], ts[-3:]
+    if not (h.isdigit() and mm.isdigit() and ss.isdigit() and ms.isdigit()):
+        return -1
+    return ((int(h) * 60 + int(mm)) * 60 + int(ss)) * 1000 + int(ms)
+
+
+def format_ms(ms: int) -> str:
+    """Format milliseconds as an SRT timestamp (HH:MM:SS,mmm)."""
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+class SrtBlock(NamedTuple):
+    pos: int                # position of the block in the file (0-based)
+    index: Optional[int]    # the block's numeric index line, if any
+    start_ms: int
+    end_ms: int
+    time_text: str          # the raw time line ('' when missing)
+    lines: list[str]        # text lines, right-stripped
+    line_no: int            # 1-based file line number of the first line of the block
+    text_line_no: int       # 1-based file line number of the first text line
+
+    @property
+    def start(self) -> float:
+        return self.start_ms / 1000.0
+
+    @property
+    def end(self) -> float:
+        return self.end_ms / 1000.0
+
+    @property
+    def start_ts(self) -> str:
+        return self.time_text.split("-->", 1)[0].strip()
+
+    @property
+    def end_ts(self) -> str:
+        return self.time_text.split("-->", 1)[1].strip() if "-->" in self.time_text else ""
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+    def role(self, role: str) -> Optional[str]:
+        """The block's `role` ('ja', 'zh' or 'en') line, or None when the block has no such line."""
+        i = _ROLE_INDEX[role]
+        return self.lines[i] if i < len(self.lines) else None
+
+
+class SrtFile:
+    def __init__(self, text: str, path: str = "<string>"):
+        self.path = path
+        self.buffer = text[1:] if text.startswith("\ufeff") else text
+        # per block
+        self.index = array("i")
+        self.start_ms = array("i")
+        self.end_ms = array("i")
+        self.first_line = array("i")     # 0-based line number of the block's first line
+        self.time_line = array("i")      # line slot of the time line, -1 when missing
+        self.text_lo = array("i")        # first text line slot of the block
+        self.text_hi = array("i")        # one past its last text line slot
+        # per stored line slot (time lines and text lines)
+        self.line_start = array("i")
+        self.line_end = array("i")
+        self.line_number = array("i")    # 0-based file line number
+        self._parse()
+
+    def _add_line(self, start: int, end: int, line_no: int) -> int:
+        self.line_start.append(start)
+        self.line_end.append(end)
+        self.line_number.append(line_no)
+        return len(self.line_start) - 1
+
+    def _parse(self) -> None:
+        buf = self.buffer
+        n = len(buf)
+        pos = 0
+        line_no = 0
+        # current block state: 0 = between blocks, 1 = index seen (expect time line), 2 = in text
+        state = 0
+        while pos < n or (pos == n and state):
+            nl = buf.find("\n", pos)
+            end = n if nl < 0 else nl
+            stop = end - 1 if end > pos and buf[end - 1] == "\r" else end
+            line = buf[pos:stop]
+            blank = not line.strip()
+            if blank:
+                if state:
+                    self._close_block(state)
+                    state = 0
+            elif state == 0:
+                self.first_line.append(line_no)
+                self.start_ms.append(-1)
+                self.end_ms.append(-1)
+                self.time_line.append(-1)
+                stripped = line.strip()
+                if stripped.isdigit():
+                    self.index.append(int(stripped))
+                    self.text_lo.append(-1)
+                    state = 1
+                else:
+                    self.index.append(-1)
+                    self.text_lo.append(len(self.line_start))
+                    state = self._time_or_text(line, pos, stop, line_no)
+            elif state == 1:
+                self.text_lo[-1] = len(self.line_start)
+                state = self._time_or_text(line, pos, stop, line_no)
+            else:
+                self._add_line(pos, stop, line_no)
+            if nl < 0:
+                if state:
+                    self._close_block(state)
+                break
+            pos = nl + 1
+            line_no += 1
+
+    def _close_block(self, state: int) -> None:
+        if state == 1:  # only an index line
+            self.text_lo[-1] = len(self.line_start)
+        self.text_hi.append(len(self.line_start))
+
+    def _time_or_text(self, line: str, start: int, stop: int, line_no: int) -> int:
+        """Handle the first line after an optional index: a time line, or (malformed block) the first text line."""
+        slot = self._add_line(start, stop, line_no)
+        arrow = line.find("-->")
+        if arrow < 0:
+            return 2
+        self.time_line[-1] = slot
+        self.text_lo[-1] = slot + 1
+        self.start_ms[-1] = parse_timestamp_ms(line[:arrow])
+        end_part = line[arrow + 3:].split()
+        self.end_ms[-1] = parse_timestamp_ms(end_part[0]) if end_part else -1
+        return 2
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _line(self, slot: int) -> str:
+        return self.buffer[self.line_start[slot]:self.line_end[slot]].rstrip()
+
+    def lines(self, b: int) -> list[str]:
+        return [self._line(slot) for slot in range(self.text_lo[b], self.text_hi[b])]
+
+    def line(self, b: int, role: str) -> Optional[str]:
+        slot = self.text_lo[b] + _ROLE_INDEX[role]
+        return self._line(slot) if slot < self.text_hi[b] else None
+
+    def line_no(self, b: int, k: int = 0) -> int:
+        """1-based file line number of text line `k` of block `b` (of the line where it would be, if missing)."""
+        slot = self.text_lo[b] + k
+        if slot < self.text_hi[b]:
+            return self.line_number[slot] + 1
+        return self.first_line[b] + 1 + (self.time_line[b] >= 0) + (self.index[b] >= 0) + k
+
+    def time_text(self, b: int) -> str:
+        slot = self.time_line[b]
+        return self._line(slot).strip() if slot >= 0 else ""
+
+    def block(self, b: int) -> SrtBlock:
+        index = self.index[b]
+        return SrtBlock(b, index if index >= 0 else None, self.start_ms[b], self.end_ms[b], self.time_text(b),
+                        self.lines(b), self.first_line[b] + 1, self.line_no(b))
+
+    def blocks(self) -> Iterator[SrtBlock]:
+        for b in range(len(self)):
+            yield self.block(b)
+
+    def timed_blocks(self) -> Iterator[SrtBlock]:
+        """Blocks whose time line parsed."""
+        for b in range(len(self)):
+            if self.start_ms[b] >= 0 and self.end_ms[b] >= 0:
+                yield self.block(b)
+
+    def role_lines(self, role: str) -> Iterator[tuple[int, str, int]]:
+        """Yield (block position, line, 1-based line number) for every block that has a `role` line."""
+        k = _ROLE_INDEX[role]
+        for b in range(len(self)):
+            slot = self.text_lo[b] + k
+            if slot < self.text_hi[b]:
+                yield b, self._line(slot), self.line_number[slot] + 1
+
+
+class IntervalIndex:
+    """Static index of half-open [start, end) intervals carrying arbitrary items; touching intervals do not overlap."""
+
+    def __init__(self, intervals: Iterable[tuple[float, float, Any]]):
+        ordered = sorted(intervals, key=lambda iv: (iv[0], iv[1]))
+        self.starts = [iv[0] for iv in ordered]
+        self.ends = [iv[1] for iv in ordered]
+        self.items = [iv[2] for iv in ordered]
+        # max_end[mid] = largest end in the subtree [lo, hi) whose midpoint is mid (every position is one midpoint)
+        self._max_end = list(self.ends)
+        self._annotate(0, len(ordered))
+
+    def _annotate(self, lo: int, hi: int):
+        if lo >= hi:
+            return float("-inf")
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self.ends[mid], self._annotate(lo, mid), self._annotate(mid + 1, hi))
+        return self._max_end[mid]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def query(self, start: float, end: float) -> list:
+        """Items whose interval overlaps [start, end), in start order."""
+        stack = [(0, len(self.items))]
+        hits: list[int] = []
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                continue  # nothing in this subtree ends after `start`
+            stack.append((lo, mid))
+            if self.starts[mid] < end:
+                if self.ends[mid] > start:
+                    hits.append(mid)
+                stack.append((mid + 1, hi))
+        return [self.items[i] for i in sorted(hits)]
+
+    def overlapping_pairs(self) -> Iterator[tuple[Any, Any]]:
+        """Yield every (earlier, later) pair of overlapping items, grouped by the later item in start order."""
+        active: list[tuple[float, int]] = []  # heap of (end, position) of intervals still open at the sweep line
+        for j, start in enumerate(self.starts):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for _, i in active:
+                yield self.items[i], self.items[j]
+            heapq.heappush(active, (self.ends[j], j))
+
+
+_cache: dict[str, tuple[int, int, SrtFile]] = {}
+
+
+def load_srt(path: str | os.PathLike, encoding: str = "utf-8-sig") -> SrtFile:
+    """Parse `path` (memoised by path, size and mtime)."""
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    cached = _cache.get(key)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    with open(key, encoding=encoding, errors="replace", newline="") as f:
+        srt = SrtFile(f.read(), str(path))
+    _cache[key] = (st.st_size, st.st_mtime_ns, srt)
+    return srt
+
+
+def write_role_srt(path: str | os.PathLike, items: list[tuple[str, str]]) -> None:
+    """Write (time line, text) items as an SRT file with sequential indices."""
+    with open(path, "w", encoding="utf-8") as f:
+        for i, (time_text, text) in enumerate(items, start=1):
+            f.write(f"{i}\n{time_text}\n{text}\n\n")
@@ -0,0 +1,222 @@
+"""Watch the drama CD SRTs and incrementally rebuild the drama CD dataset after every save.
+
+Instead of rerunning `build_drama_cd_transcript_from_srt.py` over all SRTs and `drama_cd_divide_by_character.py`
+over every row, this long-running process, after each save of `drama-cd-transcript/KAXA-75##CD_bilingual.srt`:
+- re-parses only that SRT and replaces that CD's rows in `drama-cd-transcript.csv`
+  (renumbered like the build script, or keeping IDs with `--stable-ids`)
+- renames segments whose ID changed but whose timing did not, moves segments whose character changed,
+  re-encodes only segments whose timing changed and deletes those of removed rows (same build manifest as
+  `drama_cd_divide_by_character.py`)
+- cuts new segments from the CD's decoded audio, which stays memory-mapped between saves
+
+Changes are picked up with inotify (`pip install inotify_simple`) or, when that is unavailable, by polling
+file mtimes. Every CD is synced once at startup. An SRT that fails to parse (e.g. saved mid-edit) leaves the
+previous rows in place until it is fixed.
+
+Usage:
+  python watch_drama_cd.py [--stable-ids] [--jobs 4] [--cd-dir DIR] [--separated-dir separated/htdemucs]
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from audio_cache import CACHE_DIR, DEFAULT_MAX_BYTES, DecodedAudioCache, source_fingerprint
+from audio_segments import decode_audio
+from build_drama_cd_transcript_from_srt import (CHAR_CSV_DEFAULT, SRT_BASENAME_RE, SRT_DIR_DEFAULT, assign_stable_ids,
+                                                build_rename_plan, process_srt_file, read_characters,
+                                                read_transcript_csv, split_segment_filename, write_transcript_csv)
+from build_manifest import BuildManifest
+from segment_index import SegmentIndex
+from drama_cd_divide_by_character import (AUDIO_FPS, CD_AUDIO_DIR, FILENAME_RE, OUTPUT_DIR, SEPARATED_DIR, TRANSCRIPT_CSV,
+                                          find_cd_audio, parse_time_to_seconds, segment_inputs, write_batch)
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+POLL_SECONDS = 0.5
+# editors often write a file in several steps; wait this long after the first event before syncing
+DEBOUNCE_SECONDS = 0.2
+
+
+class DatasetWatcher:
+    def __init__(self, srt_dir: str = SRT_DIR_DEFAULT, csv_path: str = TRANSCRIPT_CSV, chars: str = CHAR_CSV_DEFAULT,
+                 cd_dir: str = CD_AUDIO_DIR, separated_dir: str = SEPARATED_DIR, cache_dir: Optional[str] = CACHE_DIR,
+                 cache_max_bytes: int = DEFAULT_MAX_BYTES, jobs: Optional[int] = None, stable_ids: bool = False):
+        self.srt_dir = srt_dir
+        self.csv_path = csv_path
+        self.cd_dir = cd_dir
+        self.separated_dir = separated_dir
+        self.stable_ids = stable_ids
+        self.char_map = read_characters(chars)
+        self.rows_by_cd: dict[str, list[tuple[str, str, str]]] = {}
+        if os.path.exists(csv_path):
+            for row in read_transcript_csv(csv_path):
+                self.rows_by_cd.setdefault(split_segment_filename(row[0])[0], []).append(row)
+        self.manifest = BuildManifest(OUTPUT_DIR)
+        self.index = SegmentIndex(refresh=False)
+        self.cache = DecodedAudioCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.jobs = jobs if (jobs and jobs > 0) else (os.cpu_count() or 1)
+        self.pool = ThreadPoolExecutor(self.jobs)
+        # cd_idx -> (source path, source (size, mtime_ns), source sha256, decoded mono samples)
+        self.audio: dict[str, tuple[str, tuple[int, int], str, object]] = {}
+
+    def srt_files(self) -> dict[str, str]:
+        files = {}
+        for name in sorted(os.listdir(self.srt_dir)):
+            m = SRT_BASENAME_RE.match(name)
+            if m:
+                files[m.group("cd_idx")] = os.path.join(self.srt_dir, name)
+        return files
+
+    def _load_audio(self, cd_idx: str) -> Optional[tuple[str, str, object]]:
+        """(source, sha256, samples) of a CD, decoded once and kept until the source file changes."""
+        src = find_cd_audio(cd_idx, self.cd_dir, self.separated_dir)
+        if src is None:
+            return None
+        st = os.stat(src)
+        stamp = (st.st_size, st.st_mtime_ns)
+        warm = self.audio.get(cd_idx)
+        if warm is None or warm[0] != src or warm[1] != stamp:
+            print(f"cd{cd_idx}: loading {src}")
+            if self.cache:
+                samples = self.cache.get(src, fps=AUDIO_FPS, nchannels=1)
+            else:
+                samples = decode_audio(src, fps=AUDIO_FPS, nchannels=1)
+            warm = (src, stamp, source_fingerprint(src)["sha256"], samples)
+            self.audio[cd_idx] = warm
+        return warm[0], warm[2], warm[3]
+
+    def sync(self, cd_idx: str, srt_path: str, check_segments: bool = False) -> None:
+        """Rebuild one CD's rows from its SRT and bring its segments up to date."""
+        started = time.monotonic()
+        try:
+            rows = process_srt_file(srt_path, self.char_map)
+        except Exception as ex:
+            print(f"cd{cd_idx}: ERROR {ex}; keeping the previous rows")
+            return
+        old_rows = self.rows_by_cd.get(cd_idx, [])
+        if self.stable_ids:
+            rows = assign_stable_ids(rows, old_rows)
+        if rows == old_rows and not check_segments:
+            print(f"cd{cd_idx}: no change")
+            return
+        if rows != old_rows:
+            self.rows_by_cd[cd_idx] = rows
+            write_transcript_csv(self.csv_path, [row for cd in sorted(self.rows_by_cd) for row in self.rows_by_cd[cd]])
+        renamed = self.manifest.rename_many(build_rename_plan(old_rows, rows))
+        encoded, failed = self._update_segments(cd_idx, rows)
+        removed = self.manifest.remove_orphans(fn for cd_rows in self.rows_by_cd.values() for fn, _, _ in cd_rows)
+        for rel in removed:
+            print(f"Removed orphan {rel}")
+        self.manifest.save()
+        self.index.refresh()
+        self.index.record_outputs("drama_cd", self.manifest.segments)
+        print(f"cd{cd_idx}: {len(rows)} row(s); {renamed} renamed, {encoded} encoded, {failed} failed, "
+              f"{len(removed)} removed in {time.monotonic() - started:.2f}s")
+
+    def _update_segments(self, cd_idx: str, rows: list[tuple[str, str, str]]) -> tuple[int, int]:
+        audio = self._load_audio(cd_idx)
+        if audio is None:
+            print(f"cd{cd_idx}: WARNING no source audio found in {self.cd_dir} or {self.separated_dir}; segments not updated")
+            return 0, 0
+        src, sha, samples = audio
+        segments: list[tuple[float, float, str]] = []
+        inputs: dict[str, dict] = {}
+        for filename, character, _ in rows:
+            m = FILENAME_RE.match(filename)
+            start, end = parse_time_to_seconds(m.group("start")), parse_time_to_seconds(m.group("end"))
+            out_path = os.path.join(OUTPUT_DIR, character, filename) if character else os.path.join(OUTPUT_DIR, filename)
+            segment_input = segment_inputs(sha, start, end)
+            if self.manifest.plan(filename, segment_input, out_path, relocate=True):
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                segments.append((start, end, out_path))
+                inputs[out_path] = segment_input
+        if not segments:
+            return 0, 0
+        size = math.ceil(len(segments) / self.jobs)
+        futures = [self.pool.submit(write_batch, samples, segments[i:i + size]) for i in range(0, len(segments), size)]
+        encoded = failed = 0
+        for fut in futures:
+            for out, error in fut.result():
+                if error is None:
+                    encoded += 1
+                    self.manifest.record(os.path.basename(out), inputs[out], out)
+                else:
+                    failed += 1
+                    print(f"ERROR extracting {os.path.basename(out)} from {src}: {error}")
+        return encoded, failed
+
+    def _changed_by_inotify(self, inotify) -> set[str]:
+        names = {event.name for event in inotify.read(timeout=1000)}
+        if names:
+            time.sleep(DEBOUNCE_SECONDS)
+            names |= {event.name for event in inotify.read(timeout=0)}
+        return names
+
+    def watch(self) -> None:
+        for cd_idx, path in self.srt_files().items():
+            self.sync(cd_idx, path, check_segments=True)
+        if INotify is not None:
+            inotify = INotify()
+            inotify.add_watch(self.srt_dir, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+            print(f"Watching {self.srt_dir} (inotify); Ctrl+C to stop")
+        else:
+            inotify = None
+            print(f"Watching {self.srt_dir} (polling every {POLL_SECONDS}s; install inotify_simple for instant updates); Ctrl+C to stop")
+        stamps = {cd_idx: os.stat(path).st_mtime_ns for cd_idx, path in self.srt_files().items()}
+        try:
+            while True:
+                if inotify is not None:
+                    names = self._changed_by_inotify(inotify)
+                    changed = [cd_idx for cd_idx, path in self.srt_files().items() if os.path.basename(path) in names]
+                else:
+                    time.sleep(POLL_SECONDS)
+                    changed = []
+                    for cd_idx, path in self.srt_files().items():
+                        try:
+                            mtime = os.stat(path).st_mtime_ns
+                        except FileNotFoundError:
+                            continue  # replaced by a rename in progress
+                        if stamps.get(cd_idx) != mtime:
+                            stamps[cd_idx] = mtime
+                            changed.append(cd_idx)
+                    if changed:
+                        time.sleep(DEBOUNCE_SECONDS)
+                files = self.srt_files()
+                for cd_idx in changed:
+                    self.sync(cd_idx, files[cd_idx])
+        except KeyboardInterrupt:
+            print("Stopped.")
+        finally:
+            self.manifest.save()
+            self.pool.shutdown(wait=True)
+            self.index.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Watch the drama CD SRTs and incrementally rebuild drama-cd-transcript.csv and its segments.")
+    parser.add_argument("--srt-dir", default=SRT_DIR_DEFAULT, help="Directory containing bilingual .srt files")
+    parser.add_argument("--chars", default=CHAR_CSV_DEFAULT, help="characters.csv path")
+    parser.add_argument("--stable-ids", action="store_true", help="Keep segment IDs of unchanged blocks instead of renumbering")
+    parser.add_argument("--cd-dir", default=CD_AUDIO_DIR, help="Directory containing source CD audio files")
+    parser.add_argument("--separated-dir", default=SEPARATED_DIR, help="Directory containing htdemucs separated outputs")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Encoder threads (default: cpu_count())")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help=f"Decoded-audio cache directory (default: {CACHE_DIR})")
+    parser.add_argument("--cache-max-gb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3, help="Size cap of the decoded-audio cache in GiB")
+    parser.add_argument("--no-cache", action="store_true", help="Keep decoded CDs in memory only, without the decoded-audio cache")
+    args = parser.parse_args()
+    DatasetWatcher(srt_dir=args.srt_dir, chars=args.chars, cd_dir=args.cd_dir, separated_dir=args.separated_dir,
+                   cache_dir=None if args.no_cache else args.cache_dir, cache_max_bytes=int(args.cache_max_gb * 1024 ** 3),
+                   jobs=args.jobs, stable_ids=args.stable_ids).watch()
+
+
+if __name__ == "__main__":
+    main()